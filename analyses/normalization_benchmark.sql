@@ -0,0 +1,48 @@
+{#
+  Cost of the staging normalization over the raw transactions, without
+  building anything. Compile it and time the query, e.g.
+
+    dbt compile --select normalization_benchmark
+    psql -c "explain (analyze, buffers) $(cat target/compiled/dbt_project_2/analyses/normalization_benchmark.sql)"
+
+  --vars '{normalization_inline: true}' applies the same macros directly
+  to the raw columns, re-trimming on every reference as the models did
+  before single_pass(), for comparison.
+#}
+{% set inline = var('normalization_inline', false) %}
+
+{% set normalized = {
+    'transaction_id': normalized_text('src.transaction_id'),
+    'customer_id': normalized_text('src.customer_id'),
+    'amount': normalized_text('src.amount'),
+    'transaction_date': normalized_text('src.transaction_date'),
+    'status': normalized_status('src.status')
+} %}
+{% set text = {} %}
+{% for name, expression in normalized.items() %}
+  {% do text.update({name: expression if inline else 'n.' ~ name}) %}
+{% endfor %}
+{% set typed = {
+    'transaction_id': safe_bigint(text.transaction_id),
+    'customer_id': safe_bigint(text.customer_id),
+    'amount_clean': safe_numeric(text.amount),
+    'transaction_date': safe_date(text.transaction_date)
+} %}
+{% set value = {} %}
+{% for name, expression in typed.items() %}
+  {% do value.update({name: expression if inline else 't.' ~ name}) %}
+{% endfor %}
+
+select
+  count(*) as rows_scanned,
+  count({{ value.transaction_id }}) as valid_transaction_ids,
+  count({{ value.customer_id }}) as valid_customer_ids,
+  count({{ value.transaction_date }}) as valid_transaction_dates,
+  sum({{ value.amount_clean }}) as amount_total,
+  count(case when {{ value.amount_clean }} is null and src.amount is not null then 1 end) as invalid_amounts,
+  count(case when {{ is_success(text.status) }} then 1 end) as successes
+from {{ source('raw', 'transactions') }} as src
+{% if not inline %}
+  {{ single_pass('n', normalized) }}
+  {{ single_pass('t', typed) }}
+{% endif %}
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Benchmark the pipeline on deterministic synthetic data at production volume
+
+Raw customers/transactions are generated server-side with generate_series
+into a separate source schema (dbt reads it through DBT_SOURCE_SCHEMA), so
+nothing is sent over the network and the same seed and scale always
+produce the same rows. The data includes dirty ids, amounts, statuses and
+emails, re-loaded duplicates and late-arriving transaction dates.
+
+Timed steps: data generation, the full-refresh and incremental dbt runs
+(per model, from run_results.json), the Soda scan and results ingestion.
+Timings are stored in pipeline_benchmarks together with the git commit so
+regressions can be compared between commits.
+
+Run it against a dedicated local database: the dbt models are built in the
+profile's schema.
+
+Usage:
+    python benchmark.py [--rows N] [--seed N] [--schema bench_raw] [--incremental-percent P]
+    python benchmark.py --compare [--rows N]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from dbt_artifacts import iter_run_results
+from save_validation_results import (
+    connect_to_db, create_validation_tables, save_dbt_results, ingest_soda_json, SODA_PROJECT_DIR
+)
+from soda_shards import run_sharded_scan
+
+BENCHMARK_TARGET_PATH = 'target/benchmark'
+# Transactions per customer in the generated data
+TRANSACTIONS_PER_CUSTOMER = 10
+# First load and the incremental load that follows it
+INITIAL_LOADED_AT = '2025-01-01 00:00:00'
+INCREMENTAL_LOADED_AT = '2025-01-02 00:00:00'
+
+
+def git_commit():
+    """Current commit sha, with '-dirty' for uncommitted changes"""
+    try:
+        sha = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return sha + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def create_benchmark_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pipeline_benchmarks (
+            id BIGSERIAL PRIMARY KEY,
+            benchmark_id VARCHAR(100) NOT NULL,
+            git_commit VARCHAR(60),
+            scale_rows BIGINT NOT NULL,
+            step VARCHAR(255) NOT NULL,
+            duration_seconds DOUBLE PRECISION NOT NULL,
+            rows_processed BIGINT,
+            details JSONB,
+            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS pipeline_benchmarks_step
+        ON pipeline_benchmarks (scale_rows, step, recorded_at)
+    """)
+
+
+def _raw_tables_sql(schema):
+    # Same layout as init.sql; the indexes are built after the first load
+    return f"""
+        CREATE SCHEMA IF NOT EXISTS {schema};
+        DROP TABLE IF EXISTS {schema}.customers, {schema}.transactions;
+        CREATE TABLE {schema}.customers (
+            customer_id VARCHAR(50),
+            name VARCHAR(255),
+            email VARCHAR(255),
+            region VARCHAR(100),
+            signup_date DATE,
+            load_batch_id BIGINT,
+            loaded_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc')
+        );
+        CREATE TABLE {schema}.transactions (
+            transaction_id VARCHAR(50),
+            customer_id VARCHAR(50),
+            amount DECIMAL(10,2),
+            transaction_date DATE,
+            status VARCHAR(50),
+            load_batch_id BIGINT,
+            loaded_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc')
+        );
+    """
+
+
+def _raw_indexes_sql(schema):
+    return f"""
+        CREATE INDEX IF NOT EXISTS bench_customers_id ON {schema}.customers (customer_id);
+        CREATE INDEX IF NOT EXISTS bench_transactions_id ON {schema}.transactions (transaction_id);
+        CREATE INDEX IF NOT EXISTS bench_transactions_customer ON {schema}.transactions (customer_id);
+        CREATE INDEX IF NOT EXISTS bench_transactions_date ON {schema}.transactions (transaction_date);
+        CREATE INDEX IF NOT EXISTS bench_customers_loaded_at ON {schema}.customers (loaded_at);
+        CREATE INDEX IF NOT EXISTS bench_transactions_loaded_at ON {schema}.transactions (loaded_at);
+        ANALYZE {schema}.customers;
+        ANALYZE {schema}.transactions;
+    """
+
+
+def _mix(expression, seed, modulus):
+    """Deterministic pseudo-random value in [0, modulus) from a bigint expression"""
+    return f"((({expression})::bigint * 2654435761 + {seed}) % {modulus})"
+
+
+def customers_sql(schema, first, last, seed, batch_id, loaded_at):
+    """Customers first..last; about 1% dirty ids/emails/regions"""
+    g = 'g'
+    return f"""
+        INSERT INTO {schema}.customers
+            (customer_id, name, email, region, signup_date, load_batch_id, loaded_at)
+        SELECT
+            CASE WHEN {_mix(g, seed, 997)} = 0 THEN 'C-' || g
+                 WHEN {_mix(g, seed + 1, 991)} = 0 THEN ' ' || (1000000 + g) || ' '
+                 ELSE (1000000 + g)::text END,
+            CASE WHEN {_mix(g, seed + 2, 211)} = 0 THEN 'Mononym' || g
+                 ELSE '  First' || g || ' Middle Last' || g || ' ' END,
+            CASE WHEN {_mix(g, seed + 3, 101)} = 0 THEN NULL
+                 WHEN {_mix(g, seed + 4, 103)} = 0 THEN ''
+                 ELSE 'Customer' || g || '@Example.com' END,
+            (ARRAY['North', 'South', 'East', 'West', ' north ', ''])[1 + {_mix(g, seed + 5, 6)}],
+            DATE '2020-01-01' + {_mix(g, seed + 6, 1800)}::int,
+            {batch_id},
+            TIMESTAMP '{loaded_at}' + ({_mix(g, seed + 7, 3600)} * interval '1 second')
+        FROM generate_series({first}::bigint, {last}::bigint) AS g
+    """
+
+
+def transactions_sql(schema, first, last, customers, seed, batch_id, loaded_at, late_days=0):
+    """Transactions first..last over the past year; about 1% dirty values
+
+    With late_days, every 20th row is dated late_days earlier (late-arriving data).
+    """
+    g = 'g'
+    return f"""
+        INSERT INTO {schema}.transactions
+            (transaction_id, customer_id, amount, transaction_date, status, load_batch_id, loaded_at)
+        SELECT
+            CASE WHEN {_mix(g, seed, 1000)} = 0 THEN 'TXN' || g ELSE g::text END,
+            CASE WHEN {_mix(g, seed + 1, 499)} = 0 THEN NULL
+                 WHEN {_mix(g, seed + 2, 503)} = 0 THEN 'unknown'
+                 ELSE (1000001 + {_mix(g, seed + 3, customers)})::text END,
+            CASE WHEN {_mix(g, seed + 4, 797)} = 0 THEN NULL
+                 WHEN {_mix(g, seed + 5, 809)} = 0 THEN -1 * ({_mix(g, seed + 6, 10000)} / 100.0)
+                 ELSE {_mix(g, seed + 7, 100000)} / 100.0 END,
+            DATE '2024-12-31' - {_mix(g, seed + 8, 365)}::int
+                - CASE WHEN {late_days} > 0 AND g % 20 = 0 THEN {late_days} ELSE 0 END,
+            (ARRAY['SUCCESS', 'SUCCESS', 'success', ' FAILED ', 'PENDING', 'REFUND', 'PAID', '', 'unknown'])
+                [1 + {_mix(g, seed + 9, 9)}],
+            {batch_id},
+            TIMESTAMP '{loaded_at}' + ({_mix(g, seed + 10, 3600)} * interval '1 second')
+        FROM generate_series({first}::bigint, {last}::bigint) AS g
+    """
+
+
+class Benchmark:
+    """Runs the timed steps and records them in pipeline_benchmarks"""
+
+    def __init__(self, conn, rows, seed, schema, incremental_percent):
+        self.conn = conn
+        self.rows = rows
+        self.customers = max(1, rows // TRANSACTIONS_PER_CUSTOMER)
+        self.seed = seed
+        self.schema = schema
+        self.incremental_rows = max(1, int(rows * incremental_percent / 100))
+        self.benchmark_id = f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        self.commit = git_commit()
+        self.timings = []
+
+    def record(self, step, duration, rows_processed=None, details=None):
+        self.timings.append((step, duration, rows_processed))
+        rate = f", {rows_processed / duration:,.0f} rows/s" if rows_processed and duration > 0 else ""
+        print(f"   {step:<50} {duration:9.2f}s{rate}")
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            INSERT INTO pipeline_benchmarks
+                (benchmark_id, git_commit, scale_rows, step, duration_seconds, rows_processed, details)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (self.benchmark_id, self.commit, self.rows, step, duration, rows_processed,
+              json.dumps(details or {})))
+        self.conn.commit()
+
+    def timed_sql(self, step, sql, rows_processed=None):
+        cursor = self.conn.cursor()
+        started = time.perf_counter()
+        cursor.execute(sql)
+        self.conn.commit()
+        self.record(step, time.perf_counter() - started, rows_processed or cursor.rowcount)
+
+    def generate(self):
+        """Initial load: customers, re-loaded duplicates and transactions"""
+        cursor = self.conn.cursor()
+        cursor.execute(_raw_tables_sql(self.schema))
+        self.conn.commit()
+
+        self.timed_sql('generate customers',
+                       customers_sql(self.schema, 1, self.customers, self.seed, 1, INITIAL_LOADED_AT))
+        self.timed_sql('generate transactions',
+                       transactions_sql(self.schema, 1, self.rows, self.customers, self.seed, 1,
+                                        INITIAL_LOADED_AT))
+        # The same ids loaded again in a later batch: the staging dedup keeps these
+        duplicates = max(1, self.customers // 50)
+        self.timed_sql('generate duplicate customers',
+                       customers_sql(self.schema, 1, duplicates, self.seed + 100, 2,
+                                     '2025-01-01 06:00:00'))
+        self.timed_sql('index raw tables', _raw_indexes_sql(self.schema), self.rows + self.customers)
+
+    def generate_incremental(self):
+        """Second load: new transactions, corrections of existing ones and late-arriving dates"""
+        new_first = self.rows + 1
+        new_last = self.rows + self.incremental_rows
+        self.timed_sql('generate incremental transactions',
+                       transactions_sql(self.schema, new_first, new_last, self.customers, self.seed, 3,
+                                        INCREMENTAL_LOADED_AT, late_days=30))
+        corrections = max(1, self.incremental_rows // 10)
+        self.timed_sql('generate corrected transactions',
+                       transactions_sql(self.schema, 1, corrections, self.customers, self.seed + 200, 3,
+                                        INCREMENTAL_LOADED_AT, late_days=30))
+        self.conn.cursor().execute(f"ANALYZE {self.schema}.transactions")
+        self.conn.commit()
+
+    def dbt_run(self, label, full_refresh=False):
+        """Time one dbt run and each model in it; returns the run_results.json path"""
+        args = ['dbt', 'run', '--target-path', BENCHMARK_TARGET_PATH]
+        if full_refresh:
+            args.append('--full-refresh')
+        env = dict(os.environ, DBT_SOURCE_SCHEMA=self.schema)
+        started = time.perf_counter()
+        result = subprocess.run(args, env=env, capture_output=True, text=True)
+        duration = time.perf_counter() - started
+        if result.returncode != 0:
+            print(result.stdout[-4000:])
+            raise RuntimeError(f"{' '.join(args)} failed with exit code {result.returncode}")
+
+        run_results = os.path.join(BENCHMARK_TARGET_PATH, 'run_results.json')
+        for _, node in iter_run_results(run_results):
+            self.record(f"{label}: {node.get('unique_id')}", node.get('execution_time') or 0.0,
+                        (node.get('adapter_response') or {}).get('rows_affected'),
+                        {'status': node.get('status')})
+        self.record(f"{label}: total", duration)
+        return run_results
+
+    def soda_and_ingest(self, run_results):
+        started = time.perf_counter()
+        scan_results, unparsed = run_sharded_scan(SODA_PROJECT_DIR)
+        self.record('soda scan', time.perf_counter() - started,
+                    details={'shards_without_json': sorted(unparsed)})
+
+        create_validation_tables(self.conn)
+        started = time.perf_counter()
+        save_dbt_results(self.conn, iter_run_results(run_results))
+        self.record('ingest dbt results', time.perf_counter() - started)
+        if scan_results is not None:
+            started = time.perf_counter()
+            checks, metrics = ingest_soda_json(self.conn, scan_results)
+            self.record('ingest soda results', time.perf_counter() - started, checks + metrics)
+
+    def run(self):
+        create_benchmark_table(self.conn.cursor())
+        self.conn.commit()
+        print(f"⏱️ Benchmark {self.benchmark_id} ({self.rows:,} transactions, "
+              f"{self.customers:,} customers, commit {self.commit})")
+        self.generate()
+        self.dbt_run('dbt full refresh', full_refresh=True)
+        self.generate_incremental()
+        run_results = self.dbt_run('dbt incremental')
+        self.soda_and_ingest(run_results)
+
+
+def compare(conn, rows):
+    """Print the latest benchmark at this scale next to the previous one"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT benchmark_id, git_commit
+        FROM pipeline_benchmarks
+        WHERE scale_rows = %s
+        GROUP BY benchmark_id, git_commit
+        ORDER BY max(recorded_at) DESC
+        LIMIT 2
+    """, (rows,))
+    runs = cursor.fetchall()
+    if len(runs) < 2:
+        print(f"Need two benchmarks at {rows:,} rows to compare")
+        return
+    (current, current_commit), (previous, previous_commit) = runs
+    cursor.execute("""
+        SELECT step,
+               max(duration_seconds) FILTER (WHERE benchmark_id = %s),
+               max(duration_seconds) FILTER (WHERE benchmark_id = %s)
+        FROM pipeline_benchmarks
+        WHERE benchmark_id IN (%s, %s)
+        GROUP BY step
+        ORDER BY step
+    """, (previous, current, previous, current))
+    print(f"{'step':<50} {previous_commit[:12]:>12} {current_commit[:12]:>12}   change")
+    for step, before, after in cursor.fetchall():
+        change = f"{(after - before) / before * 100:+6.1f}%" if before and after is not None else ""
+        before_text = f"{before:.2f}s" if before is not None else "-"
+        after_text = f"{after:.2f}s" if after is not None else "-"
+        print(f"{step:<50} {before_text:>12} {after_text:>12}   {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic data")
+    parser.add_argument('--rows', type=int, default=1_000_000,
+                        help="Transactions to generate (customers are a tenth of this)")
+    parser.add_argument('--seed', type=int, default=42, help="Seed of the generated data")
+    parser.add_argument('--schema', default=os.getenv('DBT_SOURCE_SCHEMA', 'bench_raw'),
+                        help="Schema the raw tables are generated in (DBT_SOURCE_SCHEMA)")
+    parser.add_argument('--incremental-percent', type=float, default=1.0,
+                        help="Size of the incremental load as a percentage of --rows")
+    parser.add_argument('--compare', action='store_true',
+                        help="Compare the last two benchmarks at --rows instead of running one")
+    args = parser.parse_args()
+
+    if args.schema == 'public' and not args.compare:
+        print("Refusing to overwrite the raw tables in the public schema; use --schema")
+        sys.exit(2)
+
+    conn = connect_to_db()
+    if not conn:
+        print("Failed to connect to database")
+        sys.exit(1)
+    try:
+        if args.compare:
+            compare(conn, args.rows)
+        else:
+            Benchmark(conn, args.rows, args.seed, args.schema, args.incremental_percent).run()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
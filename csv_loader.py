@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Streaming, validating CSV loader for the raw customers / transactions tables
+
+Files are read in chunks of LOAD_CHUNK_ROWS records and validated a column
+at a time: ids, amounts, dates, statuses and emails are normalized into
+the form the staging models expect, good rows are written with COPY FROM
+STDIN and rejected rows go to raw_load_rejects with their reasons and the
+original record. Every file is one load batch: its rows carry the batch's
+load_batch_id and loaded_at (so the incremental staging models pick them
+up), and the batch with its row counts and duration is kept in
+raw_load_batches. A file is loaded in one transaction, so a failed file
+leaves nothing behind; loaded_at is stamped as that transaction
+commits, so it follows commit order across concurrent loads. Several
+files are loaded concurrently, one process and connection per file.
+
+The target table is taken from --table or from the file name
+(customers*.csv, transactions*.csv[.gz]).
+
+Usage:
+    python csv_loader.py FILE [FILE ...] [--table customers|transactions] [--schema public]
+                         [--workers N] [--chunk-rows N]
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from itertools import islice
+
+LOAD_CHUNK_ROWS = int(os.getenv('LOAD_CHUNK_ROWS', '50000'))
+LOAD_WORKERS = int(os.getenv('LOAD_WORKERS', '4'))
+LOAD_ENCODING = os.getenv('LOAD_ENCODING', 'utf-8-sig')
+LOAD_ALLOWED_STATUSES = frozenset(
+    s.strip().upper()
+    for s in os.getenv('LOAD_ALLOWED_STATUSES', 'SUCCESS,COMPLETED,PAID,FAILED,PENDING,REFUND').split(',')
+    if s.strip()
+)
+
+ID_PATTERN = re.compile(r'[0-9]+')
+AMOUNT_PATTERN = re.compile(r'[-+]?[0-9]+(\.[0-9]+)?')
+AMOUNT_NOISE = re.compile(r'[\s$]')
+# Commas are only accepted as thousands separators; "1,5" may be a decimal comma
+THOUSANDS_PATTERN = re.compile(r'[-+]?[0-9]{1,3}(,[0-9]{3})+(\.[0-9]+)?')
+DATE_PATTERN = re.compile(r'([0-9]{4})[-/]([0-9]{1,2})[-/]([0-9]{1,2})(?:[ T].*)?')
+EMAIL_PATTERN = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
+WHITESPACE = re.compile(r'\s+')
+CENT = Decimal('0.01')
+# DECIMAL(10,2)
+MAX_AMOUNT = Decimal('99999999.99')
+
+
+# Column normalizers: take the raw values of one column for a whole chunk
+# and return (values, errors), with errors[i] a reason or None
+
+def _ids(values):
+    cleaned, errors = [], []
+    for value in values:
+        value = value.strip()
+        if not value:
+            cleaned.append(None)
+            errors.append(None)
+        elif ID_PATTERN.fullmatch(value):
+            cleaned.append(value.lstrip('0') or '0')
+            errors.append(None)
+        else:
+            cleaned.append(None)
+            errors.append(f"non-numeric id {value!r}")
+    return cleaned, errors
+
+
+def _amounts(values):
+    cleaned, errors = [], []
+    for value in values:
+        value = AMOUNT_NOISE.sub('', value)
+        if not value:
+            cleaned.append(None)
+            errors.append(None)
+            continue
+        if ',' in value:
+            if not THOUSANDS_PATTERN.fullmatch(value):
+                cleaned.append(None)
+                errors.append(f"ambiguous comma in amount {value!r}")
+                continue
+            value = value.replace(',', '')
+        amount = None
+        if AMOUNT_PATTERN.fullmatch(value):
+            try:
+                amount = Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+            except InvalidOperation:
+                amount = None
+        if amount is None:
+            cleaned.append(None)
+            errors.append(f"invalid amount {value!r}")
+        elif abs(amount) > MAX_AMOUNT:
+            cleaned.append(None)
+            errors.append(f"amount out of range {value!r}")
+        else:
+            cleaned.append(str(amount))
+            errors.append(None)
+    return cleaned, errors
+
+
+def _dates(values):
+    cleaned, errors = [], []
+    for value in values:
+        value = value.strip()
+        if not value:
+            cleaned.append(None)
+            errors.append(None)
+            continue
+        match = DATE_PATTERN.fullmatch(value)
+        try:
+            day = date(*(int(part) for part in match.groups())) if match else None
+        except ValueError:
+            day = None
+        cleaned.append(day.isoformat() if day else None)
+        errors.append(None if day else f"invalid date {value!r}")
+    return cleaned, errors
+
+
+def _statuses(values):
+    cleaned = [value.strip().upper() or None for value in values]
+    errors = [
+        f"unknown status {status!r}" if status and status not in LOAD_ALLOWED_STATUSES else None
+        for status in cleaned
+    ]
+    return cleaned, errors
+
+
+def _emails(values):
+    cleaned = [value.strip().lower() or None for value in values]
+    errors = [
+        f"invalid email {email!r}" if email and not EMAIL_PATTERN.fullmatch(email) else None
+        for email in cleaned
+    ]
+    return cleaned, errors
+
+
+def _texts(values):
+    return [WHITESPACE.sub(' ', value).strip() or None for value in values], [None] * len(values)
+
+
+# Target table -> ((column, normalizer, required), ...) in COPY order
+LOAD_TABLES = {
+    'customers': (
+        ('customer_id', _ids, True),
+        ('name', _texts, False),
+        ('email', _emails, True),
+        ('region', _texts, False),
+        ('signup_date', _dates, False),
+    ),
+    'transactions': (
+        ('transaction_id', _ids, True),
+        ('customer_id', _ids, True),
+        ('amount', _amounts, True),
+        ('transaction_date', _dates, True),
+        ('status', _statuses, False),
+    ),
+}
+
+REJECT_COLUMNS = ('load_batch_id', 'target_table', 'source_file', 'line_number', 'reasons', 'raw_record')
+
+
+def create_load_tables(cursor, schema):
+    """Create the batch and reject tables; the caller commits
+
+    CREATE TABLE IF NOT EXISTS is not safe against a concurrent create of
+    the same table, so loaders take a transaction-level advisory lock first.
+    """
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext('csv_loader.create_load_tables'))")
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.raw_load_batches (
+            load_batch_id BIGSERIAL PRIMARY KEY,
+            target_table VARCHAR(100) NOT NULL,
+            source_file TEXT NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            rows_loaded BIGINT,
+            rows_rejected BIGINT,
+            duration_seconds DOUBLE PRECISION,
+            loaded_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc'),
+            finished_at TIMESTAMP
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.raw_load_rejects (
+            id BIGSERIAL PRIMARY KEY,
+            load_batch_id BIGINT NOT NULL,
+            target_table VARCHAR(100) NOT NULL,
+            source_file TEXT NOT NULL,
+            line_number BIGINT,
+            reasons TEXT NOT NULL,
+            raw_record JSONB,
+            rejected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS raw_load_rejects_batch
+        ON {schema}.raw_load_rejects (load_batch_id)
+    """)
+
+
+def table_for_file(path):
+    name = os.path.basename(path).lower()
+    for table in LOAD_TABLES:
+        if name.startswith(table):
+            return table
+    raise ValueError(f"Cannot tell the target table of {path}; use --table")
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding=LOAD_ENCODING, newline='')
+    return open(path, 'r', encoding=LOAD_ENCODING, newline='')
+
+
+def read_chunks(f, columns, chunk_rows=None):
+    """Yield (header, [(line_number, record), ...]) chunks of a CSV file
+
+    The header is matched case-insensitively; columns the table does not
+    have are ignored, and a missing table column is an error.
+    """
+    reader = csv.reader(f)
+    header = [name.strip().lower() for name in next(reader, [])]
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise ValueError(f"CSV header is missing columns: {', '.join(missing)}")
+    chunk_rows = chunk_rows or LOAD_CHUNK_ROWS
+    while True:
+        records = [(reader.line_num, record) for record in islice(reader, chunk_rows)]
+        if not records:
+            return
+        # Blank lines are skipped rather than rejected
+        yield header, [(line, record) for line, record in records if record]
+
+
+def validate_chunk(table, header, chunk):
+    """Split a chunk into (good rows in COPY column order, [(line_number, reasons, raw record)])
+
+    Raw records of rejects are {header: value} dicts, or the field list when
+    the record has the wrong number of fields.
+    """
+    spec = LOAD_TABLES[table]
+    positions = {name: i for i, name in enumerate(header)}
+    width = len(header)
+    shaped = [(line, record) for line, record in chunk if len(record) == width]
+    rejects = [
+        (line, [f"expected {width} fields, got {len(record)}"], record)
+        for line, record in chunk if len(record) != width
+    ]
+
+    columns, errors = [], []
+    for column, normalize, required in spec:
+        cleaned, column_errors = normalize([record[positions[column]] for _, record in shaped])
+        if required:
+            column_errors = [
+                error or (f"missing {column}" if value is None else None)
+                for value, error in zip(cleaned, column_errors)
+            ]
+        columns.append(cleaned)
+        errors.append(column_errors)
+
+    good = []
+    for i, row in enumerate(zip(*columns)):
+        reasons = [column_errors[i] for column_errors in errors if column_errors[i]]
+        if reasons:
+            line, record = shaped[i]
+            rejects.append((line, reasons, dict(zip(header, record))))
+        else:
+            good.append(row)
+    return good, rejects
+
+
+def _publish(cursor, schema, table, columns, batch_id):
+    """Move the staged rows into the raw table; returns their loaded_at
+
+    The staging models only read rows loaded after the latest loaded_at
+    they have seen, so batches must become visible in loaded_at order.
+    Publishing holds an advisory lock until the caller commits: loaded_at
+    is read under it, so a batch stamped later also commits later.
+    """
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext('csv_loader.publish'))")
+    cursor.execute("SELECT clock_timestamp() at time zone 'utc'")
+    loaded_at = cursor.fetchone()[0]
+    column_list = ', '.join(columns)
+    cursor.execute(f"""
+        INSERT INTO {schema}.{table} ({column_list}, load_batch_id, loaded_at)
+        SELECT {column_list}, %s, %s FROM raw_load_rows
+    """, (batch_id, loaded_at))
+    return loaded_at
+
+
+def load_file(path, table=None, schema='public', chunk_rows=None):
+    """Load one CSV file as one batch; returns its load statistics"""
+    from save_validation_results import connect_to_db, bulk_insert
+
+    table = table or table_for_file(path)
+    spec = LOAD_TABLES[table]
+    columns = [column for column, _, _ in spec]
+    conn = connect_to_db()
+    if not conn:
+        raise RuntimeError("Failed to connect to database")
+    try:
+        cursor = conn.cursor()
+        create_load_tables(cursor, schema)
+        cursor.execute(f"""
+            INSERT INTO {schema}.raw_load_batches (target_table, source_file, status)
+            VALUES (%s, %s, 'loading')
+            RETURNING load_batch_id
+        """, (table, path))
+        batch_id = cursor.fetchone()[0]
+        conn.commit()
+
+        started = time.perf_counter()
+        counts = {'read': 0, 'rejected': 0}
+        rejects = []
+
+        def flush_rejects():
+            bulk_insert(cursor, f"{schema}.raw_load_rejects", REJECT_COLUMNS, (
+                (batch_id, table, path, line, '; '.join(reasons), json.dumps(record))
+                for line, reasons, record in rejects
+            ))
+            rejects.clear()
+
+        def good_rows(f):
+            # Runs between COPY batches, so rejects can be flushed on the same cursor
+            for header, chunk in read_chunks(f, columns, chunk_rows):
+                good, bad = validate_chunk(table, header, chunk)
+                counts['read'] += len(chunk)
+                counts['rejected'] += len(bad)
+                rejects.extend(bad)
+                if len(rejects) >= (chunk_rows or LOAD_CHUNK_ROWS):
+                    flush_rejects()
+                yield from good
+
+        try:
+            # Rows are staged first and published with their loaded_at in the final transaction
+            cursor.execute(f"""
+                CREATE TEMP TABLE raw_load_rows ON COMMIT DROP AS
+                SELECT {', '.join(columns)} FROM {schema}.{table} WITH NO DATA
+            """)
+            with _open(path) as f:
+                loaded = bulk_insert(cursor, 'raw_load_rows', columns, good_rows(f),
+                                     batch_size=chunk_rows or LOAD_CHUNK_ROWS, method='copy')
+            if rejects:
+                flush_rejects()
+            loaded_at = _publish(cursor, schema, table, columns, batch_id)
+            duration = time.perf_counter() - started
+            cursor.execute(f"""
+                UPDATE {schema}.raw_load_batches
+                SET status = 'loaded', rows_loaded = %s, rows_rejected = %s,
+                    duration_seconds = %s, loaded_at = %s, finished_at = now() at time zone 'utc'
+                WHERE load_batch_id = %s
+            """, (loaded, counts['rejected'], duration, loaded_at, batch_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            cursor.execute(f"""
+                UPDATE {schema}.raw_load_batches
+                SET status = 'failed', finished_at = now() at time zone 'utc'
+                WHERE load_batch_id = %s
+            """, (batch_id,))
+            conn.commit()
+            raise
+        return dict(path=path, table=table, load_batch_id=batch_id, read=counts['read'],
+                    loaded=loaded, rejected=counts['rejected'], seconds=duration)
+    finally:
+        conn.close()
+
+
+def _report(stats):
+    rate = stats['read'] / stats['seconds'] if stats['seconds'] > 0 else float(stats['read'])
+    print(f"   {stats['path']}: batch {stats['load_batch_id']} -> {stats['table']}, "
+          f"{stats['loaded']} loaded, {stats['rejected']} rejected in {stats['seconds']:.2f}s "
+          f"({rate:,.0f} rows/s)")
+
+
+def load_files(paths, table=None, schema='public', workers=None, chunk_rows=None):
+    """Load files concurrently (one process per file); returns the per-file statistics"""
+    from save_validation_results import connect_to_db
+
+    workers = max(1, min(workers or LOAD_WORKERS, len(paths)))
+    started = time.perf_counter()
+    results, failures = [], []
+    print(f"📥 Loading {len(paths)} file(s) into {schema} with {workers} worker(s)")
+    # Once, before the workers start, rather than racing in every worker
+    conn = connect_to_db()
+    if not conn:
+        raise RuntimeError("Failed to connect to database")
+    try:
+        create_load_tables(conn.cursor(), schema)
+        conn.commit()
+    finally:
+        conn.close()
+    if workers == 1:
+        for path in paths:
+            try:
+                results.append(load_file(path, table, schema, chunk_rows))
+                _report(results[-1])
+            except Exception as e:
+                failures.append(path)
+                print(f"   ❌ {path}: {e}")
+    else:
+        # Validation is CPU-bound Python, so files get processes rather than threads
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(load_file, path, table, schema, chunk_rows): path for path in paths}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                    _report(results[-1])
+                except Exception as e:
+                    failures.append(futures[future])
+                    print(f"   ❌ {futures[future]}: {e}")
+
+    elapsed = time.perf_counter() - started
+    read = sum(stats['read'] for stats in results)
+    rate = read / elapsed if elapsed > 0 else float(read)
+    print(f"✅ {read} rows read, {sum(s['loaded'] for s in results)} loaded, "
+          f"{sum(s['rejected'] for s in results)} rejected, {len(failures)} file(s) failed "
+          f"in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+    return results, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and bulk load raw CSV files")
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--table', choices=sorted(LOAD_TABLES), help="Target table (default: from the file name)")
+    parser.add_argument('--schema', default=os.getenv('DBT_SOURCE_SCHEMA', 'public'))
+    parser.add_argument('--workers', type=int, default=LOAD_WORKERS)
+    parser.add_argument('--chunk-rows', type=int, default=LOAD_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    _, failures = load_files(args.files, args.table, args.schema, args.workers, args.chunk_rows)
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
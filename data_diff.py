@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Compare a model between two relations with checksum bisection
+
+The key range of the two relations (e.g. dev and prod schemas, or a copy
+taken before a run and the model after it) is split into segments whose
+row count and summed row hashes are computed inside Postgres, one query
+per relation and level. Only segments whose checksums differ are split
+again, until they are small enough to fetch; then just the keys and row
+hashes of those segments are transferred and compared. Added, removed and
+changed keys are stored in data_diff_runs / data_diff_keys.
+
+Keys must be integer or date columns (transaction_id, customer_id,
+transaction_date). Rows with a null key are compared as one segment and
+only counted.
+
+Usage:
+    python data_diff.py SOURCE TARGET --key transaction_id [--exclude ingestion_ts]
+                        [--segments 32] [--leaf-rows 1000] [--no-save]
+    python data_diff.py --baseline-schema prod [--models stg_transactions:transaction_id,...]
+"""
+import argparse
+import math
+import os
+import time
+
+# Segments per split, and the size at which a mismatching segment is fetched instead of split
+DATA_DIFF_SEGMENTS = int(os.getenv('DATA_DIFF_SEGMENTS', '32'))
+DATA_DIFF_LEAF_ROWS = int(os.getenv('DATA_DIFF_LEAF_ROWS', '1000'))
+# Differing keys stored per diff (the counts are always complete)
+DATA_DIFF_MAX_KEYS = int(os.getenv('DATA_DIFF_MAX_KEYS', '10000'))
+# Columns never compared, e.g. load timestamps that differ between environments
+DATA_DIFF_EXCLUDE = [c.strip() for c in os.getenv('DATA_DIFF_EXCLUDE', '').split(',') if c.strip()]
+# model:key pairs compared by the CI stage
+DATA_DIFF_MODELS = os.getenv(
+    'DATA_DIFF_MODELS',
+    'stg_customers:customer_id,stg_transactions:transaction_id,'
+    'dim_customers:customer_id,fact_transactions:transaction_id'
+)
+
+INTEGER_TYPES = ('smallint', 'integer', 'bigint')
+# A row's hash as a 60-bit integer, so sums fit numeric without collisions from xor
+ROW_HASH = "('x' || substr(md5(row({columns})::text), 1, 15))::bit(60)::bigint"
+
+DIFF_KEY_COLUMNS = ('diff_id', 'key_value', 'change_type')
+
+
+def create_diff_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_diff_runs (
+            diff_id BIGSERIAL PRIMARY KEY,
+            source_relation VARCHAR(255) NOT NULL,
+            target_relation VARCHAR(255) NOT NULL,
+            key_column VARCHAR(255) NOT NULL,
+            compared_columns TEXT,
+            source_rows BIGINT,
+            target_rows BIGINT,
+            added INTEGER,
+            removed INTEGER,
+            changed INTEGER,
+            null_key_rows_match BOOLEAN,
+            column_changes TEXT,
+            segments_checked INTEGER,
+            rows_fetched BIGINT,
+            duration_seconds DOUBLE PRECISION,
+            diffed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        ALTER TABLE data_diff_runs
+        ADD COLUMN IF NOT EXISTS column_changes TEXT
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_diff_keys (
+            diff_id BIGINT NOT NULL,
+            key_value TEXT NOT NULL,
+            change_type VARCHAR(10) NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS data_diff_keys_diff
+        ON data_diff_keys (diff_id, change_type)
+    """)
+
+
+def _columns(cursor, relation):
+    """[(name, type)] of a relation in column order"""
+    cursor.execute("""
+        SELECT attname, format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+    """, (relation,))
+    return cursor.fetchall()
+
+
+class DataDiff:
+    """Checksum-bisection diff of two relations on an integer or date key
+
+    source is the reference (e.g. prod): keys only in target are 'added',
+    keys only in source are 'removed', keys in both with different rows
+    are 'changed'. Columns only in one relation, or with a different type,
+    cannot be compared row by row and are reported as column changes.
+    """
+
+    def __init__(self, cursor, source, target, key, columns=None, exclude=None,
+                 segments=None, leaf_rows=None):
+        self.cursor = cursor
+        self.source = source
+        self.target = target
+        self.key = key
+        self.segments = max(2, segments or DATA_DIFF_SEGMENTS)
+        self.leaf_rows = max(1, leaf_rows or DATA_DIFF_LEAF_ROWS)
+        exclude = DATA_DIFF_EXCLUDE if exclude is None else exclude
+
+        source_columns = dict(_columns(cursor, source))
+        target_columns = _columns(cursor, target)
+        key_type = source_columns.get(key)
+        if key_type is None or dict(target_columns).get(key) != key_type:
+            raise ValueError(f"Key {key} must exist with the same type in {source} and {target}")
+        # Segments are bisected on an integer view of the key; bounds are
+        # compared with the key column itself so its index can be used
+        if key_type in INTEGER_TYPES:
+            self.key_expression = f"t.{key}"
+            self.bound = "%s::bigint"
+        elif key_type == 'date':
+            self.key_expression = f"(t.{key} - DATE '1970-01-01')"
+            self.bound = "DATE '1970-01-01' + %s::integer"
+        else:
+            raise ValueError(f"Key {key} must be an integer or date column, not {key_type}")
+        self.key_type = key_type
+
+        # Columns present in both relations with the same type, in target order
+        selected = lambda name: name not in exclude and (columns is None or name in columns or name == key)
+        self.columns = [
+            name for name, column_type in target_columns
+            if source_columns.get(name) == column_type and selected(name)
+        ]
+        # The other selected columns: '+name' only in target, '-name' only in source,
+        # '~name (source type -> target type)'
+        target_types = dict(target_columns)
+        self.column_changes = [
+            f"+{name}" if name not in source_columns
+            else f"~{name} ({source_columns[name]} -> {column_type})"
+            for name, column_type in target_columns
+            if source_columns.get(name) != column_type and selected(name)
+        ] + [f"-{name}" for name in source_columns if name not in target_types and selected(name)]
+        self.row_hash = ROW_HASH.format(columns=', '.join(f't.{c}' for c in self.columns))
+        self.segments_checked = 0
+        self.rows_fetched = 0
+
+    def _key_range(self):
+        self.cursor.execute(f"""
+            SELECT min(lo), max(hi) FROM (
+                SELECT min({self.key_expression}) AS lo, max({self.key_expression}) AS hi FROM {self.source} t
+                UNION ALL
+                SELECT min({self.key_expression}), max({self.key_expression}) FROM {self.target} t
+            ) bounds
+        """)
+        return self.cursor.fetchone()
+
+    def _ranges(self, segments):
+        """WHERE clause and parameters selecting the rows of half-open key segments"""
+        # Adjacent segments are merged, so a level's first split is one range
+        merged = []
+        for lo, hi in sorted(segments):
+            if merged and merged[-1][1] == lo:
+                merged[-1][1] = hi
+            else:
+                merged.append([lo, hi])
+        clause = " OR ".join(
+            f"(t.{self.key} >= {self.bound} AND t.{self.key} < {self.bound})" for _ in merged
+        )
+        return clause, [bound for segment in merged for bound in segment]
+
+    def _checksums(self, relation, segments):
+        """{(lo, hi): (rows, hash sum)} for sorted, non-overlapping half-open key segments
+
+        Rows are assigned to segments with width_bucket over the segment
+        bounds, so every relation is read once per level.
+        """
+        bounds = sorted({bound for segment in segments for bound in segment})
+        clause, params = self._ranges(segments)
+        self.cursor.execute(f"""
+            SELECT width_bucket(({self.key_expression})::bigint, %s::bigint[]) AS bucket,
+                   count(*), coalesce(sum({self.row_hash}), 0)
+            FROM {relation} t
+            WHERE {clause}
+            GROUP BY bucket
+        """, [bounds] + params)
+        checksums = {segment: (0, 0) for segment in segments}
+        for bucket, count, total in self.cursor.fetchall():
+            segment = (bounds[bucket - 1], bounds[bucket])
+            checksums[segment] = (count, total)
+        return checksums
+
+    def _row_hashes(self, relation, segments):
+        """{key: sorted row hashes} of the rows in the given segments"""
+        clause, params = self._ranges(segments)
+        self.cursor.execute(f"""
+            SELECT t.{self.key}::text, md5(row({', '.join(f't.{c}' for c in self.columns)})::text)
+            FROM {relation} t
+            WHERE {clause}
+        """, params)
+        rows = self.cursor.fetchall()
+        self.rows_fetched += len(rows)
+        hashes = {}
+        for key, row_hash in rows:
+            hashes.setdefault(key, []).append(row_hash)
+        return {key: sorted(values) for key, values in hashes.items()}
+
+    def _null_keys_match(self):
+        self.cursor.execute(f"""
+            SELECT (SELECT (count(*), coalesce(sum({self.row_hash}), 0))
+                    FROM {self.source} t WHERE t.{self.key} IS NULL)
+                 = (SELECT (count(*), coalesce(sum({self.row_hash}), 0))
+                    FROM {self.target} t WHERE t.{self.key} IS NULL)
+        """)
+        return self.cursor.fetchone()[0]
+
+    def _split(self, lo, hi):
+        step = max(1, math.ceil((hi - lo) / self.segments))
+        return [(start, min(start + step, hi)) for start in range(lo, hi, step)]
+
+    def run(self):
+        """Return (summary dict, {key: change type})"""
+        started = time.perf_counter()
+        lo, hi = self._key_range()
+        changes = {}
+        totals = [0, 0]
+        segments = self._split(lo, hi + 1) if lo is not None else []
+        first_level = True
+
+        while segments:
+            self.segments_checked += len(segments)
+            source = self._checksums(self.source, segments)
+            target = self._checksums(self.target, segments)
+            if first_level:
+                totals = [sum(c for c, _ in source.values()), sum(c for c, _ in target.values())]
+                first_level = False
+
+            leaves, next_segments = [], []
+            for segment in segments:
+                if source[segment] == target[segment]:
+                    continue
+                rows = max(source[segment][0], target[segment][0])
+                if rows <= self.leaf_rows or segment[1] - segment[0] <= 1:
+                    leaves.append(segment)
+                else:
+                    next_segments.extend(self._split(*segment))
+
+            if leaves:
+                before = self._row_hashes(self.source, leaves)
+                after = self._row_hashes(self.target, leaves)
+                for key in before.keys() | after.keys():
+                    if key not in before:
+                        changes[key] = 'added'
+                    elif key not in after:
+                        changes[key] = 'removed'
+                    elif before[key] != after[key]:
+                        changes[key] = 'changed'
+            segments = sorted(next_segments)
+
+        counts = {kind: sum(1 for change in changes.values() if change == kind)
+                  for kind in ('added', 'removed', 'changed')}
+        summary = dict(
+            source=self.source, target=self.target, key=self.key, columns=self.columns,
+            column_changes=self.column_changes,
+            source_rows=totals[0], target_rows=totals[1], null_keys_match=self._null_keys_match(),
+            segments_checked=self.segments_checked, rows_fetched=self.rows_fetched,
+            seconds=time.perf_counter() - started, **counts,
+        )
+        return summary, changes
+
+
+def _key_order(key_type):
+    return (lambda k: int(k)) if key_type in INTEGER_TYPES else (lambda k: k)
+
+
+def save_diff(conn, summary, changes, key_type='bigint', max_keys=None):
+    """Store a diff and up to max_keys of its differing keys; returns the diff_id"""
+    from save_validation_results import bulk_insert
+
+    max_keys = DATA_DIFF_MAX_KEYS if max_keys is None else max_keys
+    cursor = conn.cursor()
+    create_diff_tables(cursor)
+    cursor.execute("""
+        INSERT INTO data_diff_runs
+            (source_relation, target_relation, key_column, compared_columns, source_rows, target_rows,
+             added, removed, changed, null_key_rows_match, column_changes, segments_checked, rows_fetched,
+             duration_seconds)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING diff_id
+    """, (summary['source'], summary['target'], summary['key'], ','.join(summary['columns']),
+          summary['source_rows'], summary['target_rows'], summary['added'], summary['removed'],
+          summary['changed'], summary['null_keys_match'], ','.join(summary['column_changes']) or None,
+          summary['segments_checked'],
+          summary['rows_fetched'], summary['seconds']))
+    diff_id = cursor.fetchone()[0]
+    keys = sorted(changes, key=_key_order(key_type))[:max_keys]
+    bulk_insert(cursor, 'data_diff_keys', DIFF_KEY_COLUMNS,
+                ((diff_id, key, changes[key]) for key in keys))
+    conn.commit()
+    return diff_id
+
+
+def has_changes(summary):
+    return bool(summary['added'] or summary['removed'] or summary['changed']
+                or not summary['null_keys_match'] or summary['column_changes'])
+
+
+def format_summary(summary):
+    status = "identical" if not has_changes(summary) else (
+        f"+{summary['added']} added, -{summary['removed']} removed, ~{summary['changed']} changed"
+        + ("" if summary['null_keys_match'] else ", null-key rows differ")
+        + (f", columns not compared: {', '.join(summary['column_changes'])}"
+           if summary['column_changes'] else "")
+    )
+    return (f"{summary['target']} vs {summary['source']} on {summary['key']}: {status} "
+            f"({summary['source_rows']} -> {summary['target_rows']} rows, "
+            f"{summary['segments_checked']} segments, {summary['rows_fetched']} rows fetched, "
+            f"{summary['seconds']:.2f}s)")
+
+
+def parse_models(spec):
+    """'model:key,model:key' -> [(model, key)]"""
+    return [tuple(item.strip().split(':', 1)) for item in spec.split(',') if item.strip()]
+
+
+def diff_models(conn, baseline_schema, target_schema, models=None, save=True):
+    """Diff each model against its copy in baseline_schema; returns (summaries, errors)"""
+    summaries, errors = [], []
+    for model, key in parse_models(models or DATA_DIFF_MODELS):
+        source, target = f"{baseline_schema}.{model}", f"{target_schema}.{model}"
+        try:
+            diff = DataDiff(conn.cursor(), source, target, key)
+            summary, changes = diff.run()
+            conn.rollback()
+            if save:
+                save_diff(conn, summary, changes, diff.key_type)
+            summaries.append(summary)
+        except Exception as e:
+            conn.rollback()
+            errors.append(f"{target} vs {source}: {e}")
+    return summaries, errors
+
+
+def ci_diff(baseline_schema, target_schema=None, models=None, fail_on_changes=False):
+    """(success, output) for the pipeline's data diff stage"""
+    from save_validation_results import connect_to_db
+
+    target_schema = target_schema or os.getenv('DB_SCHEMA', 'public')
+    conn = connect_to_db()
+    if not conn:
+        return False, "Failed to connect to database"
+    try:
+        summaries, errors = diff_models(conn, baseline_schema, target_schema, models)
+    finally:
+        conn.close()
+    lines = [format_summary(summary) for summary in summaries] + [f"ERROR {error}" for error in errors]
+    changed = any(has_changes(summary) for summary in summaries)
+    return not errors and not (fail_on_changes and changed), "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checksum-bisection diff of two relations")
+    parser.add_argument('source', nargs='?', help="Reference relation, e.g. prod.fact_transactions")
+    parser.add_argument('target', nargs='?', help="Compared relation, e.g. public.fact_transactions")
+    parser.add_argument('--key', help="Integer or date key column")
+    parser.add_argument('--exclude', default=','.join(DATA_DIFF_EXCLUDE),
+                        help="Comma-separated columns not compared (DATA_DIFF_EXCLUDE)")
+    parser.add_argument('--segments', type=int, default=DATA_DIFF_SEGMENTS)
+    parser.add_argument('--leaf-rows', type=int, default=DATA_DIFF_LEAF_ROWS)
+    parser.add_argument('--baseline-schema', help="Diff every model in --models against this schema")
+    parser.add_argument('--models', default=DATA_DIFF_MODELS, help="model:key pairs for --baseline-schema")
+    parser.add_argument('--no-save', action='store_true', help="Do not store the diff")
+    args = parser.parse_args()
+
+    from save_validation_results import connect_to_db
+    conn = connect_to_db()
+    if not conn:
+        print("Failed to connect to database")
+        raise SystemExit(1)
+    try:
+        if args.baseline_schema:
+            summaries, errors = diff_models(conn, args.baseline_schema, os.getenv('DB_SCHEMA', 'public'),
+                                            args.models, save=not args.no_save)
+            for summary in summaries:
+                print(format_summary(summary))
+            for error in errors:
+                print(f"❌ {error}")
+            raise SystemExit(1 if errors else 0)
+
+        if not (args.source and args.target and args.key):
+            parser.error("SOURCE, TARGET and --key are required without --baseline-schema")
+        exclude = [c.strip() for c in args.exclude.split(',') if c.strip()]
+        diff = DataDiff(conn.cursor(), args.source, args.target, args.key, exclude=exclude,
+                        segments=args.segments, leaf_rows=args.leaf_rows)
+        summary, changes = diff.run()
+        conn.rollback()
+        print(format_summary(summary))
+        for key in sorted(changes, key=_key_order(diff.key_type))[:20]:
+            print(f"   {changes[key]:<8} {key}")
+        if not args.no_save:
+            diff_id = save_diff(conn, summary, changes, diff.key_type)
+            print(f"   Saved as diff {diff_id}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
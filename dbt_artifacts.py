@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Incremental readers for dbt artifacts (run_results.json, manifest.json)
+
+The artifacts produced by large projects can be hundreds of MB, mostly
+compiled SQL. These readers walk the top-level object and yield the items
+of one large array/object one at a time, so memory stays bounded by the
+largest single item rather than by the whole document.
+"""
+import json
+import os
+
+CHUNK_SIZE = 1024 * 1024
+# Characters that may follow a complete value (':' after an object key)
+VALUE_DELIMITERS = frozenset(',:]} \t\r\n')
+
+
+class _StreamReader:
+    """Pull-based JSON tokenizer over a text file"""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _read(self, size):
+        """Append up to size characters from the file to the buffer"""
+        if self.eof:
+            return False
+        # Drop the consumed prefix so the buffer only holds unread data
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        data = self.f.read(size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer += data
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read(self.chunk_size):
+                raise ValueError("Unexpected end of JSON document")
+
+    def expect(self, char):
+        """Consume the next non-whitespace character, which must be char"""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos}, found '{found}'")
+        self.pos += 1
+
+    def value(self):
+        """Decode one complete JSON value, reading more input as needed"""
+        self.peek()
+        read_size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number cut by the end of the buffer decodes as its prefix
+                # ('-2.' | '5e10' gives -2), so it is only complete when a
+                # delimiter follows
+                if self.eof or (end < len(self.buffer) and self.buffer[end] in VALUE_DELIMITERS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Grow the read size so very large values are not re-parsed
+            # once per chunk
+            self._read(max(read_size, len(self.buffer) - self.pos))
+            read_size *= 2
+
+
+def iter_artifact(path, stream_key, streaming=True, chunk_size=CHUNK_SIZE):
+    """Yield (key, value) pairs for the top-level keys of a dbt artifact
+
+    For stream_key, each element of the array (or each (name, value) pair
+    of the object) is yielded separately under the same key instead of as
+    one value. Keys are yielded in document order, so for run_results.json
+    'metadata' arrives before 'results'.
+
+    With streaming=False the document is loaded with json.load and yielded
+    the same way.
+    """
+    if not streaming:
+        with open(path, 'r') as f:
+            document = json.load(f)
+        for key, value in document.items():
+            if key == stream_key and isinstance(value, list):
+                for item in value:
+                    yield key, item
+            elif key == stream_key and isinstance(value, dict):
+                for item in value.items():
+                    yield key, item
+            else:
+                yield key, value
+        return
+
+    with open(path, 'r') as f:
+        reader = _StreamReader(f, chunk_size)
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            container = reader.peek()
+            if key == stream_key and container in '[{':
+                reader.expect(container)
+                closing = ']' if container == '[' else '}'
+                if reader.peek() != closing:
+                    while True:
+                        if container == '[':
+                            yield key, reader.value()
+                        else:
+                            name = reader.value()
+                            reader.expect(':')
+                            yield key, (name, reader.value())
+                        if reader.peek() == ',':
+                            reader.expect(',')
+                            continue
+                        break
+                reader.expect(closing)
+            else:
+                yield key, reader.value()
+            if reader.peek() == ',':
+                reader.expect(',')
+                continue
+            reader.expect('}')
+            return
+
+
+def iter_run_results(path, streaming=True):
+    """Yield (metadata, result) for each node result in run_results.json"""
+    metadata = {}
+    for key, value in iter_artifact(path, 'results', streaming=streaming):
+        if key == 'metadata':
+            metadata = value
+        elif key == 'results':
+            yield metadata, value
+
+
+def iter_manifest_nodes(path, streaming=True):
+    """Yield (unique_id, node) for each entry of manifest.json 'nodes'"""
+    for key, value in iter_artifact(path, 'nodes', streaming=streaming):
+        if key == 'nodes':
+            yield value
+
+
+def streaming_enabled():
+    """Whether artifacts should be parsed incrementally (DBT_ARTIFACT_STREAMING)"""
+    return os.getenv('DBT_ARTIFACT_STREAMING', '1').lower() not in ('0', 'false', 'no')
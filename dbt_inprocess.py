@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Run dbt commands inside one Python process through dbt's programmatic runner
+
+Every `dbt ...` subprocess re-imports dbt-core, loads the adapter and
+re-parses the project. Here the project is parsed once, the manifest is
+handed to every later invocation, and node results stay in memory so they
+can be written to the results database without reading run_results.json.
+
+Usage:
+    python dbt_inprocess.py debug compile test run
+    python dbt_inprocess.py --compare-startup
+"""
+import argparse
+import subprocess
+import sys
+import threading
+import time
+
+# dbt keeps global state per invocation, so invocations must not overlap
+_INVOKE_LOCK = threading.Lock()
+
+
+def _timing_dict(timing):
+    return {
+        'name': timing.name,
+        'started_at': timing.started_at.isoformat() if timing.started_at else None,
+        'completed_at': timing.completed_at.isoformat() if timing.completed_at else None,
+    }
+
+
+def _result_dict(result):
+    """Shape a RunResult like an entry of run_results.json 'results'"""
+    status = getattr(result.status, 'value', result.status)
+    return {
+        'unique_id': result.node.unique_id,
+        'status': str(status),
+        'execution_time': result.execution_time,
+        'thread_id': result.thread_id,
+        'timing': [_timing_dict(t) for t in result.timing],
+        'adapter_response': dict(result.adapter_response or {}),
+        'message': result.message,
+    }
+
+
+def _invocation_metadata():
+    from dbt.version import __version__
+    try:
+        from dbt_common.invocation import get_invocation_id
+        invocation_id = get_invocation_id()
+    except ImportError:
+        invocation_id = None
+    return {'dbt_version': __version__, 'invocation_id': invocation_id}
+
+
+class InProcessDbt:
+    """dbt runner that parses the project once and reuses the manifest"""
+
+    def __init__(self):
+        # Imported here so subprocess mode never pays for the dbt import
+        from dbt.cli.main import dbtRunner
+        self._runner_class = dbtRunner
+        self.runner = dbtRunner()
+        self.manifest = None
+        self.results = {}
+
+    def parse(self):
+        """Parse the project and keep the manifest for later invocations"""
+        res = self.runner.invoke(['parse'])
+        if res.success and res.result is not None:
+            self.manifest = res.result
+            self.runner = self._runner_class(manifest=self.manifest)
+        return res
+
+    def invoke(self, args):
+        """Invoke one dbt command, parsing the project first if needed"""
+        args = list(args)
+        with _INVOKE_LOCK:
+            if self.manifest is None and args[0] not in ('debug', 'parse', 'deps', 'clean'):
+                self.parse()
+            res = self.runner.invoke(args)
+            if res.result is not None and hasattr(res.result, 'results'):
+                self.results[args[0]] = (
+                    _invocation_metadata(),
+                    [_result_dict(r) for r in res.result.results]
+                )
+        return res
+
+    def run_command(self, args, description):
+        """Same contract as test_all.run_command: (success, output)"""
+        print(f"\n🔄 {description}...")
+        try:
+            res = self.invoke(args)
+        except Exception as e:
+            print(f"❌ {description} - ERROR: {e}")
+            return False, str(e)
+        if res.success:
+            print(f"✅ {description} - SUCCESS")
+            return True, self.describe(args[0])
+        print(f"❌ {description} - FAILED")
+        error = str(res.exception) if res.exception else self.describe(args[0])
+        print(f"Error: {error}")
+        return False, error
+
+    def describe(self, command):
+        """One-line status count for the last invocation of a command"""
+        if command not in self.results:
+            return ''
+        counts = {}
+        for result in self.results[command][1]:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        return ', '.join(f"{status}={count}" for status, count in sorted(counts.items()))
+
+    def run_results(self, command='run'):
+        """Yield (metadata, result) pairs, as dbt_artifacts.iter_run_results does"""
+        metadata, results = self.results.get(command, ({}, []))
+        for result in results:
+            yield metadata, result
+
+
+def compare_startup(args=('ls',), repeats=3):
+    """Time the same dbt command as fresh subprocesses and in one process"""
+    print(f"⏱️ Comparing `dbt {' '.join(args)}` x{repeats}")
+
+    subprocess_times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        subprocess.run(['dbt', *args], capture_output=True, check=False)
+        subprocess_times.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    dbt = InProcessDbt()
+    dbt.parse()
+    setup_time = time.perf_counter() - started
+
+    inprocess_times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        dbt.invoke(args)
+        inprocess_times.append(time.perf_counter() - started)
+
+    subprocess_total = sum(subprocess_times)
+    inprocess_total = setup_time + sum(inprocess_times)
+    print(f"   subprocess: {subprocess_total:.2f}s total, "
+          f"{subprocess_total / repeats:.2f}s per command")
+    print(f"   in-process: {inprocess_total:.2f}s total "
+          f"({setup_time:.2f}s import + parse, "
+          f"{sum(inprocess_times) / repeats:.2f}s per command)")
+    if inprocess_total > 0:
+        print(f"   speedup: x{subprocess_total / inprocess_total:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run dbt commands in a single process")
+    parser.add_argument('commands', nargs='*', default=['debug', 'compile', 'test', 'run'],
+                        help="dbt commands to run in order (default: debug compile test run)")
+    parser.add_argument('--compare-startup', action='store_true',
+                        help="Compare subprocess and in-process start-up cost")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.compare_startup:
+        compare_startup(repeats=args.repeats)
+        return
+
+    dbt = InProcessDbt()
+    for command in args.commands:
+        print(f"Running dbt {command}...")
+        if not dbt.invoke(command.split()).success:
+            print(f"dbt {command} failed")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Analyze whether dbt runs are bound by the DAG shape or by the thread count
+
+Combines the dependency graph from manifest.json with the per-node timing
+in run_results.json to compute the critical path, the idle time of every
+worker thread and the speedup bound at N threads, then simulates the
+run's schedule for candidate thread counts and recommends the smallest
+one that is within a tolerance of the fastest. Results are stored in
+dbt_thread_analysis next to dbt_run_results.
+
+Usage:
+    python dbt_threads.py [--manifest target/manifest.json] [--run-results target/run_results.json]
+                          [--threads 1,2,4,8,16] [--tolerance 5] [--no-save]
+"""
+import argparse
+import heapq
+import json
+import os
+from datetime import datetime
+
+from dbt_artifacts import iter_artifact, iter_manifest_nodes, streaming_enabled
+
+CANDIDATE_THREADS = (1, 2, 4, 6, 8, 12, 16)
+# Recommend the fewest threads within this many percent of the best simulated run
+RECOMMEND_TOLERANCE_PERCENT = float(os.getenv('DBT_THREADS_TOLERANCE', '5'))
+
+
+def _timestamp(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None
+
+
+def load_run(manifest_path, run_results_path):
+    """Return (nodes, metadata) for the executed nodes of a run
+
+    nodes maps unique_id -> dict(duration, start, end, thread, parents),
+    with parents limited to nodes executed in the same run.
+    """
+    streaming = streaming_enabled()
+    nodes, metadata = {}, {}
+    for key, value in iter_artifact(run_results_path, 'results', streaming=streaming):
+        if key == 'metadata':
+            metadata = dict(metadata, **value)
+            continue
+        if key == 'args':
+            # The thread count of the analyzed run
+            metadata['threads'] = (value or {}).get('threads')
+            continue
+        if key != 'results':
+            continue
+        result = value
+        timing = result.get('timing') or []
+        starts = [_timestamp(t.get('started_at')) for t in timing if t.get('started_at')]
+        ends = [_timestamp(t.get('completed_at')) for t in timing if t.get('completed_at')]
+        start, end = (min(starts) if starts else None), (max(ends) if ends else None)
+        duration = (end - start).total_seconds() if start and end else result.get('execution_time') or 0.0
+        nodes[result['unique_id']] = dict(
+            duration=duration, start=start, end=end,
+            thread=result.get('thread_id'), status=result.get('status'), parents=[],
+        )
+
+    for unique_id, node in iter_manifest_nodes(manifest_path, streaming=streaming):
+        if unique_id in nodes:
+            nodes[unique_id]['parents'] = [
+                parent for parent in (node.get('depends_on') or {}).get('nodes', []) if parent in nodes
+            ]
+    return nodes, metadata
+
+
+def _topological_order(nodes):
+    children = {unique_id: [] for unique_id in nodes}
+    pending = {unique_id: len(node['parents']) for unique_id, node in nodes.items()}
+    for unique_id, node in nodes.items():
+        for parent in node['parents']:
+            children[parent].append(unique_id)
+    ready = sorted(unique_id for unique_id, count in pending.items() if count == 0)
+    order = []
+    while ready:
+        unique_id = ready.pop()
+        order.append(unique_id)
+        for child in children[unique_id]:
+            pending[child] -= 1
+            if pending[child] == 0:
+                ready.append(child)
+    if len(order) != len(nodes):
+        raise ValueError("Dependency cycle in manifest.json")
+    return order, children
+
+
+def critical_path(nodes):
+    """Return (seconds, [unique_id, ...]) of the longest dependency chain"""
+    order, _ = _topological_order(nodes)
+    finish, previous = {}, {}
+    for unique_id in order:
+        parents = nodes[unique_id]['parents']
+        before = max(parents, key=lambda p: finish[p]) if parents else None
+        finish[unique_id] = nodes[unique_id]['duration'] + (finish[before] if before else 0.0)
+        previous[unique_id] = before
+    if not finish:
+        return 0.0, []
+    last = max(finish, key=finish.get)
+    path = []
+    while last:
+        path.append(last)
+        last = previous[last]
+    return finish[path[0]], path[::-1]
+
+
+def thread_idle(nodes):
+    """{thread: (busy seconds, idle seconds)} over the run's wall-clock span"""
+    starts = [n['start'] for n in nodes.values() if n['start']]
+    ends = [n['end'] for n in nodes.values() if n['end']]
+    if not starts or not ends:
+        return {}
+    span = (max(ends) - min(starts)).total_seconds()
+    busy = {}
+    for node in nodes.values():
+        busy[node['thread']] = busy.get(node['thread'], 0.0) + node['duration']
+    return {thread: (seconds, max(span - seconds, 0.0)) for thread, seconds in busy.items()}
+
+
+def simulate(nodes, threads):
+    """Makespan of a greedy list schedule on the given number of threads
+
+    Ready nodes are started longest-remaining-path first, the order a
+    good scheduler approaches; durations are those of the analyzed run.
+    """
+    order, children = _topological_order(nodes)
+    remaining = {}
+    for unique_id in reversed(order):
+        remaining[unique_id] = nodes[unique_id]['duration'] + max(
+            (remaining[child] for child in children[unique_id]), default=0.0)
+
+    pending = {unique_id: len(node['parents']) for unique_id, node in nodes.items()}
+    ready = [(-remaining[u], u) for u, count in pending.items() if count == 0]
+    heapq.heapify(ready)
+    running = []  # (finish time, unique_id)
+    now = 0.0
+    free = threads
+    while ready or running:
+        while ready and free:
+            _, unique_id = heapq.heappop(ready)
+            heapq.heappush(running, (now + nodes[unique_id]['duration'], unique_id))
+            free -= 1
+        now, unique_id = heapq.heappop(running)
+        free += 1
+        for child in children[unique_id]:
+            pending[child] -= 1
+            if pending[child] == 0:
+                heapq.heappush(ready, (-remaining[child], child))
+    return now
+
+
+def analyze(nodes, candidates=CANDIDATE_THREADS, tolerance=None):
+    """Compute the analysis summary for one run"""
+    tolerance = RECOMMEND_TOLERANCE_PERCENT if tolerance is None else tolerance
+    total_work = sum(node['duration'] for node in nodes.values())
+    path_seconds, path = critical_path(nodes)
+    starts = [n['start'] for n in nodes.values() if n['start']]
+    ends = [n['end'] for n in nodes.values() if n['end']]
+    wall = (max(ends) - min(starts)).total_seconds() if starts and ends else None
+
+    simulations = {n: simulate(nodes, n) for n in candidates} if nodes else {}
+    # Speedup bound: work spread evenly over n threads, but never below the critical path
+    bounds = {
+        n: total_work / max(path_seconds, total_work / n) if total_work else 1.0
+        for n in candidates
+    }
+    best = min(simulations.values()) if simulations else 0.0
+    recommended = min(
+        (n for n, makespan in simulations.items() if makespan <= best * (1 + tolerance / 100)),
+        default=None
+    )
+    return dict(
+        nodes=len(nodes), total_work=total_work, wall=wall,
+        critical_path_seconds=path_seconds, critical_path=path,
+        parallelism=total_work / path_seconds if path_seconds else None,
+        thread_idle=thread_idle(nodes), speedup_bounds=bounds,
+        simulations=simulations, recommended=recommended,
+    )
+
+
+def print_analysis(summary, threads_used=None):
+    print("\n🧵 DBT THREAD ANALYSIS")
+    print("=" * 50)
+    wall = f"{summary['wall']:.2f}s" if summary['wall'] is not None else "-"
+    print(f"   Nodes: {summary['nodes']}, work: {summary['total_work']:.2f}s, wall: {wall}, "
+          f"threads used: {threads_used or '-'}")
+    print(f"   Critical path: {summary['critical_path_seconds']:.2f}s "
+          f"({len(summary['critical_path'])} nodes)")
+    for unique_id in summary['critical_path']:
+        print(f"      {unique_id}")
+    if summary['parallelism']:
+        print(f"   Average parallelism (work / critical path): {summary['parallelism']:.2f}")
+
+    for thread, (busy, idle) in sorted(summary['thread_idle'].items(), key=lambda t: str(t[0])):
+        print(f"   {str(thread):<20} busy {busy:8.2f}s  idle {idle:8.2f}s")
+
+    print(f"   {'threads':>7} {'bound':>8} {'simulated':>10}")
+    for n, makespan in summary['simulations'].items():
+        print(f"   {n:>7} x{summary['speedup_bounds'][n]:6.2f} {makespan:9.2f}s")
+    if summary['recommended']:
+        print(f"   Recommended threads: {summary['recommended']} (set DBT_THREADS)")
+
+
+def save_analysis(conn, summary, metadata):
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS dbt_thread_analysis (
+            id BIGSERIAL PRIMARY KEY,
+            invocation_id VARCHAR(255),
+            threads_used INTEGER,
+            nodes INTEGER,
+            total_work_seconds DOUBLE PRECISION,
+            wall_seconds DOUBLE PRECISION,
+            critical_path_seconds DOUBLE PRECISION,
+            critical_path JSONB,
+            thread_idle JSONB,
+            simulations JSONB,
+            recommended_threads INTEGER,
+            analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS dbt_thread_analysis_invocation
+        ON dbt_thread_analysis (invocation_id)
+    """)
+    cursor.execute("""
+        INSERT INTO dbt_thread_analysis
+            (invocation_id, threads_used, nodes, total_work_seconds, wall_seconds,
+             critical_path_seconds, critical_path, thread_idle, simulations, recommended_threads)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, (
+        metadata.get('invocation_id'), metadata.get('threads'), summary['nodes'],
+        summary['total_work'], summary['wall'], summary['critical_path_seconds'],
+        json.dumps(summary['critical_path']),
+        json.dumps({str(t): {'busy': b, 'idle': i} for t, (b, i) in summary['thread_idle'].items()}),
+        json.dumps({str(n): m for n, m in summary['simulations'].items()}),
+        summary['recommended'],
+    ))
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Critical path and thread-count analysis of a dbt run")
+    parser.add_argument('--manifest', default='target/manifest.json')
+    parser.add_argument('--run-results', default='target/run_results.json')
+    parser.add_argument('--threads', default=','.join(str(n) for n in CANDIDATE_THREADS),
+                        help="Comma-separated thread counts to simulate")
+    parser.add_argument('--tolerance', type=float, default=RECOMMEND_TOLERANCE_PERCENT,
+                        help="Percent slower than the best simulation still accepted (DBT_THREADS_TOLERANCE)")
+    parser.add_argument('--no-save', action='store_true', help="Do not store the analysis")
+    args = parser.parse_args()
+    try:
+        candidates = sorted({int(n) for n in args.threads.split(',') if n.strip()})
+    except ValueError:
+        parser.error(f"--threads must be comma-separated integers, got {args.threads!r}")
+    if not candidates:
+        parser.error("--threads needs at least one thread count")
+    # simulate() needs at least one thread to hand nodes to
+    if candidates[0] < 1:
+        parser.error(f"--threads values must be at least 1, got {args.threads!r}")
+
+    nodes, metadata = load_run(args.manifest, args.run_results)
+    summary = analyze(nodes, candidates, args.tolerance)
+    print_analysis(summary, metadata.get('threads'))
+
+    if args.no_save:
+        return
+    from save_validation_results import connect_to_db
+    conn = connect_to_db()
+    if not conn:
+        print("Failed to connect to database; analysis not saved")
+        return
+    try:
+        save_analysis(conn, summary, metadata)
+        print("   Saved to dbt_thread_analysis")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,9 @@ CREATE TABLE IF NOT EXISTS customers (
     name VARCHAR(255),
     email VARCHAR(255),
     region VARCHAR(100),
-    signup_date DATE
+    signup_date DATE,
+    load_batch_id BIGINT,
+    loaded_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc')
 );
 
 CREATE TABLE IF NOT EXISTS transactions (
@@ -12,9 +14,17 @@ CREATE TABLE IF NOT EXISTS transactions (
     customer_id VARCHAR(50),
     amount DECIMAL(10,2),
     transaction_date DATE,
-    status VARCHAR(50)
+    status VARCHAR(50),
+    load_batch_id BIGINT,
+    loaded_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc')
 );
 
+-- Load watermark columns for databases created before they existed
+ALTER TABLE customers ADD COLUMN IF NOT EXISTS load_batch_id BIGINT;
+ALTER TABLE customers ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc');
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS load_batch_id BIGINT;
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc');
+
 -- Insert sample data
 INSERT INTO customers (customer_id, name, email, region, signup_date) VALUES
 ('1001', 'John Doe', 'john.doe@email.com', 'North', '2023-01-15'),
@@ -38,3 +48,5 @@ CREATE INDEX IF NOT EXISTS idx_customers_id ON customers(customer_id);
 CREATE INDEX IF NOT EXISTS idx_transactions_id ON transactions(transaction_id);
 CREATE INDEX IF NOT EXISTS idx_transactions_customer ON transactions(customer_id);
 CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(transaction_date);
+CREATE INDEX IF NOT EXISTS idx_customers_loaded_at ON customers(loaded_at);
+CREATE INDEX IF NOT EXISTS idx_transactions_loaded_at ON transactions(loaded_at);
@@ -4,9 +4,15 @@
     target_schema='marts',
     unique_key='customer_id',
     strategy='check',
-    check_cols=['first_name','last_name','email','region']
+    check_cols=['attr_hash'],
+    post_hook=[
+      "{{ ensure_index(this, ['customer_id', 'dbt_valid_to']) }}",
+      "{{ ensure_index(this, ['attr_hash']) }}"
+    ]
   )
 }}
-select * from {{ ref('stg_customers') }}
+select
+  *,
+  {{ row_hash(['first_name', 'last_name', 'email', 'region']) }} as attr_hash
+from {{ ref('stg_customers') }}
 {% endsnapshot %}
-
@@ -0,0 +1,40 @@
+{#
+  Incremental refresh of the daily aggregates built from fact_transactions
+  (agg_customer_daily, agg_region_daily). A day is rebuilt when fact rows
+  were ingested on it since the aggregate's last refresh, or when such a
+  row was moved away from it by a date correction.
+#}
+
+{# Latest fact ingestion the aggregate has seen #}
+{% macro aggregate_watermark() %}
+  (
+    select coalesce(max(max_ingestion_ts), '1970-01-01'::timestamp)
+    from {{ this }}
+  )
+{% endmacro %}
+
+{# Days to rebuild: those of new fact rows and those the rows were moved from (indexed on ingestion_ts) #}
+{% macro changed_transaction_days() %}
+  select d.transaction_date
+  from {{ ref('fact_transactions') }} as f
+  cross join lateral (
+    values (f.transaction_date), (f.replaced_transaction_date)
+  ) as d(transaction_date)
+  where f.ingestion_ts > {{ aggregate_watermark() }}
+    and d.transaction_date is not null
+{% endmacro %}
+
+{#
+  Pre-hook: delete+insert only replaces days the increment has rows for,
+  so changed days left without any transaction are deleted beforehand.
+#}
+{% macro delete_emptied_days() %}
+  {% if is_incremental() %}
+    delete from {{ this }} as a
+    where a.transaction_date in ({{ changed_transaction_days() }})
+      and not exists (
+        select 1 from {{ ref('fact_transactions') }} as f
+        where f.transaction_date = a.transaction_date
+      )
+  {% endif %}
+{% endmacro %}
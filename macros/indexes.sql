@@ -0,0 +1,60 @@
+{#
+  Create an index on a relation if it does not exist yet.
+  The name is derived from the relation and columns, so repeated calls
+  (e.g. from every incremental run) are no-ops.
+#}
+{% macro index_name(relation, columns, unique=false, include=none) %}
+  {%- set name = relation.identifier ~ '__' ~ columns | join('_')
+        ~ ('__' ~ include | join('_') if include else '') ~ ('_uidx' if unique else '_idx') -%}
+  {%- if name | length > 63 -%}
+    {%- set name = relation.identifier[:40] ~ '__' ~ local_md5(name)[:16] ~ ('_uidx' if unique else '_idx') -%}
+  {%- endif -%}
+  {{ return(name) }}
+{% endmacro %}
+
+{% macro ensure_index(relation, columns, unique=false, include=none) %}
+  {%- set sql -%}
+    create {{ 'unique ' if unique }}index if not exists {{ index_name(relation, columns, unique, include) }}
+    on {{ relation }} ({{ columns | join(', ') }})
+    {%- if include %} include ({{ include | join(', ') }}){% endif %}
+  {%- endset -%}
+  {% do run_query(sql) %}
+{% endmacro %}
+
+{# True if some index of the relation has exactly these key columns, in order #}
+{% macro has_index_on(relation, columns) %}
+  {%- set result = run_query(
+    "select 1 from pg_index i"
+    ~ " join pg_class c on c.oid = i.indrelid"
+    ~ " join pg_namespace n on n.oid = c.relnamespace"
+    ~ " where n.nspname = '" ~ relation.schema ~ "' and c.relname = '" ~ relation.identifier ~ "'"
+    ~ " and array(select a.attname::text"
+    ~ "   from unnest(i.indkey::int2[]) with ordinality as k(attnum, ord)"
+    ~ "   join pg_attribute a on a.attrelid = i.indrelid and a.attnum = k.attnum"
+    ~ "   where k.ord <= i.indnkeyatts order by k.ord)"
+    ~ " = array['" ~ columns | join("', '") ~ "']"
+  ) -%}
+  {{ return(result.rows | length > 0) }}
+{% endmacro %}
+
+{#
+  Post-hook for marts: builds the indexes declared in the model's
+  `mart_indexes` config (a list of {'columns': [...], 'unique': bool,
+  'include': [...]}), plus one on the incremental `unique_key`, which the
+  delete+insert merge looks rows up by, unless an index on it exists.
+  `include` columns make covering indexes, so lookups can be index-only.
+#}
+{% macro ensure_indexes(relation) %}
+  {% if execute %}
+    {% for index in config.get('mart_indexes', []) %}
+      {% do ensure_index(relation, index['columns'], index.get('unique', false), index.get('include')) %}
+    {% endfor %}
+    {%- set unique_key = config.get('unique_key') -%}
+    {% if unique_key %}
+      {%- set key_columns = [unique_key] if unique_key is string else unique_key -%}
+      {% if not has_index_on(relation, key_columns) %}
+        {% do ensure_index(relation, key_columns) %}
+      {% endif %}
+    {% endif %}
+  {% endif %}
+{% endmacro %}
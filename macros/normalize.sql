@@ -0,0 +1,55 @@
+{#
+  Normalization helpers for the staging models.
+
+  single_pass() projects expressions through a lateral subquery. Its
+  "offset 0" keeps the planner from flattening the subquery into the outer
+  query, which would copy each expression into every place that uses it
+  and evaluate it once per reference. The typed macros below expect an
+  already normalized text value (a column of such a projection), so the
+  trim runs once per row however often the value is used.
+#}
+{% macro single_pass(alias, expressions) -%}
+  cross join lateral (
+    select
+    {%- for name, expression in expressions.items() %}
+      {{ expression }} as {{ name }}{{ ',' if not loop.last }}
+    {%- endfor %}
+    offset 0
+  ) as {{ alias }}
+{%- endmacro %}
+
+{# Trimmed text, '' as null #}
+{% macro normalized_text(expression) -%}
+  nullif(trim({{ expression }}::text), '')
+{%- endmacro %}
+
+{# At most 18 digits, so the cast cannot overflow bigint #}
+{% macro safe_bigint(value) -%}
+  case when {{ value }} ~ '^[0-9]{1,18}$' then {{ value }}::bigint end
+{%- endmacro %}
+
+{% macro safe_numeric(value) -%}
+  case when {{ value }} ~ '^-?[0-9]+(\.[0-9]+)?$' then {{ value }}::numeric end
+{%- endmacro %}
+
+{% macro safe_date(value) -%}
+  case when {{ value }} ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}$' then {{ value }}::date end
+{%- endmacro %}
+
+{% macro normalized_status(expression) -%}
+  upper({{ normalized_text(expression) }})
+{%- endmacro %}
+
+{% macro is_success(status, success_statuses=['SUCCESS', 'COMPLETED', 'PAID']) -%}
+  coalesce({{ status }} in ('{{ success_statuses | join("', '") }}'), false)
+{%- endmacro %}
+
+{# Name splitting on the first space of a normalized name #}
+{% macro first_name(name) -%}
+  split_part({{ name }}, ' ', 1)
+{%- endmacro %}
+
+{# Without a space substr() returns the whole name, which nullif() turns into null #}
+{% macro last_name(name) -%}
+  nullif(substr({{ name }}, strpos({{ name }}, ' ') + 1), {{ name }})
+{%- endmacro %}
@@ -0,0 +1,137 @@
+{#
+  Incremental materialization on a natively range-partitioned Postgres table.
+
+  config:
+    partition_by   column the table is range-partitioned on (one partition per month)
+    unique_key     merge key; rows in the increment replace target rows with the same key
+    lookback_days  late-arrival buffer, used by the model through watermark_lower_bound()
+
+  The model query is staged in a temp table, monthly partitions are created
+  for the months it covers, and the delete+insert merge is bounded by the
+  smallest partition value among the increment and the rows it replaces, so
+  only those partitions are touched. Rows with a null key cannot be matched:
+  the increment's null-key rows replace the target's on the same partition
+  values instead. The watermark is then stored in dbt_model_watermarks.
+#}
+
+{% macro is_partitioned_table(relation) %}
+  {%- set result = run_query(
+    "select 1 from pg_partitioned_table pt"
+    ~ " join pg_class c on c.oid = pt.partrelid"
+    ~ " join pg_namespace n on n.oid = c.relnamespace"
+    ~ " where n.nspname = '" ~ relation.schema ~ "' and c.relname = '" ~ relation.identifier ~ "'"
+  ) -%}
+  {{ return(result.rows | length > 0) }}
+{% endmacro %}
+
+{# True on runs that merge into an existing partitioned table (is_incremental() only knows 'incremental') #}
+{% macro is_partitioned_incremental() %}
+  {% if not execute %}
+    {{ return(false) }}
+  {% endif %}
+  {%- set relation = adapter.get_relation(this.database, this.schema, this.table) -%}
+  {{ return(relation is not none and relation.type == 'table' and not should_full_refresh()
+            and is_partitioned_table(relation)) }}
+{% endmacro %}
+
+{% macro ensure_month_partitions(relation, staging_relation, partition_by) %}
+  {%- set months = run_query(
+    "select distinct to_char(date_trunc('month', " ~ partition_by ~ "), 'YYYYMM') as suffix,"
+    ~ " date_trunc('month', " ~ partition_by ~ ")::date as lower_bound"
+    ~ " from " ~ staging_relation ~ " where " ~ partition_by ~ " is not null order by 1"
+  ) -%}
+  {% for month in months.rows %}
+    {% do run_query(
+      "create table if not exists " ~ relation.incorporate(path={'identifier': relation.identifier ~ '_p' ~ month[0]})
+      ~ " partition of " ~ relation
+      ~ " for values from ('" ~ month[1] ~ "') to ('" ~ month[1] ~ "'::date + interval '1 month')"
+    ) %}
+  {% endfor %}
+{% endmacro %}
+
+{% materialization partitioned_incremental, adapter='postgres' %}
+
+  {%- set target_relation = this.incorporate(type='table') -%}
+  {%- set existing_relation = load_cached_relation(this) -%}
+  {%- set staging_relation = make_temp_relation(target_relation) -%}
+  {%- set partition_by = config.require('partition_by') -%}
+  {%- set unique_key = config.require('unique_key') -%}
+
+  {{ run_hooks(pre_hooks, inside_transaction=False) }}
+  {{ run_hooks(pre_hooks, inside_transaction=True) }}
+
+  {% do ensure_watermark_table() %}
+
+  {%- set full_build = existing_relation is none
+        or should_full_refresh()
+        or not is_partitioned_table(existing_relation) -%}
+
+  {% call statement('stage') %}
+    {{ get_create_table_as_sql(True, staging_relation, sql) }}
+  {% endcall %}
+
+  {% if full_build %}
+    {% if existing_relation is not none %}
+      {% do adapter.drop_relation(existing_relation) %}
+    {% endif %}
+    {% call statement('create_partitioned') %}
+      create table {{ target_relation }} (like {{ staging_relation }})
+      partition by range ({{ partition_by }});
+      create table {{ target_relation.incorporate(path={'identifier': target_relation.identifier ~ '_pdefault'}) }}
+      partition of {{ target_relation }} default;
+    {% endcall %}
+  {% endif %}
+
+  {% do ensure_month_partitions(target_relation, staging_relation, partition_by) %}
+
+  {% if not full_build %}
+    {#- A row whose partition value changed is deleted where it was, which may be before the increment's own range -#}
+    {%- set lower_bound = run_query(
+      "select least("
+      ~ " (select min(" ~ partition_by ~ ") from " ~ staging_relation ~ "),"
+      ~ " (select min(t." ~ partition_by ~ ") from " ~ target_relation ~ " as t"
+      ~ " where t." ~ unique_key ~ " in (select " ~ unique_key ~ " from " ~ staging_relation ~ ")))::text"
+    ).columns[0].values()[0] -%}
+    {% call statement('delete_changed') %}
+      delete from {{ target_relation }} as t
+      using {{ staging_relation }} as s
+      where t.{{ unique_key }} = s.{{ unique_key }}
+        and (
+          {% if lower_bound is not none %}
+          t.{{ partition_by }} >= '{{ lower_bound }}' or
+          {% endif %}
+          t.{{ partition_by }} is null
+        )
+    {% endcall %}
+    {#- Null keys never match: the increment's null-key rows replace those of the partition values it covers -#}
+    {% call statement('delete_null_keys') %}
+      delete from {{ target_relation }} as t
+      where t.{{ unique_key }} is null
+        and exists (
+          select 1 from {{ staging_relation }} as s
+          where s.{{ unique_key }} is null
+            and s.{{ partition_by }} is not distinct from t.{{ partition_by }}
+        )
+    {% endcall %}
+  {% endif %}
+
+  {% call statement('main') %}
+    insert into {{ target_relation }}
+    select * from {{ staging_relation }}
+  {% endcall %}
+
+  {# Partitioned unique indexes must contain the partition key #}
+  {% do ensure_index(target_relation, [unique_key, partition_by], unique=true) %}
+  {% do ensure_index(target_relation, [unique_key]) %}
+
+  {% do update_watermark(this.identifier, staging_relation, partition_by, replace=full_build) %}
+
+  {{ run_hooks(post_hooks, inside_transaction=True) }}
+
+  {% do adapter.commit() %}
+
+  {{ run_hooks(post_hooks, inside_transaction=False) }}
+
+  {{ return({'relations': [target_relation]}) }}
+
+{% endmaterialization %}
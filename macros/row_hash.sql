@@ -0,0 +1,8 @@
+{#
+  Hash of a set of tracked attributes, used for change detection.
+  row(...)::text quotes values and distinguishes null from '', so
+  ('a b', null) and ('a', 'b') never collide the way concatenation can.
+#}
+{% macro row_hash(columns) %}
+  md5(row({{ columns | join(', ') }})::text)
+{% endmacro %}
@@ -0,0 +1,54 @@
+{#
+  Per-model load watermarks, maintained by the partitioned_incremental
+  materialization so incremental filters read one row instead of
+  scanning the target for max(<column>). watermark holds a date
+  (partition value); watermark_ts holds a timestamp for models that
+  track the last ingestion they processed (dim_customers).
+#}
+{% macro watermark_relation() %}
+  {{ return(api.Relation.create(database=target.database, schema=target.schema, identifier='dbt_model_watermarks')) }}
+{% endmacro %}
+
+{% macro ensure_watermark_table() %}
+  {% do run_query(
+    "create table if not exists " ~ watermark_relation() ~ " ("
+    ~ " model_name varchar(255) primary key,"
+    ~ " watermark date,"
+    ~ " updated_at timestamp not null default (now() at time zone 'utc'))"
+  ) %}
+  {% do run_query("alter table " ~ watermark_relation() ~ " add column if not exists watermark_ts timestamp") %}
+{% endmacro %}
+
+{# SQL expression for the stored watermark minus a late-arrival buffer #}
+{% macro watermark_lower_bound(model_name, lookback_days=1) %}
+  (
+    select coalesce(max(watermark) - {{ lookback_days }}, '1970-01-01'::date)
+    from {{ watermark_relation() }}
+    where model_name = '{{ model_name }}'
+  )
+{% endmacro %}
+
+{# SQL expression for the stored timestamp watermark, null if there is none #}
+{% macro timestamp_watermark(model_name) %}
+  (
+    select watermark_ts
+    from {{ watermark_relation() }}
+    where model_name = '{{ model_name }}'
+  )
+{% endmacro %}
+
+{% macro update_watermark(model_name, source_relation, column, replace=false, watermark_column='watermark') %}
+  {% if replace %}
+    {% do run_query("delete from " ~ watermark_relation() ~ " where model_name = '" ~ model_name ~ "'") %}
+  {% endif %}
+  {%- set sql -%}
+    insert into {{ watermark_relation() }} as w (model_name, {{ watermark_column }}, updated_at)
+    select '{{ model_name }}', max({{ column }}), now() at time zone 'utc'
+    from {{ source_relation }}
+    having max({{ column }}) is not null
+    on conflict (model_name) do update
+    set {{ watermark_column }} = greatest(w.{{ watermark_column }}, excluded.{{ watermark_column }}),
+        updated_at = excluded.updated_at
+  {%- endset -%}
+  {% do run_query(sql) %}
+{% endmacro %}
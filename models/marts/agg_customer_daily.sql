@@ -0,0 +1,36 @@
+{{ config(
+    materialized='incremental',
+    unique_key='transaction_date',
+    incremental_strategy='delete+insert',
+    pre_hook="{{ delete_emptied_days() }}",
+    mart_indexes=[
+      {'columns': ['customer_id', 'transaction_date'], 'unique': True,
+       'include': ['transaction_count', 'success_count', 'total_amount', 'success_rate']},
+      {'columns': ['max_ingestion_ts']}
+    ]
+) }}
+
+{#-
+  Daily spend / count / success rate per customer. unique_key is the date
+  bucket: delete+insert replaces every row of a touched day, so customers
+  who no longer have transactions on it disappear as well. Touched days
+  include those a corrected transaction moved away from
+  (changed_transaction_days).
+-#}
+
+select
+  f.customer_id,
+  f.transaction_date,
+  count(*) as transaction_count,
+  count(*) filter (where f.is_success) as success_count,
+  coalesce(sum(f.amount), 0) as total_amount,
+  coalesce(sum(f.amount) filter (where f.is_success), 0) as success_amount,
+  round(count(*) filter (where f.is_success)::numeric / count(*), 4) as success_rate,
+  max(f.ingestion_ts) as max_ingestion_ts
+from {{ ref('fact_transactions') }} as f
+where f.transaction_date is not null
+{% if is_incremental() %}
+  -- ✅ Only days with fact rows ingested or moved away since the last refresh
+  and f.transaction_date in ({{ changed_transaction_days() }})
+{% endif %}
+group by f.customer_id, f.transaction_date
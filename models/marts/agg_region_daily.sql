@@ -0,0 +1,38 @@
+{{ config(
+    materialized='incremental',
+    unique_key='transaction_date',
+    incremental_strategy='delete+insert',
+    pre_hook="{{ delete_emptied_days() }}",
+    mart_indexes=[
+      {'columns': ['region', 'transaction_date'], 'unique': True,
+       'include': ['customer_count', 'transaction_count', 'total_amount', 'success_rate']},
+      {'columns': ['max_ingestion_ts']}
+    ]
+) }}
+
+{#-
+  Daily spend / count / success rate per region, rolled up from
+  agg_customer_daily. Customers are placed in their current region in
+  dim_customers when a day is (re)built; a full refresh restates history
+  after customers move.
+-#}
+
+select
+  coalesce(d.region, 'Unknown') as region,
+  c.transaction_date,
+  count(distinct c.customer_id) as customer_count,
+  sum(c.transaction_count) as transaction_count,
+  sum(c.success_count) as success_count,
+  sum(c.total_amount) as total_amount,
+  sum(c.success_amount) as success_amount,
+  round(sum(c.success_count)::numeric / sum(c.transaction_count), 4) as success_rate,
+  max(c.max_ingestion_ts) as max_ingestion_ts
+from {{ ref('agg_customer_daily') }} as c
+left join {{ ref('dim_customers') }} as d
+  on d.customer_id = c.customer_id
+{% if is_incremental() %}
+-- ✅ Only days with fact rows ingested or moved away since the last refresh;
+-- read from the fact, as a day a row moved away from keeps its older max_ingestion_ts
+where c.transaction_date in ({{ changed_transaction_days() }})
+{% endif %}
+group by coalesce(d.region, 'Unknown'), c.transaction_date
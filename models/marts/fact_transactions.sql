@@ -1,4 +1,12 @@
-{{ config(materialized='incremental',unique_key='transaction_id') }}
+{{ config(
+    materialized='partitioned_incremental',
+    partition_by='transaction_date',
+    unique_key='transaction_id',
+    mart_indexes=[
+      {'columns': ['ingestion_ts']},
+      {'columns': ['customer_id', 'transaction_date'], 'include': ['amount', 'is_success']}
+    ]
+) }}
 
 with src as (
   select
@@ -12,6 +20,37 @@ with src as (
   from {{ ref('stg_transactions') }}
 )
 
+{% if is_partitioned_incremental() %}
+, increment as (
+  select *
+  from src
+  -- ✅ Incremental load with cached watermark (1-day buffer for late-arriving data)
+  where transaction_date >= {{ watermark_lower_bound(this.identifier, lookback_days=1) }}
+     -- ✅ plus rows staged since the last run, e.g. corrected to an earlier date
+     or ingestion_ts > (
+       select coalesce(max(ingestion_ts), '1970-01-01'::timestamp)
+       from {{ this }}
+     )
+)
+
+select
+  i.transaction_id,
+  i.customer_id,
+  i.amount,
+  i.transaction_date,
+  i.status,
+  i.is_success,
+  i.ingestion_ts,
+  -- ✅ The day a correction moved the row away from, so the daily aggregates rebuild it;
+  -- kept while the row is reprocessed unchanged inside the late-arrival buffer
+  case
+    when t.ingestion_ts = i.ingestion_ts then t.replaced_transaction_date
+    when t.transaction_date is distinct from i.transaction_date then t.transaction_date
+  end as replaced_transaction_date
+from increment as i
+left join {{ this }} as t
+  on t.transaction_id = i.transaction_id
+{% else %}
 select
   transaction_id,
   customer_id,
@@ -19,14 +58,7 @@ select
   transaction_date,
   status,
   is_success,
-  ingestion_ts
+  ingestion_ts,
+  null::date as replaced_transaction_date
 from src
-
-{% if is_incremental() %}
-  -- ✅ Incremental load with watermark (1-day buffer for late-arriving data)
-  where transaction_date >= (
-    select coalesce(max(transaction_date)::date - 1, '1970-01-01'::date)
-    from {{ this }}
-  )
 {% endif %}
-
@@ -1,36 +1,73 @@
-{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    unique_key='customer_id',
+    incremental_strategy='delete+insert',
+    indexes=[
+      {'columns': ['customer_id']},
+      {'columns': ['ingestion_ts']}
+    ]
+) }}
 
 with src as (
-  select * from {{ source('raw', 'customers') }}
-)
-
-select
-  case 
-    when trim(customer_id::text) ~ '^[0-9]+$' then trim(customer_id::text)::bigint
-    else null 
-  end as customer_id,
-
-  trim(name) as full_name,
-
-  split_part(trim(name), ' ', 1) as first_name,
-
-  case 
-    when position(' ' in trim(name)) > 0 
-    then substr(trim(name), position(' ' in trim(name)) + 1) 
-    else null 
-  end as last_name,
+  select *, ctid as raw_row_id from {{ source('raw', 'customers') }}
+  {% if is_incremental() %}
+  -- ✅ Only rows loaded after the last processed load (indexed on both sides)
+  where loaded_at > (
+    select coalesce(max(ingestion_ts), '1970-01-01'::timestamp)
+    from {{ this }}
+  )
+  {% endif %}
+),
 
-  lower(nullif(trim(email), '')) as email,
+normalized as (
+  select
+    t.customer_id,
+    n.full_name,
+    {{ first_name('n.full_name') }} as first_name,
+    {{ last_name('n.full_name') }} as last_name,
+    lower(n.email) as email,
+    n.region,
+    t.signup_date,
+    src.loaded_at as ingestion_ts,
+    src.load_batch_id,
+    src.raw_row_id
+  from src
+  -- ✅ Each raw column is trimmed and cast once per row, however often it is used below
+  {{ single_pass('n', {
+      'customer_id': normalized_text('src.customer_id'),
+      'full_name': 'trim(src.name)',
+      'email': normalized_text('src.email'),
+      'region': normalized_text('src.region'),
+      'signup_date': normalized_text('src.signup_date')
+  }) }}
+  {{ single_pass('t', {
+      'customer_id': safe_bigint('n.customer_id'),
+      'signup_date': safe_date('n.signup_date')
+  }) }}
+),
 
-  nullif(trim(region), '') as region,
-
-  case
-    when trim(signup_date::text) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}' 
-    then trim(signup_date::text)::date
-    else null
-end as signup_date,
-
-  now() at time zone 'utc' as ingestion_ts
-
-from src
+deduplicated as (
+  select
+    *,
+    -- ✅ Latest load wins; ties broken by batch and physical row so reruns agree
+    row_number() over (
+      partition by customer_id
+      order by ingestion_ts desc, load_batch_id desc nulls last, raw_row_id desc
+    ) as rn
+  from normalized
+  -- ✅ Rows without a usable key cannot be merged; they go to stg_customers_rejects
+  where customer_id is not null
+)
 
+select
+  customer_id,
+  full_name,
+  first_name,
+  last_name,
+  email,
+  region,
+  signup_date,
+  ingestion_ts,
+  load_batch_id
+from deduplicated
+where rn = 1
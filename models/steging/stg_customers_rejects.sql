@@ -0,0 +1,33 @@
+{{ config(
+    materialized='incremental',
+    indexes=[
+      {'columns': ['loaded_at']},
+      {'columns': ['load_batch_id']}
+    ]
+) }}
+
+{#-
+  Raw customers stg_customers cannot merge because their customer_id is
+  missing or not a number. Appended per load, raw values as loaded.
+-#}
+
+select
+  case when n.customer_id is null then 'missing customer_id'
+       else 'invalid customer_id' end as reject_reason,
+  src.customer_id::text as customer_id_raw,
+  src.name as name_raw,
+  src.email as email_raw,
+  src.region as region_raw,
+  src.signup_date::text as signup_date_raw,
+  src.loaded_at,
+  src.load_batch_id
+from {{ source('raw', 'customers') }} as src
+{{ single_pass('n', {'customer_id': normalized_text('src.customer_id')}) }}
+where {{ safe_bigint('n.customer_id') }} is null
+{% if is_incremental() %}
+  -- ✅ Only rows loaded after the last quarantined load
+  and src.loaded_at > (
+    select coalesce(max(loaded_at), '1970-01-01'::timestamp)
+    from {{ this }}
+  )
+{% endif %}
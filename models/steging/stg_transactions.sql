@@ -1,66 +1,80 @@
-{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    unique_key='transaction_id',
+    incremental_strategy='delete+insert',
+    indexes=[
+      {'columns': ['transaction_id']},
+      {'columns': ['ingestion_ts']}
+    ]
+) }}
 
 with src as (
-  select * from {{ source('raw', 'transactions') }}
+  select *, ctid as raw_row_id from {{ source('raw', 'transactions') }}
+  {% if is_incremental() %}
+  -- ✅ Only rows loaded after the last processed load (indexed on both sides)
+  where loaded_at > (
+    select coalesce(max(ingestion_ts), '1970-01-01'::timestamp)
+    from {{ this }}
+  )
+  {% endif %}
 ),
 
 normalized as (
   select
-    -- ✅ transaction_id cleanup
-    case 
-      when trim(transaction_id::text) ~ '^[0-9]+$' 
-      then transaction_id::bigint 
-      else null 
-    end as transaction_id,
-
-    -- ✅ customer_id cleanup
-    case 
-      when trim(customer_id::text) ~ '^[0-9]+$' 
-      then customer_id::bigint 
-      else null 
-    end as customer_id,
-
-    -- ✅ amount cleanup + invalid capture
-    case 
-      when trim(amount::text) ~ '^-?[0-9]+(\.[0-9]+)?$'
-      then amount::numeric
-      else null
-    end as amount_clean,
-
-    case 
-      when not (trim(amount::text) ~ '^-?[0-9]+(\.[0-9]+)?$')
-           and amount is not null
-      then amount::text
-    end as amount_invalid_raw,
-
-    -- ✅ transaction_date cleanup
+    t.transaction_id,
+    t.customer_id,
+    -- ✅ amount cleanup + invalid capture from a single regex evaluation
+    t.amount_clean,
     case
-      when trim(transaction_date::text) ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}$' 
-      then transaction_date::date
-      else null
-    end as transaction_date,
-
-    -- ✅ status normalization
-    upper(nullif(trim(status::text), '')) as status,
-
-    case 
-      when upper(nullif(trim(status::text), '')) in ('SUCCESS','COMPLETED','PAID') 
-      then true 
-      else false 
-    end as is_success,
-
-    now() at time zone 'utc' as ingestion_ts
+      when t.amount_clean is null and src.amount is not null
+      then src.amount::text
+    end as amount_invalid_raw,
+    t.transaction_date,
+    n.status,
+    {{ is_success('n.status') }} as is_success,
+    -- ✅ real raw-load watermark instead of now()
+    src.loaded_at as ingestion_ts,
+    src.load_batch_id,
+    src.raw_row_id
   from src
+  -- ✅ Each raw column is trimmed and cast once per row, however often it is used below
+  {{ single_pass('n', {
+      'transaction_id': normalized_text('src.transaction_id'),
+      'customer_id': normalized_text('src.customer_id'),
+      'amount': normalized_text('src.amount'),
+      'transaction_date': normalized_text('src.transaction_date'),
+      'status': normalized_status('src.status')
+  }) }}
+  {{ single_pass('t', {
+      'transaction_id': safe_bigint('n.transaction_id'),
+      'customer_id': safe_bigint('n.customer_id'),
+      'amount_clean': safe_numeric('n.amount'),
+      'transaction_date': safe_date('n.transaction_date')
+  }) }}
 ),
 
 deduplicated as (
   select
     *,
-    row_number() over (partition by transaction_id order by ingestion_ts desc) as rn
+    -- ✅ Latest load wins; ties broken by batch and physical row so reruns agree
+    row_number() over (
+      partition by transaction_id
+      order by ingestion_ts desc, load_batch_id desc nulls last, raw_row_id desc
+    ) as rn
   from normalized
+  -- ✅ Rows without a usable key cannot be merged; they go to stg_transactions_rejects
+  where transaction_id is not null
 )
 
-select *
+select
+  transaction_id,
+  customer_id,
+  amount_clean,
+  amount_invalid_raw,
+  transaction_date,
+  status,
+  is_success,
+  ingestion_ts,
+  load_batch_id
 from deduplicated
 where rn = 1
-
@@ -0,0 +1,34 @@
+{{ config(
+    materialized='incremental',
+    indexes=[
+      {'columns': ['loaded_at']},
+      {'columns': ['load_batch_id']}
+    ]
+) }}
+
+{#-
+  Raw transactions stg_transactions cannot merge because their
+  transaction_id is missing or not a number. Appended per load, raw
+  values as loaded.
+-#}
+
+select
+  case when n.transaction_id is null then 'missing transaction_id'
+       else 'invalid transaction_id' end as reject_reason,
+  src.transaction_id::text as transaction_id_raw,
+  src.customer_id::text as customer_id_raw,
+  src.amount::text as amount_raw,
+  src.transaction_date::text as transaction_date_raw,
+  src.status::text as status_raw,
+  src.loaded_at,
+  src.load_batch_id
+from {{ source('raw', 'transactions') }} as src
+{{ single_pass('n', {'transaction_id': normalized_text('src.transaction_id')}) }}
+where {{ safe_bigint('n.transaction_id') }} is null
+{% if is_incremental() %}
+  -- ✅ Only rows loaded after the last quarantined load
+  and src.loaded_at > (
+    select coalesce(max(loaded_at), '1970-01-01'::timestamp)
+    from {{ this }}
+  )
+{% endif %}
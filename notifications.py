@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Pipeline notifications: an on-disk outbox drained by an asyncio dispatcher
+
+notify() writes the message to the outbox directory and returns; a
+detached dispatcher process (one per outbox, guarded by a lock file)
+delivers it, so the pipeline never waits on SMTP. Each flush sends
+everything pending over a single SMTP session (one connect, STARTTLS and
+login). Messages that fail stay queued and are retried, up to
+NOTIFY_MAX_ATTEMPTS, after which they are moved to failed/.
+
+With NOTIFY_DIGEST_MINUTES set, the dispatcher waits until the oldest
+queued message is that old and sends one digest instead: the check counts
+of every dbt and Soda run in the window, read from validation_rollups,
+followed by the subjects of the runs it replaces.
+
+For local testing, run the SMTP stand-in and point the sender at it:
+
+    python notifications.py --smtp-sink 8025 --mailbox /tmp/mailbox
+    SMTP_SERVER=localhost SMTP_PORT=8025 NOTIFY_SMTP_STARTTLS=0 SENDER_PASSWORD= \\
+        python test_all.py
+
+Usage:
+    python notifications.py            # deliver the outbox, waiting for digests and retries
+    python notifications.py --once     # one flush attempt, no waiting
+    python notifications.py --status   # list queued and failed messages
+"""
+import argparse
+import asyncio
+import fcntl
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+NOTIFY_OUTBOX_DIR = os.getenv('NOTIFY_OUTBOX_DIR', os.path.join('logs', 'notifications'))
+# "async" hands delivery to a background dispatcher; "sync" flushes before returning
+NOTIFY_MODE = os.getenv('NOTIFY_MODE', 'async').lower()
+# Combine the runs of this many minutes into one message; 0 sends every run's own
+NOTIFY_DIGEST_MINUTES = float(os.getenv('NOTIFY_DIGEST_MINUTES', '0'))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', '5'))
+NOTIFY_RETRY_SECONDS = float(os.getenv('NOTIFY_RETRY_SECONDS', '60'))
+SMTP_TIMEOUT = float(os.getenv('SMTP_TIMEOUT', '30'))
+
+PLACEHOLDER_SENDER = 'your-email@gmail.com'
+# A run's rollups are written a little before its notification is queued
+DIGEST_LOOKBACK_SLACK_SECONDS = 300
+
+
+def smtp_settings():
+    """SMTP configuration from the environment (the variables test_all.py always used)"""
+    return {
+        'server': os.getenv('SMTP_SERVER', 'smtp.gmail.com'),
+        'port': int(os.getenv('SMTP_PORT', '587')),
+        'sender': os.getenv('SENDER_EMAIL', PLACEHOLDER_SENDER),
+        'password': os.getenv('SENDER_PASSWORD', 'your-app-password'),
+        'recipients': [
+            address.strip()
+            for address in os.getenv('RECIPIENT_EMAIL', 'recipient@gmail.com').split(',')
+            if address.strip()
+        ],
+        'starttls': os.getenv('NOTIFY_SMTP_STARTTLS', '1').lower() in ('1', 'true', 'yes'),
+    }
+
+
+def email_configured(settings=None):
+    settings = settings or smtp_settings()
+    return bool(settings['sender']) and settings['sender'] != PLACEHOLDER_SENDER
+
+
+# Outbox
+
+def enqueue(subject, body, outbox=None):
+    """Write a message to the outbox and return its path
+
+    The file is written under a temporary name and renamed, so the
+    dispatcher never reads a partial message.
+    """
+    outbox = outbox or NOTIFY_OUTBOX_DIR
+    os.makedirs(outbox, exist_ok=True)
+    path = os.path.join(outbox, f"{time.time_ns()}_{os.getpid()}.json")
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'subject': subject, 'body': body, 'queued_at': time.time(), 'attempts': 0}, f)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def pending(outbox=None):
+    """[(path, message)] of the queued messages, oldest first"""
+    outbox = outbox or NOTIFY_OUTBOX_DIR
+    if not os.path.isdir(outbox):
+        return []
+    messages = []
+    for name in sorted(os.listdir(outbox)):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(outbox, name)
+        try:
+            with open(path) as f:
+                messages.append((path, json.load(f)))
+        except (OSError, ValueError):
+            # Delivered by another flush meanwhile, or unreadable
+            continue
+    return messages
+
+
+def _record_failure(path, message, error, outbox):
+    """Count a failed attempt; give up on the message after NOTIFY_MAX_ATTEMPTS"""
+    message = dict(message, attempts=message.get('attempts', 0) + 1, last_error=str(error))
+    if message['attempts'] >= NOTIFY_MAX_ATTEMPTS:
+        failed = os.path.join(outbox, 'failed')
+        os.makedirs(failed, exist_ok=True)
+        target = os.path.join(failed, os.path.basename(path))
+    else:
+        target = path
+    with open(target + '.tmp', 'w') as f:
+        json.dump(message, f)
+    os.replace(target + '.tmp', target)
+    if target != path:
+        os.remove(path)
+
+
+@contextmanager
+def _dispatcher_lock(outbox):
+    """Yield True if this process is the outbox's only dispatcher"""
+    os.makedirs(outbox, exist_ok=True)
+    with open(os.path.join(outbox, '.lock'), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# Messages
+
+def _mime_message(settings, subject, body):
+    from email.mime.text import MIMEText
+    from email.utils import formatdate
+    message = MIMEText(body, 'plain', 'utf-8')
+    message['From'] = settings['sender']
+    message['To'] = ', '.join(settings['recipients'])
+    message['Subject'] = subject
+    message['Date'] = formatdate(localtime=True)
+    return message
+
+
+def _format_run(row):
+    validation_type, run_key, total, passed, failed, error, cached, last_seen = row
+    return (f"   {last_seen:%H:%M} {validation_type} {run_key}: {passed}/{total} passed, "
+            f"{failed} failed, {error} errors, {cached} cached")
+
+
+def digest_body(messages, window_seconds):
+    """Digest of the queued messages: the rollups of every run in the window, then the runs' subjects"""
+    body = f"""
+🎯 DBT + SODA DIGEST
+====================
+
+Runs in the last {window_seconds / 60:.0f} minutes:
+"""
+    try:
+        import results_store
+        import save_validation_results
+        conn = results_store.connect()
+        try:
+            rows = save_validation_results.recent_run_summaries(conn.cursor(), window_seconds)
+            conn.commit()
+        finally:
+            conn.close()
+        totals = {}
+        for row in rows:
+            body += _format_run(row) + "\n"
+            counts = totals.setdefault(row[0], [0, 0, 0, 0, 0])
+            totals[row[0]] = [a + (b or 0) for a, b in zip(counts, (1, row[2], row[3], row[4], row[5]))]
+        body += "\n📈 Totals:\n"
+        for validation_type, (runs, total, passed, failed, error) in sorted(totals.items()):
+            body += (f"   {validation_type}: {runs} runs, {passed}/{total} passed, "
+                     f"{failed} failed, {error} errors\n")
+    except Exception as e:
+        body += f"   (rollups unavailable: {e})\n"
+
+    body += f"\n📬 Notifications combined ({len(messages)}):\n"
+    for _, message in messages:
+        queued = datetime.fromtimestamp(message['queued_at'])
+        body += f"   {queued:%Y-%m-%d %H:%M} {message['subject']}\n"
+    return body
+
+
+# Delivery
+
+def _open_session(settings):
+    import smtplib
+    session = smtplib.SMTP(settings['server'], settings['port'], timeout=SMTP_TIMEOUT)
+    try:
+        session.ehlo()
+        if settings['starttls']:
+            session.starttls()
+            session.ehlo()
+        if settings['password']:
+            session.login(settings['sender'], settings['password'])
+    except Exception:
+        session.close()
+        raise
+    return session
+
+
+def _send_all(session, settings, mails):
+    """Send (paths, MIME message) pairs over one session; returns [(paths, error or None)]"""
+    import smtplib
+    outcomes = []
+    for index, (paths, message) in enumerate(mails):
+        try:
+            session.send_message(message, settings['sender'], settings['recipients'])
+            outcomes.append((paths, None))
+        except (smtplib.SMTPServerDisconnected, OSError) as e:
+            # The session is gone: this and the remaining mails stay queued
+            outcomes.extend((rest, e) for rest, _ in mails[index:])
+            break
+        except smtplib.SMTPException as e:
+            outcomes.append((paths, e))
+    try:
+        session.quit()
+    except (smtplib.SMTPException, OSError):
+        session.close()
+    return outcomes
+
+
+def _next_flush_delay(outbox):
+    """None if the outbox is empty, 0 if messages were queued meanwhile, else the retry delay"""
+    remaining = pending(outbox)
+    if not remaining:
+        return None
+    return 0 if any(message.get('attempts', 0) == 0 for _, message in remaining) else NOTIFY_RETRY_SECONDS
+
+
+async def flush(outbox=None, settings=None, digest_minutes=None, now=None):
+    """Deliver the queued messages over one SMTP session
+
+    Returns (delivered, wait): the number of queued messages delivered and,
+    if some remain, the seconds until the next flush is worth trying (the
+    digest window still open, or a retry after a failure), else None.
+    """
+    outbox = outbox or NOTIFY_OUTBOX_DIR
+    settings = settings or smtp_settings()
+    digest_minutes = NOTIFY_DIGEST_MINUTES if digest_minutes is None else digest_minutes
+    now = time.time() if now is None else now
+    messages = pending(outbox)
+    if not messages:
+        return 0, None
+
+    if digest_minutes > 0:
+        window = digest_minutes * 60
+        opened = now - min(message['queued_at'] for _, message in messages)
+        if opened < window:
+            return 0, window - opened
+
+    # Connecting and logging in overlap with building the messages
+    session_task = asyncio.create_task(asyncio.to_thread(_open_session, settings))
+    try:
+        if digest_minutes > 0:
+            body = await asyncio.to_thread(digest_body, messages, opened + DIGEST_LOOKBACK_SLACK_SECONDS)
+            subject = f"dbt + Soda Digest - {len(messages)} runs to {datetime.now():%Y-%m-%d %H:%M}"
+            mails = [([path for path, _ in messages], _mime_message(settings, subject, body))]
+        else:
+            mails = [([path], _mime_message(settings, message['subject'], message['body']))
+                     for path, message in messages]
+    except Exception:
+        # Close the session once it is open rather than leave it to time out
+        session_task.add_done_callback(
+            lambda task: task.cancelled() or task.exception() or task.result().close())
+        raise
+    try:
+        session = await session_task
+    except Exception as e:
+        print(f"❌ Notification delivery failed: {e}")
+        for path, message in messages:
+            _record_failure(path, message, e, outbox)
+        return 0, _next_flush_delay(outbox)
+
+    by_path = dict(messages)
+    delivered = 0
+    for paths, error in await asyncio.to_thread(_send_all, session, settings, mails):
+        for path in paths:
+            if error is None:
+                os.remove(path)
+                delivered += 1
+            else:
+                print(f"❌ Notification {os.path.basename(path)} failed: {error}")
+                _record_failure(path, by_path[path], error, outbox)
+    if delivered:
+        print(f"✅ Delivered {delivered} notifications in one SMTP session")
+    return delivered, _next_flush_delay(outbox)
+
+
+async def dispatch(outbox=None, wait=True):
+    """Drain the outbox, sleeping through digest windows and retries if wait
+
+    Returns the number of messages delivered. Only one dispatcher works
+    an outbox at a time; others return at once. Before exiting, the outbox
+    is checked again for messages queued while the lock was held.
+    """
+    outbox = outbox or NOTIFY_OUTBOX_DIR
+    delivered = 0
+    while True:
+        with _dispatcher_lock(outbox) as locked:
+            if not locked:
+                return delivered
+            while True:
+                sent, delay = await flush(outbox)
+                delivered += sent
+                if delay is None or not wait:
+                    break
+                await asyncio.sleep(delay)
+        if not wait or not pending(outbox):
+            return delivered
+
+
+def start_dispatcher(outbox=None):
+    """Start a detached dispatcher process that outlives the caller"""
+    outbox = outbox or NOTIFY_OUTBOX_DIR
+    os.makedirs(outbox, exist_ok=True)
+    with open(os.path.join(outbox, 'dispatcher.log'), 'a') as log:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--outbox', outbox],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+
+def notify(subject, body, outbox=None):
+    """Queue a message and deliver it according to NOTIFY_MODE; returns True if queued"""
+    outbox = outbox or NOTIFY_OUTBOX_DIR
+    enqueue(subject, body, outbox)
+    if NOTIFY_MODE == 'sync':
+        asyncio.run(dispatch(outbox, wait=False))
+    else:
+        start_dispatcher(outbox)
+    return True
+
+
+# Local SMTP stand-in
+
+class SMTPSink:
+    """Minimal SMTP server that stores every message it accepts as a .eml file
+
+    No STARTTLS or AUTH: senders need NOTIFY_SMTP_STARTTLS=0 and an empty
+    SENDER_PASSWORD.
+    """
+
+    def __init__(self, mailbox):
+        self.mailbox = mailbox
+        self.received = 0
+
+    async def handle(self, reader, writer):
+        async def reply(line):
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        await reply("220 notifications sink ready")
+        while not reader.at_eof():
+            line = (await reader.readline()).decode(errors='replace').rstrip('\r\n')
+            command = line[:4].upper()
+            if command in ('EHLO', 'HELO'):
+                await reply("250 notifications sink")
+            elif command in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                await reply("250 OK")
+            elif command == 'DATA':
+                await reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data = (await reader.readline()).decode(errors='replace').rstrip('\r\n')
+                    if data == '.':
+                        break
+                    lines.append(data[1:] if data.startswith('..') else data)
+                self.received += 1
+                path = os.path.join(self.mailbox, f"{time.time_ns()}.eml")
+                with open(path, 'w') as f:
+                    f.write('\n'.join(lines) + '\n')
+                print(f"📨 Stored {path}")
+                await reply("250 OK")
+            elif command == 'QUIT':
+                await reply("221 Bye")
+                break
+            elif line:
+                await reply("502 Command not implemented")
+        writer.close()
+
+    async def serve(self, host, port):
+        os.makedirs(self.mailbox, exist_ok=True)
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"SMTP sink on {host}:{port}, storing messages in {self.mailbox}")
+        async with server:
+            await server.serve_forever()
+
+
+def print_status(outbox):
+    queued = pending(outbox)
+    failed = pending(os.path.join(outbox, 'failed'))
+    print(f"{len(queued)} queued, {len(failed)} failed in {outbox}")
+    for label, messages in (('queued', queued), ('failed', failed)):
+        for path, message in messages:
+            queued_at = datetime.fromtimestamp(message['queued_at'])
+            error = f" - {message['last_error']}" if message.get('last_error') else ''
+            print(f"   {label} {queued_at:%Y-%m-%d %H:%M:%S} {message['subject']} "
+                  f"(attempts: {message.get('attempts', 0)}){error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver queued pipeline notifications")
+    parser.add_argument('--outbox', default=NOTIFY_OUTBOX_DIR,
+                        help="Outbox directory (NOTIFY_OUTBOX_DIR)")
+    parser.add_argument('--once', action='store_true',
+                        help="Flush once without waiting for digest windows or retries")
+    parser.add_argument('--status', action='store_true', help="List queued and failed messages")
+    parser.add_argument('--smtp-sink', type=int, metavar='PORT',
+                        help="Run a local SMTP stand-in on this port instead")
+    parser.add_argument('--mailbox', default=os.path.join('logs', 'mailbox'),
+                        help="Where the SMTP stand-in stores messages")
+    args = parser.parse_args()
+
+    if args.smtp_sink:
+        try:
+            asyncio.run(SMTPSink(args.mailbox).serve('localhost', args.smtp_sink))
+        except KeyboardInterrupt:
+            pass
+        return
+    if args.status:
+        print_status(args.outbox)
+        return
+
+    delivered = asyncio.run(dispatch(args.outbox, wait=not args.once))
+    print(f"{delivered} notifications delivered, {len(pending(args.outbox))} queued")
+
+
+if __name__ == "__main__":
+    main()
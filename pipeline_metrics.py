@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Per-stage and per-dbt-node metrics for the test pipeline
+
+Stage rows carry the wall time, the user/system CPU time and the peak RSS
+recorded by stage_scheduler. Node rows come from run_results.json: dbt's
+compile and execute phases, rows affected, the worker thread and how long
+the node waited on its thread (time since the previous node on that thread
+finished, or since the first node of the invocation started). Both are
+stored in pipeline_stage_metrics and ranked in a hot-spot report.
+"""
+import os
+from datetime import datetime
+
+from dbt_artifacts import iter_run_results, streaming_enabled
+
+HOT_SPOT_LIMIT = int(os.getenv('HOT_SPOT_LIMIT', '10'))
+
+METRIC_COLUMNS = (
+    'pipeline_run_id', 'stage', 'node_id', 'status', 'wall_seconds', 'user_cpu_seconds',
+    'system_cpu_seconds', 'max_rss_kb', 'compile_seconds', 'execute_seconds',
+    'queue_wait_seconds', 'rows_affected', 'thread_id'
+)
+
+
+def create_metrics_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pipeline_stage_metrics (
+            id BIGSERIAL PRIMARY KEY,
+            pipeline_run_id VARCHAR(100) NOT NULL,
+            stage VARCHAR(255) NOT NULL,
+            node_id VARCHAR(500),
+            status VARCHAR(50),
+            wall_seconds DOUBLE PRECISION,
+            user_cpu_seconds DOUBLE PRECISION,
+            system_cpu_seconds DOUBLE PRECISION,
+            max_rss_kb BIGINT,
+            compile_seconds DOUBLE PRECISION,
+            execute_seconds DOUBLE PRECISION,
+            queue_wait_seconds DOUBLE PRECISION,
+            rows_affected BIGINT,
+            thread_id VARCHAR(100),
+            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS pipeline_stage_metrics_run
+        ON pipeline_stage_metrics (pipeline_run_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS pipeline_stage_metrics_stage
+        ON pipeline_stage_metrics (stage, node_id, recorded_at)
+    """)
+
+
+def _timestamp(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _seconds(start, end):
+    if start is None or end is None:
+        return None
+    return (end - start).total_seconds()
+
+
+def stage_rows(run_id, results):
+    """One metrics row per pipeline stage from stage_scheduler results"""
+    for result in results.values():
+        metrics = result.metrics
+        yield dict(
+            pipeline_run_id=run_id, stage=result.name, node_id=None, status=result.status,
+            wall_seconds=result.duration,
+            user_cpu_seconds=metrics.get('user_cpu'),
+            system_cpu_seconds=metrics.get('system_cpu'),
+            max_rss_kb=metrics.get('max_rss_kb'),
+            compile_seconds=None, execute_seconds=None, queue_wait_seconds=None,
+            rows_affected=None, thread_id=None,
+        )
+
+
+def node_rows(run_id, stage, run_results_path):
+    """One metrics row per node in a run_results.json, with its phases and queue wait"""
+    nodes = []
+    for _, result in iter_run_results(run_results_path, streaming=streaming_enabled()):
+        phases = {
+            phase.get('name'): (_timestamp(phase.get('started_at')), _timestamp(phase.get('completed_at')))
+            for phase in result.get('timing') or []
+        }
+        starts = [start for start, _ in phases.values() if start]
+        ends = [end for _, end in phases.values() if end]
+        nodes.append((result, phases, min(starts) if starts else None, max(ends) if ends else None))
+
+    # Queue wait: idle time on the node's thread before the node started
+    invocation_start = min((start for _, _, start, _ in nodes if start), default=None)
+    thread_free = {}
+    waits = {}
+    for result, _, start, end in sorted(nodes, key=lambda n: (n[2] is None, n[2] or datetime.min)):
+        thread_id = result.get('thread_id')
+        if start is not None:
+            waits[result.get('unique_id')] = _seconds(thread_free.get(thread_id, invocation_start), start)
+        if end is not None:
+            thread_free[thread_id] = end
+
+    for result, phases, start, end in nodes:
+        yield dict(
+            pipeline_run_id=run_id, stage=stage, node_id=result.get('unique_id'),
+            status=result.get('status'),
+            wall_seconds=result.get('execution_time'),
+            user_cpu_seconds=None, system_cpu_seconds=None, max_rss_kb=None,
+            compile_seconds=_seconds(*phases.get('compile', (None, None))),
+            execute_seconds=_seconds(*phases.get('execute', (None, None))),
+            queue_wait_seconds=waits.get(result.get('unique_id')),
+            rows_affected=(result.get('adapter_response') or {}).get('rows_affected'),
+            thread_id=result.get('thread_id'),
+        )
+
+
+def save_metrics(conn, rows):
+    """Persist metrics rows in one batch; returns the number written"""
+    from save_validation_results import bulk_insert
+
+    cursor = conn.cursor()
+    create_metrics_table(cursor)
+    saved = bulk_insert(
+        cursor, 'pipeline_stage_metrics', METRIC_COLUMNS,
+        (tuple(row[column] for column in METRIC_COLUMNS) for row in rows)
+    )
+    conn.commit()
+    return saved
+
+
+def _format(value, unit='s'):
+    return f"{value:8.2f}{unit}" if value is not None else " " * 8 + "-"
+
+
+def print_hot_spots(rows, limit=None):
+    """Print stages and dbt nodes ranked by wall time"""
+    limit = limit or HOT_SPOT_LIMIT
+    rows = [row for row in rows if row['wall_seconds']]
+    stage_total = sum(row['wall_seconds'] for row in rows if row['node_id'] is None)
+
+    print("\n🔥 HOT SPOTS")
+    print("=" * 50)
+    print(f"   {'stage / node':<48} {'wall':>9} {'share':>6} {'cpu':>9} {'rss MB':>8} "
+          f"{'compile':>9} {'execute':>9} {'wait':>9}")
+    for row in sorted(rows, key=lambda r: r['wall_seconds'], reverse=True)[:limit]:
+        label = row['stage'] if row['node_id'] is None else f"  {row['node_id']}"
+        share = f"{row['wall_seconds'] / stage_total * 100:5.1f}%" if stage_total else "     -"
+        cpu = None
+        if row['user_cpu_seconds'] is not None:
+            cpu = row['user_cpu_seconds'] + (row['system_cpu_seconds'] or 0.0)
+        rss = f"{row['max_rss_kb'] / 1024:8.1f}" if row['max_rss_kb'] else " " * 7 + "-"
+        print(f"   {label[:48]:<48} {_format(row['wall_seconds'])} {share} {_format(cpu)} {rss} "
+              f"{_format(row['compile_seconds'])} {_format(row['execute_seconds'])} "
+              f"{_format(row['queue_wait_seconds'])}")
@@ -0,0 +1,76 @@
+"""
+Fixtures for the integration tests
+
+The tests run against the PostgreSQL database of the DB_* environment (the
+same settings the pipeline uses), each in a scratch schema loaded from
+init.sql and dropped afterwards. Model tests also need dbt, which runs with
+the env_var() profile in docker/ so it builds into the scratch schema.
+Tests are skipped when the database or dbt is unavailable.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import uuid
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+
+@pytest.fixture(scope='session')
+def db_conn():
+    psycopg2 = pytest.importorskip('psycopg2')
+    import results_store
+    try:
+        conn = psycopg2.connect(connect_timeout=3, **results_store.db_settings())
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"database unavailable: {e}")
+    conn.autocommit = True
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def raw_schema(db_conn):
+    """A scratch schema holding init.sql's raw customers / transactions tables"""
+    schema = f"it_{uuid.uuid4().hex[:12]}"
+    cursor = db_conn.cursor()
+    cursor.execute(f"CREATE SCHEMA {schema}")
+    try:
+        cursor.execute(f"SET search_path TO {schema}")
+        with open(os.path.join(REPO_DIR, 'init.sql')) as f:
+            cursor.execute(f.read())
+        cursor.execute("RESET search_path")
+        yield schema
+    finally:
+        cursor.execute("RESET search_path")
+        cursor.execute(f"DROP SCHEMA {schema} CASCADE")
+
+
+@pytest.fixture
+def dbt(raw_schema, tmp_path):
+    """Run dbt commands against the scratch schema; returns the command output"""
+    if shutil.which('dbt') is None:
+        pytest.skip("dbt is not installed")
+    import results_store
+    settings = results_store.db_settings()
+    env = dict(
+        os.environ,
+        DB_HOST=settings['host'], DB_PORT=str(settings['port']), DB_NAME=settings['dbname'],
+        DB_USER=settings['user'], DB_PASSWORD=settings['password'],
+        DB_SCHEMA=raw_schema, DBT_SOURCE_SCHEMA=raw_schema,
+    )
+
+    def run(*args):
+        result = subprocess.run(
+            ['dbt', *args, '--profiles-dir', os.path.join(REPO_DIR, 'docker'),
+             '--target-path', str(tmp_path / 'target')],
+            cwd=REPO_DIR, env=env, capture_output=True, text=True
+        )
+        assert result.returncode == 0, f"dbt {' '.join(args)} failed:\n{result.stdout[-4000:]}"
+        return result.stdout
+
+    return run
+
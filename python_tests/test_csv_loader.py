@@ -0,0 +1,110 @@
+"""
+CSV loader: validation, amount normalization and concurrent loads
+"""
+import pytest
+
+import csv_loader
+
+TRANSACTIONS_HEADER = ['transaction_id', 'customer_id', 'amount', 'transaction_date', 'status']
+CUSTOMERS_HEADER = ['customer_id', 'name', 'email', 'region', 'signup_date']
+
+
+def _validate(table, header, *records):
+    return csv_loader.validate_chunk(table, header, list(enumerate(records, start=2)))
+
+
+def _reasons(table, header, record):
+    good, rejects = _validate(table, header, record)
+    assert not good
+    (_, reasons, _), = rejects
+    return reasons
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('12.5', '12.50'),
+    (' $1,234.50 ', '1234.50'),
+    ('-1,000', '-1000.00'),
+    ('+1,234,567.891', '1234567.89'),
+    ('0.005', '0.01'),
+    ('', None),
+])
+def test_amounts_are_normalized(value, expected):
+    assert csv_loader._amounts([value]) == ([expected], [None])
+
+
+@pytest.mark.parametrize('value, reason', [
+    ('1,5', "ambiguous comma in amount '1,5'"),
+    ('1.234,5', "ambiguous comma in amount '1.234,5'"),
+    ('12,34,567', "ambiguous comma in amount '12,34,567'"),
+    ('ten', "invalid amount 'ten'"),
+    ('1e3', "invalid amount '1e3'"),
+    ('100000000', "amount out of range '100000000'"),
+])
+def test_bad_amounts_are_rejected(value, reason):
+    assert csv_loader._amounts([value]) == ([None], [reason])
+
+
+def test_good_rows_are_normalized():
+    good, rejects = _validate('transactions', TRANSACTIONS_HEADER,
+                              ['007', '42', '$19.99', '2024/3/5 10:00', ' paid '])
+    assert good == [('7', '42', '19.99', '2024-03-05', 'PAID')]
+    assert rejects == []
+
+
+@pytest.mark.parametrize('record, reasons', [
+    (['T1', '42', '1', '2024-01-01', 'PAID'], ["non-numeric id 'T1'"]),
+    (['1', '', '1', '2024-01-01', 'PAID'], ['missing customer_id']),
+    (['1', '42', '1', '2024-02-30', 'PAID'], ["invalid date '2024-02-30'"]),
+    (['1', '42', '1', '2024-01-01', 'lost'], ["unknown status 'LOST'"]),
+    (['x', '42', '1,5', '', 'PAID'],
+     ["non-numeric id 'x'", "ambiguous comma in amount '1,5'", 'missing transaction_date']),
+])
+def test_transaction_reject_reasons(record, reasons):
+    assert _reasons('transactions', TRANSACTIONS_HEADER, record) == reasons
+
+
+def test_customer_reject_reasons():
+    assert _reasons('customers', CUSTOMERS_HEADER, ['1', 'Ann', 'ann@example', 'EU', '']) == \
+        ["invalid email 'ann@example'"]
+    assert _reasons('customers', CUSTOMERS_HEADER, ['1', 'Ann', '', 'EU', '']) == ['missing email']
+
+
+def test_wrong_field_count_keeps_the_raw_fields():
+    good, rejects = _validate('transactions', TRANSACTIONS_HEADER,
+                              ['1', '42', '1', '2024-01-01', 'PAID'], ['2', '42', '1'])
+    assert len(good) == 1
+    assert rejects == [(3, ['expected 5 fields, got 3'], ['2', '42', '1'])]
+
+
+def test_concurrent_load_of_two_files(db_conn, raw_schema, tmp_path):
+    paths = []
+    for i in range(2):
+        path = tmp_path / f"transactions_{i}.csv"
+        rows = [f"{i}{n:04d},42,\"1,000.{n % 100:02d}\",2024-01-01,PAID" for n in range(1000)]
+        path.write_text('\n'.join([','.join(TRANSACTIONS_HEADER), *rows, 'bad,42,1,2024-01-01,PAID']) + '\n')
+        paths.append(str(path))
+
+    results, failures = csv_loader.load_files(paths, schema=raw_schema, workers=2, chunk_rows=300)
+    assert failures == []
+    assert sorted((s['loaded'], s['rejected']) for s in results) == [(1000, 1), (1000, 1)]
+
+    cursor = db_conn.cursor()
+    cursor.execute(f"""
+        SELECT b.status, b.rows_loaded, b.loaded_at, count(t.*), min(t.loaded_at), max(t.loaded_at),
+               sum(t.amount)
+        FROM {raw_schema}.raw_load_batches b
+        JOIN {raw_schema}.transactions t USING (load_batch_id)
+        GROUP BY 1, 2, 3
+        ORDER BY b.loaded_at
+    """)
+    batches = cursor.fetchall()
+    assert len(batches) == 2
+    for status, rows_loaded, loaded_at, count, first, last, total in batches:
+        assert (status, rows_loaded, count) == ('loaded', 1000, 1000)
+        # Every row carries the batch's loaded_at, taken when the batch committed
+        assert first == last == loaded_at
+        assert total == 1000 * 1000 + sum(n % 100 for n in range(1000)) / 100
+    assert batches[0][2] < batches[1][2]
+
+    cursor.execute(f"SELECT line_number, reasons FROM {raw_schema}.raw_load_rejects ORDER BY 1")
+    assert cursor.fetchall() == [(1002, "non-numeric id 'bad'")] * 2
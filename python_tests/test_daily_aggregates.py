@@ -0,0 +1,71 @@
+"""
+Daily aggregates: incremental rebuilds after date corrections
+"""
+MODELS = ('--select', '+agg_region_daily')
+
+
+def _insert_transactions(conn, schema, rows):
+    cursor = conn.cursor()
+    cursor.executemany(f"""
+        INSERT INTO {schema}.transactions
+            (transaction_id, customer_id, amount, transaction_date, status)
+        VALUES (%s, %s, %s, %s, %s)
+    """, rows)
+
+
+def _rows(conn, sql):
+    cursor = conn.cursor()
+    cursor.execute(sql)
+    return cursor.fetchall()
+
+
+def _customer_daily(conn, schema):
+    return _rows(conn, f"""
+        SELECT customer_id, transaction_date::text, transaction_count, total_amount
+        FROM {schema}.agg_customer_daily
+        ORDER BY 1, 2
+    """)
+
+
+def _region_daily(conn, schema):
+    return _rows(conn, f"""
+        SELECT region, transaction_date::text, customer_count, transaction_count, total_amount
+        FROM {schema}.agg_region_daily
+        ORDER BY 1, 2
+    """)
+
+
+def test_moved_transaction_rebuilds_the_day_it_left(db_conn, raw_schema, dbt):
+    _insert_transactions(db_conn, raw_schema, [
+        ('1', '1001', 10, '2023-06-01', 'SUCCESS'),
+        ('2', '1002', 20, '2023-06-01', 'SUCCESS'),
+        ('3', '1001', 30, '2023-06-02', 'SUCCESS'),
+    ])
+    dbt('run', *MODELS)
+
+    # 1 leaves a day that keeps other rows, 3 leaves a day that ends up empty
+    _insert_transactions(db_conn, raw_schema, [
+        ('1', '1001', 10, '2023-06-03', 'SUCCESS'),
+        ('3', '1001', 30, '2023-06-05', 'SUCCESS'),
+    ])
+    dbt('run', *MODELS)
+
+    assert _customer_daily(db_conn, raw_schema) == [
+        (1001, '2023-06-03', 1, 10),
+        (1001, '2023-06-05', 1, 30),
+        (1002, '2023-06-01', 1, 20),
+    ]
+    # init.sql puts 1001 in North and 1002 in South
+    assert _region_daily(db_conn, raw_schema) == [
+        ('North', '2023-06-03', 1, 1, 10),
+        ('North', '2023-06-05', 1, 1, 30),
+        ('South', '2023-06-01', 1, 1, 20),
+    ]
+
+    # Nothing new: the next run leaves the aggregates as they are
+    dbt('run', *MODELS)
+    assert _customer_daily(db_conn, raw_schema) == [
+        (1001, '2023-06-03', 1, 10),
+        (1001, '2023-06-05', 1, 30),
+        (1002, '2023-06-01', 1, 20),
+    ]
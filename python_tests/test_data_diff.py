@@ -0,0 +1,122 @@
+"""
+Checksum-bisection data diff on scratch relations
+"""
+import pytest
+
+from data_diff import DataDiff, format_summary, save_diff
+
+
+@pytest.fixture
+def relations(db_conn, raw_schema):
+    """Create source/target tables from (columns DDL, source rows, target rows)"""
+    cursor = db_conn.cursor()
+
+    def create(source_ddl, source_rows, target_ddl=None, target_rows=()):
+        names = []
+        for name, ddl, rows in (('source', source_ddl, source_rows),
+                                ('target', target_ddl or source_ddl, target_rows)):
+            relation = f"{raw_schema}.diff_{name}"
+            cursor.execute(f"CREATE TABLE {relation} ({ddl})")
+            if rows:
+                placeholders = ', '.join(['%s'] * len(rows[0]))
+                cursor.executemany(f"INSERT INTO {relation} VALUES ({placeholders})", rows)
+            names.append(relation)
+        return names
+
+    return create
+
+
+def _diff(db_conn, source, target, key, **kwargs):
+    return DataDiff(db_conn.cursor(), source, target, key, exclude=[], **kwargs).run()
+
+
+def test_added_removed_and_changed_keys(db_conn, relations):
+    rows = [(i, f"value {i}") for i in range(1, 1001)]
+    target_rows = [(i, 'edited' if i == 420 else value) for i, value in rows if i != 5] + [(1500, 'new')]
+    source, target = relations('id bigint, value text', rows, target_rows=target_rows)
+
+    summary, changes = _diff(db_conn, source, target, 'id', segments=4, leaf_rows=10)
+
+    assert changes == {'5': 'removed', '420': 'changed', '1500': 'added'}
+    assert (summary['added'], summary['removed'], summary['changed']) == (1, 1, 1)
+    assert (summary['source_rows'], summary['target_rows']) == (1000, 1000)
+    # Only the mismatching segments were fetched, not the relations
+    assert summary['rows_fetched'] < 100
+
+
+def test_identical_relations(db_conn, relations):
+    rows = [(i, i * 2) for i in range(0, 300, 3)]
+    source, target = relations('id integer, doubled integer', rows, target_rows=rows)
+
+    summary, changes = _diff(db_conn, source, target, 'id', segments=2, leaf_rows=1)
+
+    assert changes == {}
+    assert format_summary(summary).startswith(f"{target} vs {source} on id: identical")
+
+
+def test_duplicate_keys_in_a_width_one_segment(db_conn, relations):
+    source, target = relations(
+        'id bigint, value text',
+        [(7, 'a'), (7, 'b'), (8, 'x'), (8, 'x'), (9, 'y')],
+        target_rows=[(7, 'a'), (7, 'c'), (8, 'x'), (8, 'x'), (9, 'y')],
+    )
+
+    # leaf_rows=1 splits down to single keys, which still hold two rows
+    summary, changes = _diff(db_conn, source, target, 'id', segments=2, leaf_rows=1)
+
+    assert changes == {'7': 'changed'}
+
+
+def test_date_key(db_conn, relations):
+    source, target = relations(
+        'day date, amount numeric',
+        [('2024-01-01', 1), ('2024-02-15', 2), ('2024-12-31', 3)],
+        target_rows=[('2024-01-01', 1), ('2024-02-15', 20), ('2025-01-01', 4)],
+    )
+
+    summary, changes = _diff(db_conn, source, target, 'day', segments=3, leaf_rows=1)
+
+    assert changes == {'2024-02-15': 'changed', '2024-12-31': 'removed', '2025-01-01': 'added'}
+
+
+def test_null_key_rows_are_compared_as_one_segment(db_conn, relations):
+    source, target = relations(
+        'id bigint, value text',
+        [(1, 'a'), (None, 'x'), (None, 'y')],
+        target_rows=[(1, 'a'), (None, 'y'), (None, 'x')],
+    )
+    summary, changes = _diff(db_conn, source, target, 'id')
+    assert changes == {} and summary['null_keys_match']
+
+    db_conn.cursor().execute(f"UPDATE {target} SET value = 'z' WHERE value = 'x'")
+    summary, changes = _diff(db_conn, source, target, 'id')
+    assert changes == {} and not summary['null_keys_match']
+    assert "null-key rows differ" in format_summary(summary)
+
+
+def test_column_changes_are_reported(db_conn, raw_schema, relations):
+    rows = [(1, 'a', 10), (2, 'b', 20)]
+    source, target = relations(
+        'id bigint, value text, score integer, dropped text',
+        [row + ('gone',) for row in rows],
+        target_ddl='id bigint, value text, score numeric, added text',
+        target_rows=[row + ('new',) for row in rows],
+    )
+
+    summary, changes = _diff(db_conn, source, target, 'id')
+
+    assert changes == {}
+    assert summary['columns'] == ['id', 'value']
+    assert summary['column_changes'] == ['~score (integer -> numeric)', '+added', '-dropped']
+    assert "identical" not in format_summary(summary)
+    assert "columns not compared: ~score (integer -> numeric), +added, -dropped" in format_summary(summary)
+
+    cursor = db_conn.cursor()
+    cursor.execute(f"SET search_path TO {raw_schema}")
+    try:
+        diff_id = save_diff(db_conn, summary, changes)
+        cursor.execute("SELECT compared_columns, column_changes FROM data_diff_runs WHERE diff_id = %s",
+                       (diff_id,))
+        assert cursor.fetchone() == ('id,value', '~score (integer -> numeric),+added,-dropped')
+    finally:
+        cursor.execute("RESET search_path")
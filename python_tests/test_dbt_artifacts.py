@@ -0,0 +1,58 @@
+"""
+Streaming dbt artifact reader
+"""
+import json
+
+import pytest
+
+from dbt_artifacts import iter_artifact
+
+# run_results.json-shaped, with numbers of every form and nested values
+RUN_RESULTS = {
+    'metadata': {'dbt_version': '1.9.0', 'generated_at': '2024-01-01T00:00:00Z', 'env': {}},
+    'results': [
+        {'unique_id': 'model.p.a', 'status': 'success', 'execution_time': -2.5e10,
+         'timing': [], 'adapter_response': {'rows_affected': 12345}, 'failures': None},
+        {'unique_id': 'test.p.b', 'status': 'fail', 'execution_time': 0.001234,
+         'timing': [{'name': 'execute', 'started_at': '2024-01-01'}], 'failures': 7,
+         'message': 'quote " and \\ and é', 'thread_id': 'Thread-1'},
+        {'unique_id': 'seed.p.c', 'execution_time': 123456789, 'skipped': True, 'ratio': 1E-7},
+    ],
+    'elapsed_time': 98.76,
+    'args': {'threads': 4, 'select': ['a', 'b'], 'flags': {}},
+}
+
+
+def _streamed(path, chunk_size, stream_key='results'):
+    document = {}
+    for key, value in iter_artifact(path, stream_key, chunk_size=chunk_size):
+        if key == stream_key:
+            document.setdefault(key, []).append(value)
+        else:
+            document[key] = value
+    return document
+
+
+@pytest.mark.parametrize('indent', [None, 2])
+def test_every_chunk_size_matches_json_load(tmp_path, indent):
+    path = tmp_path / 'run_results.json'
+    path.write_text(json.dumps(RUN_RESULTS, indent=indent))
+    with open(path) as f:
+        expected = json.load(f)
+    for chunk_size in range(1, 65):
+        assert _streamed(path, chunk_size) == expected, f"chunk_size={chunk_size}"
+
+
+def test_streamed_object_yields_name_value_pairs(tmp_path):
+    path = tmp_path / 'manifest.json'
+    nodes = {'model.p.a': {'checksum': 1.5}, 'model.p.b': {'checksum': -10}}
+    path.write_text(json.dumps({'metadata': {}, 'nodes': nodes, 'sources': {}}))
+    for chunk_size in range(1, 65):
+        assert dict(v for k, v in iter_artifact(path, 'nodes', chunk_size=chunk_size) if k == 'nodes') == nodes
+
+
+def test_top_level_number_at_end_of_file(tmp_path):
+    path = tmp_path / 'run_results.json'
+    path.write_text('{"results": [], "elapsed_time": 12345}')
+    for chunk_size in range(1, 65):
+        assert list(iter_artifact(path, 'results', chunk_size=chunk_size)) == [('elapsed_time', 12345)]
@@ -0,0 +1,111 @@
+"""
+Notification outbox delivered to the local SMTP stand-in
+"""
+import asyncio
+import email
+import json
+import os
+import socket
+
+import pytest
+
+import notifications
+import results_store
+
+
+def _settings(port):
+    return {
+        'server': 'localhost', 'port': port, 'sender': 'pipeline@example.com', 'password': '',
+        'recipients': ['team@example.com'], 'starttls': False,
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def _mailbox(path):
+    messages = []
+    for name in sorted(os.listdir(path)):
+        with open(os.path.join(path, name)) as f:
+            message = email.message_from_file(f)
+        messages.append((message['Subject'], message.get_payload(decode=True).decode()))
+    return messages
+
+
+def _flush_to_sink(mailbox, outbox, **kwargs):
+    """Run flush() against an SMTPSink on an ephemeral port; returns (flush result, sessions opened)"""
+    sink = notifications.SMTPSink(str(mailbox))
+    os.makedirs(sink.mailbox, exist_ok=True)
+    sessions = []
+
+    async def handle(reader, writer):
+        sessions.append(writer.get_extra_info('peername'))
+        await sink.handle(reader, writer)
+
+    async def run():
+        server = await asyncio.start_server(handle, 'localhost', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await notifications.flush(str(outbox), _settings(port), **kwargs)
+
+    return asyncio.run(run()), len(sessions)
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return tmp_path / 'outbox'
+
+
+def test_flush_sends_every_message_over_one_session(tmp_path, outbox):
+    for i in range(3):
+        notifications.enqueue(f"run {i}", f"body {i} ✅", str(outbox))
+
+    (delivered, wait), sessions = _flush_to_sink(tmp_path / 'mailbox', outbox, digest_minutes=0)
+
+    assert (delivered, wait, sessions) == (3, None, 1)
+    assert notifications.pending(str(outbox)) == []
+    assert _mailbox(tmp_path / 'mailbox') == [(f"run {i}", f"body {i} ✅") for i in range(3)]
+
+
+def test_failed_connect_counts_attempts_then_gives_up(outbox, monkeypatch):
+    monkeypatch.setattr(notifications, 'NOTIFY_MAX_ATTEMPTS', 2)
+    path = notifications.enqueue("run", "body", str(outbox))
+    settings = _settings(_free_port())
+
+    delivered, wait = asyncio.run(notifications.flush(str(outbox), settings, digest_minutes=0))
+    assert (delivered, wait) == (0, notifications.NOTIFY_RETRY_SECONDS)
+    (queued_path, message), = notifications.pending(str(outbox))
+    assert queued_path == path
+    assert message['attempts'] == 1 and message['last_error']
+
+    delivered, wait = asyncio.run(notifications.flush(str(outbox), settings, digest_minutes=0))
+    assert (delivered, wait) == (0, None)
+    assert notifications.pending(str(outbox)) == []
+    with open(os.path.join(outbox, 'failed', os.path.basename(path))) as f:
+        assert json.load(f)['attempts'] == 2
+
+
+def test_digest_waits_for_the_window_then_sends_one_message(tmp_path, outbox, monkeypatch):
+    def no_database():
+        raise OSError("no database")
+    monkeypatch.setattr(results_store, 'connect', no_database)
+    for i in range(2):
+        notifications.enqueue(f"run {i}", "body", str(outbox))
+    oldest = min(message['queued_at'] for _, message in notifications.pending(str(outbox)))
+
+    (delivered, wait), sessions = _flush_to_sink(tmp_path / 'mailbox', outbox,
+                                                 digest_minutes=10, now=oldest + 60)
+    assert (delivered, sessions) == (0, 0)
+    assert wait == pytest.approx(540)
+    assert len(notifications.pending(str(outbox))) == 2
+
+    (delivered, wait), sessions = _flush_to_sink(tmp_path / 'mailbox', outbox,
+                                                 digest_minutes=10, now=oldest + 601)
+    assert (delivered, wait, sessions) == (2, None, 1)
+    (subject, body), = _mailbox(tmp_path / 'mailbox')
+    assert subject.startswith("dbt + Soda Digest - 2 runs")
+    assert "(rollups unavailable: no database)" in body
+    assert "run 0" in body and "run 1" in body
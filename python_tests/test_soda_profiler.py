@@ -0,0 +1,31 @@
+"""
+Soda checks parsing for the profiler
+"""
+from soda_profiler import load_checks
+
+CHECKS = """\
+checks for dim_customers:
+  - row_count > 0
+
+  # blank lines and comments move the checks down
+  - missing_count(email) = 0
+checks for fact_transactions:
+  - invalid_count(status) = 0:
+      valid values: ['SUCCESS', 'FAILED']
+  - duplicate_count(transaction_id) = 0
+"""
+
+
+def test_checks_keep_their_line_in_checks_yml(tmp_path):
+    path = tmp_path / 'checks.yml'
+    path.write_text(CHECKS)
+
+    checks = load_checks(str(path))
+
+    assert [(c.text, c.line) for c in checks['dim_customers']] == [
+        ('row_count > 0', 2), ('missing_count(email) = 0', 5),
+    ]
+    assert [(c.text, c.line) for c in checks['fact_transactions']] == [
+        ('invalid_count(status) = 0', 7), ('duplicate_count(transaction_id) = 0', 9),
+    ]
+    assert checks['fact_transactions'][0].config == {'valid values': ['SUCCESS', 'FAILED']}
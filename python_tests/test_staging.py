@@ -0,0 +1,32 @@
+"""
+Staging models: unparseable ids are quarantined, not merged
+"""
+
+MODELS = ('--select', 'stg_transactions', 'stg_transactions_rejects', 'fact_transactions')
+
+
+def _count(conn, sql):
+    cursor = conn.cursor()
+    cursor.execute(sql)
+    return cursor.fetchone()[0]
+
+
+def test_invalid_ids_are_quarantined_once(db_conn, raw_schema, dbt):
+    # init.sql's transaction ids are TXN001..TXN008, none of which parse as numbers
+    cursor = db_conn.cursor()
+    cursor.execute(f"""
+        INSERT INTO {raw_schema}.transactions (transaction_id, customer_id, amount, transaction_date, status)
+        VALUES ('1', '1001', 10, '2023-06-01', 'SUCCESS'), (NULL, '1002', 20, '2023-06-02', 'SUCCESS')
+    """)
+    for _ in range(2):
+        dbt('run', *MODELS)
+        assert _count(db_conn, f"SELECT count(*) FROM {raw_schema}.stg_transactions") == 1
+        assert _count(db_conn, f"SELECT count(*) FROM {raw_schema}.fact_transactions") == 1
+        assert _count(db_conn, f"""
+            SELECT count(*) FROM {raw_schema}.stg_transactions_rejects
+            WHERE reject_reason = 'invalid transaction_id'
+        """) == 8
+        assert _count(db_conn, f"""
+            SELECT count(*) FROM {raw_schema}.stg_transactions_rejects
+            WHERE reject_reason = 'missing transaction_id'
+        """) == 1
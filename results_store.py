@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Shared client for the results database
+
+Connections come from one pool per process, configured from the DB_*
+environment (the same variables the dbt profile uses). A pooled
+connection's close() hands it back to the pool, so callers written for
+plain psycopg2 connections keep working while a pipeline run reuses the
+same few sessions instead of connecting for every step.
+
+Hot statements are prepared server-side once per session (PREPARE /
+EXECUTE), so repeated calls skip parsing and planning. psycopg2 has no
+libpq pipeline mode; execute_prepared_batch sends a page of EXECUTEs as
+one multi-statement round trip instead.
+"""
+import atexit
+import os
+import threading
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+import psycopg2.pool
+
+# Connections kept per process; callers beyond this wait for a free one
+RESULTS_POOL_SIZE = int(os.getenv('RESULTS_POOL_SIZE', '4'))
+# EXECUTE statements sent per round trip by execute_prepared_batch
+RESULTS_PIPELINE_PAGE_SIZE = int(os.getenv('RESULTS_PIPELINE_PAGE_SIZE', '100'))
+
+_pool = None
+_pool_lock = threading.Lock()
+# Pools inherited over fork(): their sessions belong to the parent, and
+# letting them be garbage collected would close those sessions
+_inherited_pools = []
+
+
+def db_settings():
+    """Connection parameters from the DB_* environment"""
+    return dict(
+        host=os.getenv('DB_HOST', '172.17.0.3'),
+        port=os.getenv('DB_PORT', '5432'),
+        dbname=os.getenv('DB_NAME', 'test_db'),
+        user=os.getenv('DB_USER', 'admin'),
+        password=os.getenv('DB_PASSWORD', 'admin'),
+        application_name='dbt_project_2_results',
+    )
+
+
+class StoreConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers the statements prepared in its session"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+class PooledConnection:
+    """A connection borrowed from the pool; close() returns it instead of disconnecting"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            super().__setattr__(name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    @property
+    def closed(self):
+        return 1 if self._conn is None else self._conn.closed
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+
+class ResultsPool:
+    """Thread-safe connection pool that blocks, rather than fails, when exhausted"""
+
+    def __init__(self, size=None, settings=None):
+        size = max(1, size or RESULTS_POOL_SIZE)
+        self.pid = os.getpid()
+        self._pool = psycopg2.pool.ThreadedConnectionPool(
+            0, size, connection_factory=StoreConnection, **(settings or db_settings())
+        )
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            return PooledConnection(self, self._pool.getconn())
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        discard = bool(conn.closed)
+        if not discard and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            # Never hand out a connection with a transaction left open
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        try:
+            self._pool.putconn(conn, close=discard)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        self._pool.closeall()
+
+
+def get_pool():
+    """The process's pool, created on first use (and again in forked children)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            if _pool is not None:
+                _inherited_pools.append(_pool)
+            _pool = ResultsPool()
+        return _pool
+
+
+def connect():
+    """Borrow a connection from the pool; close() returns it"""
+    return get_pool().acquire()
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+
+atexit.register(close_pool)
+
+
+def prepare(cursor, name, types, sql):
+    """PREPARE sql ($1.. placeholders of the given types) as name, once per session"""
+    conn = cursor.connection
+    prepared = getattr(conn, 'prepared', None)
+    if prepared is None:
+        # Not from the pool, so nothing tracks this session's statements
+        cursor.execute("SELECT 1 FROM pg_prepared_statements WHERE name = %s", (name,))
+        if cursor.fetchone():
+            return
+    elif name in prepared:
+        return
+    cursor.execute(f"PREPARE {name} ({', '.join(types)}) AS {sql}")
+    # Prepared statements belong to the session and survive a rollback
+    if prepared is not None:
+        prepared.add(name)
+
+
+def _execute_sql(name, count):
+    return f"EXECUTE {name} ({', '.join(['%s'] * count)})"
+
+
+def execute_prepared(cursor, name, types, sql, params):
+    """Run a prepared statement, preparing it first if this session has not"""
+    prepare(cursor, name, types, sql)
+    cursor.execute(_execute_sql(name, len(params)), params)
+
+
+def execute_prepared_batch(cursor, name, types, sql, params_list, page_size=None):
+    """Run a prepared statement for many parameter sets, a page of EXECUTEs per round trip"""
+    params_list = list(params_list)
+    if not params_list:
+        return
+    prepare(cursor, name, types, sql)
+    psycopg2.extras.execute_batch(
+        cursor, _execute_sql(name, len(params_list[0])), params_list,
+        page_size=page_size or RESULTS_PIPELINE_PAGE_SIZE
+    )
@@ -13,9 +13,11 @@ docker-compose build
 echo "📋 Starting services..."
 docker-compose up -d postgres
 
-# Wait for database to be ready
+# Wait for database to be ready (its compose healthcheck)
 echo "📋 Waiting for database to be ready..."
-sleep 10
+until [ "$(docker inspect -f '{{.State.Health.Status}}' "$(docker-compose ps -q postgres)")" = "healthy" ]; do
+    sleep 0.5
+done
 
 # Run the dbt pipeline
 echo "📋 Running dbt pipeline..."
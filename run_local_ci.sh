@@ -10,6 +10,7 @@ export DB_PASSWORD=admin
 export DB_NAME=test_db
 export DB_SCHEMA=public
 export DB_PORT=5432
+export DBT_THREADS=${DBT_THREADS:-4}
 
 # Activate virtual environment
 source /home/ubuntu/myenv/bin/activate
@@ -31,22 +32,27 @@ dbt_project_2:
       port: ${DB_PORT}
       dbname: ${DB_NAME}
       schema: ${DB_SCHEMA}
-      threads: 4
+      threads: ${DBT_THREADS}
       keepalives_idle: 0
       search_path: ${DB_SCHEMA}
 EOF
 
-echo "📋 Step 3: Running dbt debug..."
-dbt debug
+if [ "${DBT_EXECUTION_MODE}" = "inprocess" ]; then
+    echo "📋 Steps 3-6: Running dbt debug, compile, test and run in one process..."
+    python dbt_inprocess.py debug compile test run
+else
+    echo "📋 Step 3: Running dbt debug..."
+    dbt debug
 
-echo "📋 Step 4: Running dbt compile..."
-dbt compile
+    echo "📋 Step 4: Running dbt compile..."
+    dbt compile
 
-echo "📋 Step 5: Running dbt test..."
-dbt test
+    echo "📋 Step 5: Running dbt test..."
+    dbt test
 
-echo "📋 Step 6: Running dbt run..."
-dbt run
+    echo "📋 Step 6: Running dbt run..."
+    dbt run
+fi
 
 echo "📋 Step 7: Running Soda data quality checks..."
 cd soda_project
@@ -56,5 +62,8 @@ echo "📋 Step 8: Saving validation results..."
 cd ..
 python save_validation_results.py
 
+echo "📋 Step 9: Analyzing dbt thread usage..."
+python dbt_threads.py || true
+
 echo "✅ CI/CD Pipeline completed successfully!"
 echo "📊 Check validation results in PostgreSQL database"
@@ -3,48 +3,211 @@
 Script to save dbt and Soda validation results to PostgreSQL
 """
 import psycopg2
+import psycopg2.extras
+import argparse
+import io
 import json
-import subprocess
+import queue
+import re
 import sys
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import islice
 import os
 
+import results_store
+from dbt_artifacts import iter_run_results, streaming_enabled
+from soda_shards import run_sharded_scan
+from validation_cache import (
+    create_cache_table, relation_fingerprints, cached_outcomes, store_outcomes,
+    soda_check_tables, force_enabled
+)
+
+# Bulk ingest settings: rows are staged in memory and flushed in batches,
+# either through COPY ... FROM STDIN ("copy") or multi-row INSERTs ("values")
+RESULTS_BATCH_SIZE = int(os.getenv('RESULTS_BATCH_SIZE', '5000'))
+RESULTS_WRITE_METHOD = os.getenv('RESULTS_WRITE_METHOD', 'copy').lower()
+# Longest time a streamed row waits in memory before its batch is flushed
+RESULTS_FLUSH_INTERVAL = float(os.getenv('RESULTS_FLUSH_INTERVAL', '2'))
+
+DBT_TARGET_DIR = os.getenv('DBT_TARGET_DIR', '/home/ubuntu/dbt_project_2/target')
+SODA_PROJECT_DIR = os.getenv('SODA_PROJECT_DIR', '/home/ubuntu/dbt_project_2/soda_project')
+
 def connect_to_db():
-    """Connect to PostgreSQL database"""
+    """Connect to PostgreSQL database (a pooled connection; close() returns it)"""
     try:
-        conn = psycopg2.connect(
-            host="172.17.0.3",
-            database="test_db",
-            user="admin",
-            password="admin",
-            port="5432"
-        )
-        return conn
+        return results_store.connect()
     except Exception as e:
         print(f"Error connecting to database: {e}")
         return None
 
-def create_validation_tables(conn):
-    """Create tables to store validation results"""
+def _copy_value(value):
+    """Format a single value for COPY text format"""
+    if value is None:
+        return '\\N'
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+def _flush_batch(cursor, table, columns, batch, method):
+    """Send one batch of staged rows to the database"""
+    if method == 'copy':
+        buffer = io.StringIO()
+        for row in batch:
+            buffer.write('\t'.join(_copy_value(value) for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer
+        )
+    else:
+        psycopg2.extras.execute_values(
+            cursor,
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s",
+            batch,
+            page_size=len(batch)
+        )
+
+def bulk_insert(cursor, table, columns, rows, batch_size=None, method=None):
+    """Stage rows in memory and flush them to a table in batches
+
+    rows may be any iterable (including a generator); it is consumed
+    batch_size rows at a time. The caller owns the transaction.
+    Returns the number of rows written.
+    """
+    batch_size = batch_size or RESULTS_BATCH_SIZE
+    method = method or RESULTS_WRITE_METHOD
+    if method not in ('copy', 'values'):
+        raise ValueError(f"Unknown results write method: {method}")
+    
+    rows = iter(rows)
+    total = 0
+    started = time.perf_counter()
+    
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        _flush_batch(cursor, table, columns, batch, method)
+        total += len(batch)
+    
+    elapsed = time.perf_counter() - started
+    if total:
+        rate = total / elapsed if elapsed > 0 else float(total)
+        print(f"Wrote {total} rows to {table} in {elapsed:.2f}s "
+              f"({rate:,.0f} rows/s, method={method}, batch_size={batch_size})")
+    return total
+
+def iter_queue_batches(row_queue, batch_size=None, flush_interval=None):
+    """Group rows from a queue into batches until a None sentinel arrives
+
+    A batch is emitted when it is full or when its first row has waited
+    flush_interval seconds, so slow producers still see their rows written.
+    """
+    batch_size = batch_size or RESULTS_BATCH_SIZE
+    flush_interval = RESULTS_FLUSH_INTERVAL if flush_interval is None else flush_interval
+    batch = []
+    deadline = None
+    
+    while True:
+        timeout = max(0.0, deadline - time.monotonic()) if batch else None
+        try:
+            row = row_queue.get(timeout=timeout)
+        except queue.Empty:
+            yield batch
+            batch = []
+            continue
+        if row is None:
+            break
+        if not batch:
+            deadline = time.monotonic() + flush_interval
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    
+    if batch:
+        yield batch
+
+def stream_insert(conn, table, columns, batches, method=None, before_commit=None):
+    """Write and commit each batch as it arrives, so rows are visible immediately
+
+    before_commit(cursor) runs after every batch, inside its transaction.
+    Returns the number of rows written.
+    """
+    method = method or RESULTS_WRITE_METHOD
     cursor = conn.cursor()
+    total = 0
+    started = time.perf_counter()
     
-    # Create dbt run results table
-    cursor.execute("""
+    for batch in batches:
+        _flush_batch(cursor, table, columns, batch, method)
+        if before_commit:
+            before_commit(cursor)
+        conn.commit()
+        total += len(batch)
+    
+    elapsed = time.perf_counter() - started
+    if total:
+        print(f"Streamed {total} rows to {table} in {elapsed:.2f}s (method={method})")
+    return total
+
+# Time-partitioned results tables: {table: partition timestamp column}
+PARTITIONED_RESULT_TABLES = {
+    'dbt_run_results': 'run_timestamp',
+    'soda_scan_results': 'scan_timestamp',
+    'soda_metric_values': 'scan_timestamp',
+}
+# Partition size ("day" or "month"), fixed when the tables are first created
+RESULTS_PARTITION_GRANULARITY = os.getenv('RESULTS_PARTITION_GRANULARITY', 'month').lower()
+# Partitions created ahead of the current one, so inserts never wait on DDL
+RESULTS_PARTITIONS_AHEAD = int(os.getenv('RESULTS_PARTITIONS_AHEAD', '2'))
+# Partitions entirely older than this are dropped; 0 keeps everything
+RESULTS_RETENTION_DAYS = int(os.getenv('RESULTS_RETENTION_DAYS', '0'))
+
+# Time buckets kept in validation_rollups, finest first
+RESULTS_ROLLUP_BUCKETS = [
+    bucket.strip() for bucket in os.getenv('RESULTS_ROLLUP_BUCKETS', 'hour,day,week').split(',')
+    if bucket.strip()
+]
+# Detail tables feeding validation_rollups:
+# type -> (table, run key, timestamp, status, condition for results re-reported from the cache)
+ROLLUP_SOURCES = {
+    'dbt': ('dbt_run_results', 'invocation_id', 'run_timestamp', 'status', 'false'),
+    'soda': ('soda_scan_results', 'scan_id', 'scan_timestamp', 'check_status',
+             "check_type = 'cached'"),
+}
+# Lower-cased dbt (success/pass/fail/error/warn/skipped) and Soda (PASSED/FAILED/ERROR) statuses
+PASSED_STATUSES = ['success', 'pass', 'passed']
+FAILED_STATUSES = ['fail', 'failed']
+ERROR_STATUSES = ['error', 'runtime error']
+
+PARTITION_SUFFIX = re.compile(r'_p(\d{8}|\d{6})$')
+
+RESULT_TABLE_DDL = {
+    'dbt_run_results': """
         CREATE TABLE IF NOT EXISTS dbt_run_results (
-            id SERIAL PRIMARY KEY,
+            id BIGSERIAL,
             run_id VARCHAR(255),
             model_name VARCHAR(255),
             status VARCHAR(50),
             execution_time FLOAT,
             rows_affected INTEGER,
-            run_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    # Create soda scan results table (enhanced structure)
-    cursor.execute("""
+            run_timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            invocation_id VARCHAR(255),
+            thread_id VARCHAR(100),
+            started_at TIMESTAMP,
+            completed_at TIMESTAMP,
+            timing JSONB,
+            PRIMARY KEY (id, run_timestamp)
+        ) PARTITION BY RANGE (run_timestamp)
+    """,
+    'soda_scan_results': """
         CREATE TABLE IF NOT EXISTS soda_scan_results (
-            id SERIAL PRIMARY KEY,
+            id BIGSERIAL,
             scan_id VARCHAR(255),
             scan_start_timestamp TIMESTAMP,
             scan_end_timestamp TIMESTAMP,
@@ -57,22 +220,355 @@ def create_validation_tables(conn):
             check_location_file VARCHAR(500),
             check_location_line INTEGER,
             check_location_col INTEGER,
-            scan_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            scan_timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, scan_timestamp)
+        ) PARTITION BY RANGE (scan_timestamp)
+    """,
+    'soda_metric_values': """
+        CREATE TABLE IF NOT EXISTS soda_metric_values (
+            id BIGSERIAL,
+            scan_id VARCHAR(255),
+            table_id SMALLINT NOT NULL REFERENCES soda_metric_tables (id),
+            column_id SMALLINT REFERENCES soda_metric_columns (id),
+            metric_id SMALLINT NOT NULL REFERENCES soda_metric_names (id),
+            value_numeric DOUBLE PRECISION,
+            value_text TEXT,
+            scan_timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, scan_timestamp)
+        ) PARTITION BY RANGE (scan_timestamp)
+    """,
+}
+
+# BRIN on the append-ordered timestamps, btree on the lookup IDs
+RESULT_TABLE_INDEXES = {
+    'dbt_run_results': [
+        ('run_timestamp', 'brin'), ('run_id', 'btree'), ('invocation_id', 'btree'),
+    ],
+    'soda_scan_results': [('scan_timestamp', 'brin'), ('scan_id', 'btree')],
+    'soda_metric_values': [('scan_timestamp', 'brin'), ('scan_id', 'btree')],
+}
+
+def _period_start(value, granularity=None):
+    """First day of the partition period containing value"""
+    granularity = granularity or RESULTS_PARTITION_GRANULARITY
+    day = value.date() if isinstance(value, datetime) else value
+    return day if granularity == 'day' else day.replace(day=1)
+
+def _next_period(start, granularity=None):
+    granularity = granularity or RESULTS_PARTITION_GRANULARITY
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _partition_name(table, start, granularity=None):
+    granularity = granularity or RESULTS_PARTITION_GRANULARITY
+    return f"{table}_p{start:%Y%m%d}" if granularity == 'day' else f"{table}_p{start:%Y%m}"
+
+def ensure_partitions(cursor, table, first, last, granularity=None):
+    """Create the range partitions of table covering first..last, plus a default partition"""
+    granularity = granularity or RESULTS_PARTITION_GRANULARITY
+    start = _period_start(first, granularity)
+    while start <= last:
+        end = _next_period(start, granularity)
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {_partition_name(table, start, granularity)} "
+            f"PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)",
+            (start, end)
         )
+        start = end
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}_pdefault PARTITION OF {table} DEFAULT")
+
+def _relkind(cursor, table):
+    cursor.execute(
+        "SELECT relkind FROM pg_class WHERE relname = %s AND pg_table_is_visible(oid)",
+        (table,)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def _columns(cursor, table):
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_name = %s AND table_schema = current_schema() ORDER BY ordinal_position",
+        (table,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+def _migrate_legacy_table(cursor, table, timestamp_column):
+    """Copy rows of an unpartitioned table into its partitioned replacement
+
+    The old heap table is kept as <table>_legacy until it is dropped by hand.
+    """
+    legacy = f"{table}_legacy"
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    cursor.execute(RESULT_TABLE_DDL[table])
+
+    cursor.execute(f"SELECT min({timestamp_column}), max({timestamp_column}) FROM {legacy}")
+    oldest, newest = cursor.fetchone()
+    if oldest is not None:
+        ensure_partitions(cursor, table, oldest, newest.date())
+
+    # ids are regenerated by the new table's sequence; the partition key is NOT NULL
+    legacy_columns = set(_columns(cursor, legacy))
+    columns = [
+        column for column in _columns(cursor, table)
+        if column != 'id' and column in legacy_columns
+    ]
+    values = [
+        f"coalesce({column}, CURRENT_TIMESTAMP)" if column == timestamp_column else column
+        for column in columns
+    ]
+    cursor.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"SELECT {', '.join(values)} FROM {legacy}"
+    )
+    print(f"Migrated {cursor.rowcount} rows from {legacy} into partitioned {table}")
+
+def partition_periods(cursor, table):
+    """Yield (partition name, period start) for the range partitions of table"""
+    cursor.execute("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s AND pg_table_is_visible(parent.oid)
+    """, (table,))
+    for (name,) in cursor.fetchall():
+        match = PARTITION_SUFFIX.search(name)
+        if match:
+            suffix = match.group(1)
+            yield name, datetime.strptime(suffix, '%Y%m%d' if len(suffix) == 8 else '%Y%m').date()
+
+def apply_retention(cursor, table, retention_days=None):
+    """Drop partitions whose whole range is older than the retention window"""
+    retention_days = RESULTS_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return []
+    cutoff = datetime.now().date() - timedelta(days=retention_days)
+    dropped = []
+    for name, start in sorted(partition_periods(cursor, table), key=lambda p: p[1]):
+        granularity = 'day' if len(PARTITION_SUFFIX.search(name).group(1)) == 8 else 'month'
+        if _next_period(start, granularity) <= cutoff:
+            cursor.execute(f"DROP TABLE IF EXISTS {name}")
+            dropped.append(name)
+    if dropped:
+        print(f"Retention: dropped {len(dropped)} partitions of {table} older than {cutoff}")
+    return dropped
+
+# Interned names referenced by soda_metric_values through SMALLINT ids
+METRIC_DIMENSIONS = ('soda_metric_names', 'soda_metric_tables', 'soda_metric_columns')
+
+# Writer-side cache of interned ids: {dimension table: {name: id}}
+_dimension_ids = {dimension: {} for dimension in METRIC_DIMENSIONS}
+
+# Legacy metric_value text that can be stored as value_numeric
+NUMERIC_TEXT = r'^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$'
+
+def reset_dimension_cache():
+    """Forget cached ids, e.g. after a rollback discarded newly interned names"""
+    for ids in _dimension_ids.values():
+        ids.clear()
+
+def intern_names(cursor, dimension, names):
+    """Return {name: id} for names in a metric dimension table, inserting new ones"""
+    cache = _dimension_ids[dimension]
+    missing = sorted({name for name in names if name is not None and name not in cache})
+    if missing:
+        cursor.execute(f"SELECT name, id FROM {dimension} WHERE name = ANY(%s)", (missing,))
+        cache.update(cursor.fetchall())
+        missing = [name for name in missing if name not in cache]
+    if missing:
+        # Only genuinely new names reach the INSERT, so the SMALLINT ids are
+        # not used up by conflicting inserts from every new writer process
+        cursor.execute(
+            f"INSERT INTO {dimension} (name) SELECT unnest(%s::text[]) ON CONFLICT (name) DO NOTHING",
+            (missing,)
+        )
+        cursor.execute(f"SELECT name, id FROM {dimension} WHERE name = ANY(%s)", (missing,))
+        cache.update(cursor.fetchall())
+    return cache
+
+def split_metric_value(value):
+    """(value_numeric, value_text) for a Soda metric value"""
+    if isinstance(value, bool) or value is None:
+        return None, (None if value is None else str(value).lower())
+    if isinstance(value, (int, float)):
+        return float(value), None
+    if isinstance(value, (list, dict)):
+        return None, json.dumps(value)
+    return None, str(value)
+
+def metric_value_rows(cursor, scan_id, metrics):
+    """soda_metric_values rows for (table, column, metric name, value) tuples"""
+    metrics = list(metrics)
+    tables = intern_names(cursor, 'soda_metric_tables', [m[0] for m in metrics])
+    columns = intern_names(cursor, 'soda_metric_columns', [m[1] for m in metrics])
+    names = intern_names(cursor, 'soda_metric_names', [m[2] for m in metrics])
+    for table_name, column_name, metric_name, value in metrics:
+        value_numeric, value_text = split_metric_value(value)
+        yield (
+            scan_id,
+            tables[table_name],
+            columns[column_name] if column_name is not None else None,
+            names[metric_name],
+            value_numeric,
+            value_text
+        )
+
+METRIC_VALUE_COLUMNS = (
+    'scan_id', 'table_id', 'column_id', 'metric_id', 'value_numeric', 'value_text'
+)
+
+def parse_metric_identity(identity, metric_name, tables):
+    """Return (table, column) for a Soda metric identity
+
+    Identities look like metric-<scan>-<data source>-<table>[-<column>]-<metric>,
+    and any of the names may contain '-', so the table is found by matching
+    the known table names (longest first) instead of splitting on '-'.
+    """
+    for table in sorted(tables, key=len, reverse=True):
+        marker = f"-{table}-"
+        position = identity.find(marker)
+        if position < 0:
+            if identity.endswith(f"-{table}"):
+                return table, None
+            continue
+        rest = identity[position + len(marker):]
+        suffix = rest.rfind(metric_name) if metric_name else -1
+        if suffix >= 0:
+            rest = rest[:suffix]
+        return table, rest.strip('-') or None
+
+    # Unknown table: fall back to the positional layout
+    parts = identity.split('-')
+    return (parts[2] if len(parts) > 2 else 'unknown'), (parts[3] if len(parts) > 3 else None)
+
+def _create_metric_dimensions(cursor):
+    for dimension in METRIC_DIMENSIONS:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {dimension} (
+                id SMALLINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                name VARCHAR(255) NOT NULL UNIQUE
+            )
+        """)
+
+def _migrate_text_metrics(cursor):
+    """Move rows of the old text soda_metrics table into soda_metric_values
+
+    The old table is kept as soda_metrics_v1 until it is dropped by hand;
+    soda_metrics is recreated as a view with the old columns.
+    """
+    cursor.execute("ALTER TABLE soda_metrics RENAME TO soda_metrics_v1")
+    cursor.execute("SELECT min(scan_timestamp), max(scan_timestamp) FROM soda_metrics_v1")
+    oldest, newest = cursor.fetchone()
+    if oldest is not None:
+        ensure_partitions(cursor, 'soda_metric_values', oldest, newest.date())
+
+    for dimension, column, fallback in (
+        ('soda_metric_names', 'metric_name', "''"),
+        ('soda_metric_tables', 'table_name', "'unknown'"),
+        ('soda_metric_columns', 'column_name', None),
+    ):
+        value = f"coalesce({column}, {fallback})" if fallback else column
+        cursor.execute(f"""
+            INSERT INTO {dimension} (name)
+            SELECT DISTINCT {value} FROM soda_metrics_v1
+            WHERE {value} IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM {dimension} d WHERE d.name = {value})
+        """)
+
+    cursor.execute(f"""
+        INSERT INTO soda_metric_values
+            (scan_id, table_id, column_id, metric_id, value_numeric, value_text, scan_timestamp)
+        SELECT legacy.scan_id, t.id, c.id, m.id,
+               CASE WHEN legacy.metric_value ~ %s THEN legacy.metric_value::double precision END,
+               CASE WHEN legacy.metric_value !~ %s AND legacy.metric_value NOT IN ('', 'None')
+                    THEN legacy.metric_value END,
+               coalesce(legacy.scan_timestamp, CURRENT_TIMESTAMP)
+        FROM soda_metrics_v1 legacy
+        JOIN soda_metric_names m ON m.name = coalesce(legacy.metric_name, '')
+        JOIN soda_metric_tables t ON t.name = coalesce(legacy.table_name, 'unknown')
+        LEFT JOIN soda_metric_columns c ON c.name = legacy.column_name
+    """, (NUMERIC_TEXT, NUMERIC_TEXT))
+    print(f"Migrated {cursor.rowcount} rows from soda_metrics_v1 into soda_metric_values")
+
+def create_validation_tables(conn):
+    """Create tables to store validation results
+
+    dbt_run_results, soda_scan_results and soda_metric_values are range
+    partitioned on their timestamp; unpartitioned tables from older
+    versions are migrated in place, and partitions outside the retention
+    window are dropped. soda_metrics is a view over soda_metric_values and
+    its dimension tables.
+    """
+    cursor = conn.cursor()
+    _create_metric_dimensions(cursor)
+    today = datetime.now().date()
+    horizon = today
+    for _ in range(RESULTS_PARTITIONS_AHEAD):
+        horizon = _next_period(_period_start(horizon))
+
+    for table, timestamp_column in PARTITIONED_RESULT_TABLES.items():
+        if _relkind(cursor, table) == 'r':
+            _migrate_legacy_table(cursor, table, timestamp_column)
+        else:
+            cursor.execute(RESULT_TABLE_DDL[table])
+        ensure_partitions(cursor, table, today, horizon)
+
+        for column, method in RESULT_TABLE_INDEXES[table]:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_{column}_{method} "
+                f"ON {table} USING {method} ({column})"
+            )
+        apply_retention(cursor, table)
+    
+    # Trend queries for one metric are answered from the index alone
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS soda_metric_values_series
+        ON soda_metric_values (table_id, column_id, metric_id, scan_timestamp)
+        INCLUDE (value_numeric)
+    """)
+    if _relkind(cursor, 'soda_metrics') in ('r', 'p'):
+        _migrate_text_metrics(cursor)
+    cursor.execute("""
+        CREATE OR REPLACE VIEW soda_metrics AS
+        SELECT v.id, v.scan_id, m.name AS metric_name,
+               coalesce(v.value_text, v.value_numeric::text) AS metric_value,
+               t.name AS table_name, c.name AS column_name, v.scan_timestamp,
+               v.value_numeric
+        FROM soda_metric_values v
+        JOIN soda_metric_names m ON m.id = v.metric_id
+        JOIN soda_metric_tables t ON t.id = v.table_id
+        LEFT JOIN soda_metric_columns c ON c.id = v.column_id
     """)
     
-    # Create soda metrics table
+    # Per-run check counts by time bucket, maintained by refresh_rollups
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS soda_metrics (
-            id SERIAL PRIMARY KEY,
-            scan_id VARCHAR(255),
-            metric_name VARCHAR(100),
-            metric_value TEXT,
-            table_name VARCHAR(255),
-            column_name VARCHAR(255),
-            scan_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        CREATE TABLE IF NOT EXISTS validation_rollups (
+            validation_type VARCHAR(50) NOT NULL,
+            run_key VARCHAR(255) NOT NULL,
+            bucket VARCHAR(10) NOT NULL,
+            bucket_start TIMESTAMP NOT NULL,
+            total_checks INTEGER NOT NULL,
+            passed_checks INTEGER NOT NULL,
+            failed_checks INTEGER NOT NULL,
+            error_checks INTEGER NOT NULL,
+            other_checks INTEGER NOT NULL,
+            cached_checks INTEGER NOT NULL DEFAULT 0,
+            first_seen_at TIMESTAMP,
+            last_seen_at TIMESTAMP,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (validation_type, run_key, bucket, bucket_start)
         )
     """)
+    cursor.execute("""
+        ALTER TABLE validation_rollups
+            ADD COLUMN IF NOT EXISTS cached_checks INTEGER NOT NULL DEFAULT 0
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS validation_rollups_bucket_start
+        ON validation_rollups (bucket, bucket_start)
+    """)
     
     # Create validation summary table
     cursor.execute("""
@@ -87,293 +583,540 @@ def create_validation_tables(conn):
         )
     """)
     
+    create_cache_table(cursor)
+    
     conn.commit()
     print("Enhanced validation tables created successfully")
 
-def save_dbt_results(conn):
-    """Save dbt run results to database"""
+def _rollup_statements(validation_type):
+    """Prepared-statement SQL ($1.. placeholders) refreshing one validation type's rollups"""
+    table, key_column, timestamp_column, status_column, cached = ROLLUP_SOURCES[validation_type]
+    upsert = f"""
+        INSERT INTO validation_rollups
+            (validation_type, run_key, bucket, bucket_start, total_checks, passed_checks,
+             failed_checks, error_checks, other_checks, cached_checks, first_seen_at,
+             last_seen_at, updated_at)
+        SELECT $1, detail.run_key, b.bucket, date_trunc(b.bucket, detail.ts),
+               count(*),
+               count(*) FILTER (WHERE detail.status = ANY($4)),
+               count(*) FILTER (WHERE detail.status = ANY($5)),
+               count(*) FILTER (WHERE detail.status = ANY($6)),
+               count(*) FILTER (WHERE NOT detail.status = ANY($4 || $5 || $6)),
+               count(*) FILTER (WHERE detail.cached),
+               min(detail.ts), max(detail.ts), CURRENT_TIMESTAMP
+        FROM (
+            SELECT {key_column} AS run_key, {timestamp_column} AS ts,
+                   coalesce(lower({status_column}), '') AS status,
+                   coalesce({cached}, false) AS cached
+            FROM {table}
+            WHERE {key_column} = ANY($2)
+        ) detail
+        CROSS JOIN unnest($3) AS b(bucket)
+        GROUP BY detail.run_key, b.bucket, date_trunc(b.bucket, detail.ts)
+        ON CONFLICT (validation_type, run_key, bucket, bucket_start) DO UPDATE SET
+            total_checks = EXCLUDED.total_checks,
+            passed_checks = EXCLUDED.passed_checks,
+            failed_checks = EXCLUDED.failed_checks,
+            error_checks = EXCLUDED.error_checks,
+            other_checks = EXCLUDED.other_checks,
+            cached_checks = EXCLUDED.cached_checks,
+            first_seen_at = EXCLUDED.first_seen_at,
+            last_seen_at = EXCLUDED.last_seen_at,
+            updated_at = EXCLUDED.updated_at
+    """
+    # CURRENT_TIMESTAMP is fixed per transaction, so this only hits stale buckets
+    delete = """
+        DELETE FROM validation_rollups
+        WHERE validation_type = $1 AND run_key = ANY($2) AND updated_at < CURRENT_TIMESTAMP
+    """
+    return upsert, delete
+
+def refresh_rollups(cursor, validation_type, run_keys, buckets=None):
+    """Upsert the validation_rollups rows of the given runs from their detail rows
+
+    Runs in the caller's transaction so the rollups commit together with
+    the detail rows. Only the rows of these run keys are aggregated (via
+    the run/scan id index); buckets a run no longer has rows in are removed.
+    Both statements are prepared once per session and sent in one round
+    trip, as this runs after every streamed batch.
+    """
+    run_keys = sorted({key for key in run_keys if key})
+    if not run_keys:
+        return
+    upsert, delete = _rollup_statements(validation_type)
+    upsert_name = f"refresh_rollups_{validation_type}"
+    delete_name = f"prune_rollups_{validation_type}"
+    results_store.prepare(cursor, upsert_name, ['text', 'text[]', 'text[]', 'text[]', 'text[]', 'text[]'], upsert)
+    results_store.prepare(cursor, delete_name, ['text', 'text[]'], delete)
+    cursor.execute(
+        f"EXECUTE {upsert_name} (%s, %s, %s, %s, %s, %s); EXECUTE {delete_name} (%s, %s)",
+        (validation_type, run_keys, list(buckets or RESULTS_ROLLUP_BUCKETS),
+         PASSED_STATUSES, FAILED_STATUSES, ERROR_STATUSES, validation_type, run_keys)
+    )
+
+def latest_run_summaries(cursor, bucket=None):
+    """Check counts of the most recent run of each validation type since yesterday
+
+    Reads the rollups only; returns (validation_type, run_key, total,
+    passed, failed, error, cached, last_seen_at) rows.
+    """
+    results_store.execute_prepared(cursor, 'latest_run_summaries', ['text'], """
+        SELECT DISTINCT ON (validation_type)
+               validation_type, run_key, total, passed, failed, error, cached, last_seen_at
+        FROM (
+            SELECT validation_type, run_key,
+                   sum(total_checks) AS total, sum(passed_checks) AS passed,
+                   sum(failed_checks) AS failed, sum(error_checks) AS error,
+                   sum(cached_checks) AS cached, max(last_seen_at) AS last_seen_at
+            FROM validation_rollups
+            WHERE bucket = $1
+              AND bucket_start >= date_trunc($1, (CURRENT_DATE - 1)::timestamp)
+            GROUP BY validation_type, run_key
+        ) runs
+        ORDER BY validation_type, last_seen_at DESC
+    """, (bucket or RESULTS_ROLLUP_BUCKETS[-1],))
+    return cursor.fetchall()
+
+def recent_run_summaries(cursor, seconds, bucket=None):
+    """Check counts of every run last seen in the past seconds, oldest run first
+
+    Reads the rollups only; returns (validation_type, run_key, total,
+    passed, failed, error, cached, last_seen_at) rows. The window is taken
+    on the database clock, which wrote last_seen_at.
+    """
+    results_store.execute_prepared(cursor, 'recent_run_summaries', ['text', 'double precision'], """
+        SELECT validation_type, run_key,
+               sum(total_checks), sum(passed_checks), sum(failed_checks),
+               sum(error_checks), sum(cached_checks), max(last_seen_at)
+        FROM validation_rollups
+        WHERE bucket = $1
+          AND bucket_start >= date_trunc($1, LOCALTIMESTAMP - make_interval(secs => $2))
+        GROUP BY validation_type, run_key
+        HAVING max(last_seen_at) >= LOCALTIMESTAMP - make_interval(secs => $2)
+        ORDER BY max(last_seen_at), validation_type
+    """, (bucket or RESULTS_ROLLUP_BUCKETS[0], seconds))
+    return cursor.fetchall()
+
+def _dbt_result_rows(node_results, invocations=None):
+    """Yield one dbt_run_results row per (metadata, result) pair
+
+    The invocation ids seen are added to the invocations set, if given.
+    """
+    for metadata, result in node_results:
+        if invocations is not None:
+            invocations.add(metadata.get('invocation_id'))
+        timing = result.get('timing') or []
+        started = [t['started_at'] for t in timing if t.get('started_at')]
+        completed = [t['completed_at'] for t in timing if t.get('completed_at')]
+        yield (
+            metadata.get('dbt_version', 'unknown'),
+            metadata.get('invocation_id'),
+            result.get('unique_id', 'unknown'),
+            result.get('status', 'unknown'),
+            result.get('execution_time', 0),
+            (result.get('adapter_response') or {}).get('rows_affected', 0),
+            result.get('thread_id'),
+            min(started) if started else None,
+            max(completed) if completed else None,
+            json.dumps(timing)
+        )
+
+def save_dbt_results(conn, node_results=None):
+    """Save dbt run results to database
+
+    node_results is an iterable of (metadata, result) pairs, e.g. from an
+    in-process dbt invocation; by default they are streamed from
+    target/run_results.json.
+    """
     cursor = conn.cursor()
     
-    # Get dbt run results from target/run_results.json
+    if node_results is None:
+        node_results = iter_run_results(
+            os.path.join(DBT_TARGET_DIR, 'run_results.json'),
+            streaming=streaming_enabled()
+        )
+    
+    # Feed node results straight into the writer
     try:
-        with open('/home/ubuntu/dbt_project_2/target/run_results.json', 'r') as f:
-            results = json.load(f)
-        
-        run_id = results.get('metadata', {}).get('dbt_version', 'unknown')
-        
-        for result in results.get('results', []):
-            cursor.execute("""
-                INSERT INTO dbt_run_results 
-                (run_id, model_name, status, execution_time, rows_affected)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (
-                run_id,
-                result.get('unique_id', 'unknown'),
-                result.get('status', 'unknown'),
-                result.get('execution_time', 0),
-                result.get('adapter_response', {}).get('rows_affected', 0)
-            ))
+        invocations = set()
+        saved = bulk_insert(
+            cursor, 'dbt_run_results',
+            ('run_id', 'invocation_id', 'model_name', 'status', 'execution_time',
+             'rows_affected', 'thread_id', 'started_at', 'completed_at', 'timing'),
+            _dbt_result_rows(node_results, invocations)
+        )
+        refresh_rollups(cursor, 'dbt', invocations)
         
         conn.commit()
-        print(f"Saved {len(results.get('results', []))} dbt run results")
+        print(f"Saved {saved} dbt run results")
         
     except FileNotFoundError:
         print("dbt run results file not found")
     except Exception as e:
+        conn.rollback()
         print(f"Error saving dbt results: {e}")
 
+# Map Soda outcomes to our status
+SODA_STATUS_MAPPING = {
+    'pass': 'PASSED',
+    'fail': 'FAILED',
+    'error': 'ERROR',
+    'warning': 'WARNING'
+}
+
+SODA_CHECK_COLUMNS = (
+    'scan_id', 'scan_start_timestamp', 'scan_end_timestamp', 'table_name',
+    'check_name', 'check_type', 'check_status', 'check_value', 'check_diagnostics',
+    'check_location_file', 'check_location_line', 'check_location_col'
+)
+
+def _soda_status(outcome):
+    return SODA_STATUS_MAPPING.get(outcome.lower(), outcome.upper())
+
+def _soda_outcomes(json_data):
+    """{table: [check outcome]} from Soda JSON results, in the validation cache format"""
+    outcomes = {}
+    for check in json_data.get('checks', []):
+        outcomes.setdefault(check.get('table', 'unknown'), []).append({
+            'name': check.get('name', 'unknown'),
+            'type': check.get('type', 'generic'),
+            'status': _soda_status(check.get('outcome', 'unknown')),
+            'value': str(check.get('diagnostics', {}).get('value', '')),
+        })
+    return outcomes
+
+def _cached_check_rows(scan_id, cached):
+    """soda_scan_results rows re-reporting cached outcomes with check_type 'cached'"""
+    for table_name, (outcomes, validated_at) in cached.items():
+        for outcome in outcomes:
+            print(f"Cached check: {table_name}.{outcome['name']} = {outcome['status']}")
+            yield (
+                scan_id, None, None, table_name, outcome['name'], 'cached',
+                outcome['status'], outcome['value'],
+                json.dumps({'cached': True, 'validated_at': validated_at.isoformat(),
+                            'check_type': outcome['type']}),
+                None, None, None
+            )
+
+def _save_soda_json(cursor, scan_id, json_data):
+    """Stage checks and metrics from Soda JSON scan results; returns (checks, metrics)"""
+    # Extract scan metadata
+    scan_start_timestamp = json_data.get('scanStartTimestamp')
+    scan_end_timestamp = json_data.get('scanEndTimestamp')
+    
+    # Save metrics in the compact layout; names are interned once per process
+    checks = json_data.get('checks', [])
+    tables = {check.get('table') for check in checks if check.get('table')}
+    metrics = []
+    for metric in json_data.get('metrics', []):
+        metric_name = metric.get('metricName', '')
+        table_name, column_name = parse_metric_identity(
+            metric.get('identity', ''), metric_name, tables
+        )
+        metrics.append((table_name, column_name, metric_name, metric.get('value')))
+    
+    metrics_saved = bulk_insert(
+        cursor, 'soda_metric_values', METRIC_VALUE_COLUMNS,
+        metric_value_rows(cursor, scan_id, metrics)
+    )
+    
+    # Save checks with full details
+    check_rows = []
+    
+    for check in checks:
+        table_name = check.get('table', 'unknown')
+        check_name = check.get('name', 'unknown')
+        check_type = check.get('type', 'generic')
+        check_status = check.get('outcome', 'unknown')
+        check_value = str(check.get('diagnostics', {}).get('value', ''))
+        
+        # Extract location information
+        location = check.get('location', {})
+        location_file = location.get('filePath', '')
+        location_line = location.get('line', 0)
+        location_col = location.get('col', 0)
+        
+        # Store diagnostics as JSONB
+        diagnostics = json.dumps(check.get('diagnostics', {}))
+        
+        mapped_status = _soda_status(check_status)
+        
+        check_rows.append((
+            scan_id,
+            scan_start_timestamp,
+            scan_end_timestamp,
+            table_name,
+            check_name,
+            check_type,
+            mapped_status,
+            check_value,
+            diagnostics,
+            location_file,
+            location_line,
+            location_col
+        ))
+        print(f"Staged check: {table_name}.{check_name} = {mapped_status}")
+    
+    checks_saved = bulk_insert(cursor, 'soda_scan_results', SODA_CHECK_COLUMNS, check_rows)
+    return checks_saved, metrics_saved
+
+def ingest_soda_json(conn, json_data, scan_id=None):
+    """Write Soda JSON scan results in one transaction; returns (checks, metrics)"""
+    scan_id = scan_id or f"soda_scan_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    cursor = conn.cursor()
+    try:
+        saved = _save_soda_json(cursor, scan_id, json_data)
+        refresh_rollups(cursor, 'soda', [scan_id])
+        conn.commit()
+        return saved
+    except Exception:
+        conn.rollback()
+        reset_dimension_cache()
+        raise
+
+def soda_cache_plan(cursor, soda_dir=SODA_PROJECT_DIR):
+    """Return ({table: fingerprint}, {table: (outcomes, validated_at)}) for the Soda-checked tables
+
+    A fingerprint combines the table's change fingerprint with the digest
+    of its checks block; tables with time-dependent checks get none.
+    Cached outcomes are those of unchanged tables, and none when the
+    validation is forced.
+    """
+    check_digests = {
+        table: digest for table, digest
+        in soda_check_tables(os.path.join(soda_dir, 'checks/checks.yml')).items()
+        if digest
+    }
+    fingerprints = {
+        table: f"{fingerprint}:{check_digests[table]}"
+        for table, fingerprint in relation_fingerprints(cursor, check_digests).items()
+    }
+    cached = {} if force_enabled() else cached_outcomes(cursor, 'soda', fingerprints)
+    return fingerprints, cached
+
 def save_soda_results(conn):
-    """Save Soda scan results to database using structured JSON parsing"""
+    """Save Soda scan results to database using structured JSON parsing
+
+    Check results are written as provisional 'console' rows while the scan
+    is still running; shards that produce JSON results then have those rows
+    replaced by the full check details and metrics. Tables whose data and
+    checks are unchanged since their last scan are not rescanned; their
+    cached outcomes are re-reported with check_type 'cached'.
+    """
     cursor = conn.cursor()
+    scan_id = f"soda_scan_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     
-    # Run soda scan with JSON output
+    # Run one soda scan per table in parallel, each with its own JSON results file
     try:
-        # Create temporary JSON file for scan results
-        json_file = '/tmp/soda_scan_results.json'
+        fingerprints, cached = soda_cache_plan(cursor)
+        if cached:
+            print(f"Validation cache: skipping unchanged tables {', '.join(sorted(cached))}")
         
-        result = subprocess.run([
-            'soda', 'scan', '-d', 'postgres', '-c', 'configuration.yml', 
-            'checks/checks.yml', '-srf', json_file
-        ], cwd='/home/ubuntu/dbt_project_2/soda_project', 
-           capture_output=True, text=True, check=False)
+        check_queue = queue.Queue()
+        scan = {}
         
-        scan_id = f"soda_scan_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        def on_check(table_name, check_name, status):
+            print(f"Streamed check: {table_name}.{check_name} = {status}")
+            check_queue.put((scan_id, table_name, check_name, 'console', status, ''))
         
-        # Parse JSON output from file
-        try:
-            # Read JSON from file
-            with open(json_file, 'r') as f:
-                json_data = json.load(f)
-                
-                print(f"Parsing structured JSON output from Soda scan...")
-                
-                # Extract scan metadata
-                scan_start_timestamp = json_data.get('scanStartTimestamp')
-                scan_end_timestamp = json_data.get('scanEndTimestamp')
-                
-                # Save metrics
-                metrics_saved = 0
-                metrics = json_data.get('metrics', [])
-                for metric in metrics:
-                    metric_name = metric.get('metricName', '')
-                    metric_value = str(metric.get('value', ''))
-                    
-                    # Extract table and column from identity
-                    identity = metric.get('identity', '')
-                    parts = identity.split('-')
-                    table_name = parts[2] if len(parts) > 2 else 'unknown'
-                    column_name = parts[3] if len(parts) > 3 else None
-                    
-                    cursor.execute("""
-                        INSERT INTO soda_metrics 
-                        (scan_id, metric_name, metric_value, table_name, column_name)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (
-                        scan_id,
-                        metric_name,
-                        metric_value,
-                        table_name,
-                        column_name
-                    ))
-                    metrics_saved += 1
-                
-                # Save checks with full details
-                checks_saved = 0
-                checks = json_data.get('checks', [])
-                
-                for check in checks:
-                    table_name = check.get('table', 'unknown')
-                    check_name = check.get('name', 'unknown')
-                    check_type = check.get('type', 'generic')
-                    check_status = check.get('outcome', 'unknown')
-                    check_value = str(check.get('diagnostics', {}).get('value', ''))
-                    
-                    # Extract location information
-                    location = check.get('location', {})
-                    location_file = location.get('filePath', '')
-                    location_line = location.get('line', 0)
-                    location_col = location.get('col', 0)
-                    
-                    # Store diagnostics as JSONB
-                    diagnostics = json.dumps(check.get('diagnostics', {}))
-                    
-                    # Map Soda outcomes to our status
-                    status_mapping = {
-                        'pass': 'PASSED',
-                        'fail': 'FAILED',
-                        'error': 'ERROR',
-                        'warning': 'WARNING'
-                    }
-                    
-                    mapped_status = status_mapping.get(check_status.lower(), check_status.upper())
-                    
-                    cursor.execute("""
-                        INSERT INTO soda_scan_results 
-                        (scan_id, scan_start_timestamp, scan_end_timestamp, table_name, 
-                         check_name, check_type, check_status, check_value, check_diagnostics,
-                         check_location_file, check_location_line, check_location_col)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        scan_id,
-                        scan_start_timestamp,
-                        scan_end_timestamp,
-                        table_name,
-                        check_name,
-                        check_type,
-                        mapped_status,
-                        check_value,
-                        diagnostics,
-                        location_file,
-                        location_line,
-                        location_col
-                    ))
-                    checks_saved += 1
-                    print(f"Saved check: {table_name}.{check_name} = {mapped_status}")
-                
-                conn.commit()
-                print(f"Saved {checks_saved} checks and {metrics_saved} metrics with scan_id: {scan_id}")
-                
-                # Clean up JSON file
-                import os
-                if os.path.exists(json_file):
-                    os.remove(json_file)
-                return
-                
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            print(f"JSON parsing failed: {e}")
-            print("Falling back to text parsing...")
+        def run_scan():
+            try:
+                scan['result'] = run_sharded_scan(SODA_PROJECT_DIR, on_check=on_check,
+                                                  skip=cached)
+            except Exception as e:
+                scan['error'] = e
+            finally:
+                check_queue.put(None)
         
-        # Fallback to text parsing if JSON fails
-        print("Using fallback text parsing method...")
-        output_lines = result.stdout.strip().split('\n')
-        
-        # Look for check results in the output
-        current_table = None
-        checks_saved = 0
+        scanner = threading.Thread(target=run_scan, daemon=True)
+        scanner.start()
+        streamed = stream_insert(
+            conn, 'soda_scan_results',
+            ('scan_id', 'table_name', 'check_name', 'check_type', 'check_status', 'check_value'),
+            iter_queue_batches(check_queue),
+            before_commit=lambda batch_cursor: refresh_rollups(batch_cursor, 'soda', [scan_id])
+        )
+        scanner.join()
+        if 'error' in scan:
+            raise scan['error']
+        json_data, unparsed_output = scan['result']
         
-        for line in output_lines:
-            # Remove timestamp prefix like "[01:11:46] " from the beginning
-            if line.startswith('[') and ']' in line:
-                # Find the closing bracket
-                end_bracket = line.find(']')
-                if end_bracket != -1:
-                    line = line[end_bracket + 1:].strip()
-            
-            # Skip empty lines and summary lines
-            if not line or 'Scan summary:' in line or 'checks PASSED:' in line or 'checks FAILED:' in line or 'Oops!' in line:
-                continue
-                
-            # Look for table names - pattern: "dim_customers in postgres"
-            if ' in postgres' in line:
-                # Extract table name before " in postgres"
-                table_part = line.split(' in postgres')[0].strip()
-                # Remove any leading spaces or dashes
-                table_part = table_part.lstrip('- ').strip()
-                if table_part:
-                    current_table = table_part
-                    print(f"Found table: {current_table}")
-                    continue
+        if json_data is not None:
+            print(f"Parsing structured JSON output from Soda scan...")
+            # Replace the provisional console rows of the shards with JSON results
+            tables = sorted({check.get('table', 'unknown') for check in json_data.get('checks', [])})
+            cursor.execute("""
+                DELETE FROM soda_scan_results
+                WHERE scan_id = %s AND check_type = 'console' AND table_name = ANY(%s)
+            """, (scan_id, tables))
+            checks_saved, metrics_saved = _save_soda_json(cursor, scan_id, json_data)
+            print(f"Saved {checks_saved} checks and {metrics_saved} metrics "
+                  f"from {len(json_data['shards'])} shards with scan_id: {scan_id}")
             
-            # Look for check results - pattern: "row_count > 0 [PASSED]"
-            if '[PASSED]' in line or '[FAILED]' in line or '[ERROR]' in line:
-                if current_table and '[' in line and ']' in line:
-                    check_part = line.split('[')[0].strip()
-                    status_part = line.split('[')[1].split(']')[0].strip()
-                    
-                    # Clean up check name - remove leading spaces/dashes
-                    check_name = check_part.lstrip('- ').strip()
-                    
-                    if check_name and status_part in ['PASSED', 'FAILED', 'ERROR']:
-                        cursor.execute("""
-                            INSERT INTO soda_scan_results 
-                            (scan_id, table_name, check_name, check_status, check_value)
-                            VALUES (%s, %s, %s, %s, %s)
-                        """, (
-                            scan_id,
-                            current_table,
-                            check_name,
-                            status_part,
-                            ''
-                        ))
-                        checks_saved += 1
-                        print(f"Saved check: {current_table}.{check_name} = {status_part}")
+            # Errors may be transient (connection, timeout), so only clean outcomes are cached
+            store_outcomes(cursor, 'soda', {
+                table_name: (fingerprints[table_name], outcomes)
+                for table_name, outcomes in _soda_outcomes(json_data).items()
+                if table_name in fingerprints and all(o['status'] != 'ERROR' for o in outcomes)
+            })
+        
+        if cached:
+            cached_saved = bulk_insert(
+                cursor, 'soda_scan_results', SODA_CHECK_COLUMNS, _cached_check_rows(scan_id, cached)
+            )
+            print(f"Re-reported {cached_saved} cached checks with scan_id: {scan_id}")
+        
+        # Shards without JSON keep their console rows
+        for shard, output in unparsed_output.items():
+            print(f"JSON results missing for shard {shard}, keeping console results")
+            if not streamed:
+                print(output)
         
+        refresh_rollups(cursor, 'soda', [scan_id])
         conn.commit()
-        print(f"Saved {checks_saved} Soda scan results with scan_id: {scan_id}")
         
     except Exception as e:
+        conn.rollback()
+        reset_dimension_cache()
         print(f"Error running soda scan: {e}")
         import traceback
         traceback.print_exc()
 
 def save_validation_summary(conn):
-    """Save validation summary to database"""
+    """Save the latest dbt and Soda run summaries from validation_rollups"""
     cursor = conn.cursor()
     
-    # Get dbt summary
-    cursor.execute("""
-        SELECT COUNT(*) as total, 
-               SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as passed,
-               SUM(CASE WHEN status = 'error' THEN 1 ELSE 0 END) as failed,
-               SUM(CASE WHEN status NOT IN ('success', 'error') THEN 1 ELSE 0 END) as other
-        FROM dbt_run_results 
-        WHERE run_timestamp >= CURRENT_DATE
-    """)
-    dbt_summary = cursor.fetchone()
-    
-    if dbt_summary:
-        cursor.execute("""
+    summaries = latest_run_summaries(cursor)
+    results_store.execute_prepared_batch(cursor, 'insert_validation_summary',
+        ['text', 'integer', 'integer', 'integer', 'integer'], """
             INSERT INTO validation_summary 
             (validation_type, total_checks, passed_checks, failed_checks, error_checks)
-            VALUES (%s, %s, %s, %s, %s)
-        """, ('dbt', dbt_summary[0], dbt_summary[1], dbt_summary[2], dbt_summary[3]))
-    
-    # Get Soda summary
-    cursor.execute("""
-        SELECT COUNT(*) as total,
-               SUM(CASE WHEN check_status = 'pass' THEN 1 ELSE 0 END) as passed,
-               SUM(CASE WHEN check_status = 'fail' THEN 1 ELSE 0 END) as failed,
-               SUM(CASE WHEN check_status = 'error' THEN 1 ELSE 0 END) as error
-        FROM soda_scan_results 
-        WHERE scan_timestamp >= CURRENT_DATE
-    """)
-    soda_summary = cursor.fetchone()
-    
-    if soda_summary:
-        cursor.execute("""
-            INSERT INTO validation_summary 
-            (validation_type, total_checks, passed_checks, failed_checks, error_checks)
-            VALUES (%s, %s, %s, %s, %s)
-        """, ('soda', soda_summary[0], soda_summary[1], soda_summary[2], soda_summary[3]))
+            VALUES ($1, $2, $3, $4, $5)
+        """, [(validation_type, total, passed, failed, error)
+              for validation_type, _, total, passed, failed, error, _, _ in summaries])
+    for validation_type, run_key, total, passed, failed, error, cached, _ in summaries:
+        print(f"{validation_type} {run_key}: {passed}/{total} passed, {failed} failed, "
+              f"{error} errors, {cached} cached")
     
     conn.commit()
     print("Validation summary saved successfully")
 
-def main():
-    """Main function to orchestrate validation result saving"""
-    print("Starting validation result saving process...")
-    
+def save_all(dbt_node_results=None):
+    """Create tables and save dbt, Soda and summary results; returns success"""
     # Connect to database
     conn = connect_to_db()
     if not conn:
         print("Failed to connect to database")
-        sys.exit(1)
+        return False
     
     try:
         # Create tables
         create_validation_tables(conn)
         
         # Save results
-        save_dbt_results(conn)
+        save_dbt_results(conn, dbt_node_results)
         save_soda_results(conn)
         save_validation_summary(conn)
         
         print("Validation results saved successfully!")
+        return True
         
     except Exception as e:
         print(f"Error in main process: {e}")
+        return False
     finally:
         conn.close()
 
+def _relation_size(cursor, relations):
+    """Total on-disk size of relations, including partitions, indexes and TOAST"""
+    cursor.execute("""
+        SELECT coalesce(sum(pg_total_relation_size(tree.relid)), 0)
+        FROM unnest(%s::regclass[]) AS r(relid)
+        CROSS JOIN LATERAL pg_partition_tree(r.relid) AS tree
+    """, (list(relations),))
+    return cursor.fetchone()[0]
+
+def _best_of(cursor, sql, params, repeats=5):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def compare_metric_layouts(conn):
+    """Compare size and trend-query latency of soda_metrics_v1 and soda_metric_values
+
+    Needs the migrated text table (soda_metrics_v1) to still exist.
+    """
+    cursor = conn.cursor()
+    if _relkind(cursor, 'soda_metrics_v1') is None:
+        print("soda_metrics_v1 not found; the comparison needs the migrated text table")
+        return False
+    
+    # Use the longest metric series as the trend query
+    cursor.execute("""
+        SELECT table_name, column_name, metric_name, count(*)
+        FROM soda_metrics_v1
+        GROUP BY table_name, column_name, metric_name
+        ORDER BY count(*) DESC
+        LIMIT 1
+    """)
+    series = cursor.fetchone()
+    if not series:
+        print("soda_metrics_v1 is empty")
+        return False
+    table_name, column_name, metric_name, points = series
+    
+    legacy_time = _best_of(cursor, """
+        SELECT scan_timestamp, metric_value::double precision
+        FROM soda_metrics_v1
+        WHERE table_name = %s AND column_name IS NOT DISTINCT FROM %s AND metric_name = %s
+          AND metric_value ~ %s
+        ORDER BY scan_timestamp
+    """, (table_name, column_name, metric_name, NUMERIC_TEXT))
+    compact_time = _best_of(cursor, """
+        SELECT v.scan_timestamp, v.value_numeric
+        FROM soda_metric_values v
+        WHERE v.table_id = (SELECT id FROM soda_metric_tables WHERE name = %s)
+          AND v.column_id IS NOT DISTINCT FROM (SELECT id FROM soda_metric_columns WHERE name = %s)
+          AND v.metric_id = (SELECT id FROM soda_metric_names WHERE name = %s)
+        ORDER BY v.scan_timestamp
+    """, (table_name, column_name, metric_name))
+    
+    legacy_size = _relation_size(cursor, ['soda_metrics_v1'])
+    compact_size = _relation_size(cursor, ['soda_metric_values'] + list(METRIC_DIMENSIONS))
+    
+    print(f"Metric storage: soda_metrics_v1 vs soda_metric_values "
+          f"({table_name}.{column_name or '-'}.{metric_name}, {points} points)")
+    print(f"   size:  {legacy_size / 1024 ** 2:.2f} MB -> {compact_size / 1024 ** 2:.2f} MB")
+    print(f"   trend: {legacy_time * 1000:.2f} ms -> {compact_time * 1000:.2f} ms")
+    return True
+
+def main():
+    """Main function to orchestrate validation result saving"""
+    parser = argparse.ArgumentParser(description="Save dbt and Soda validation results")
+    parser.add_argument('--compare-metric-layouts', action='store_true',
+                        help="Compare the migrated text metrics table with the compact layout")
+    args = parser.parse_args()
+    
+    if args.compare_metric_layouts:
+        conn = connect_to_db()
+        if not conn:
+            print("Failed to connect to database")
+            sys.exit(1)
+        try:
+            if not compare_metric_layouts(conn):
+                sys.exit(1)
+        finally:
+            conn.close()
+        return
+    
+    print("Starting validation result saving process...")
+    
+    if not save_all():
+        sys.exit(1)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Slim CI: build and test only the nodes that changed since production
+
+The production manifest.json is kept as a baseline (DBT_STATE_DIR). dbt
+selects `state:modified+` against it and defers unchanged refs to the
+production relations; this module computes the same node set from the two
+manifests so the pipeline can report how much work was skipped.
+
+Usage:
+    python slim_ci.py [--state prod-state] [--manifest target/manifest.json]
+"""
+import argparse
+import os
+
+from dbt_artifacts import iter_artifact, iter_manifest_nodes, streaming_enabled
+
+STATE_DIR = os.getenv('DBT_STATE_DIR', 'prod-state')
+BUILD_RESOURCE_TYPES = ('model', 'test', 'seed', 'snapshot')
+
+
+def has_baseline(state_dir=STATE_DIR):
+    """Whether a production manifest is available to compare against"""
+    return os.path.exists(os.path.join(state_dir, 'manifest.json'))
+
+
+def selection_args(state_dir=STATE_DIR):
+    """dbt arguments selecting modified nodes and their descendants"""
+    return ['--select', 'state:modified+', '--defer', '--state', state_dir]
+
+
+def _node_fingerprints(manifest_path):
+    """unique_id -> (checksum, config) for buildable nodes"""
+    fingerprints = {}
+    for unique_id, node in iter_manifest_nodes(manifest_path, streaming=streaming_enabled()):
+        if node.get('resource_type') in BUILD_RESOURCE_TYPES:
+            fingerprints[unique_id] = (
+                (node.get('checksum') or {}).get('checksum'),
+                node.get('config'),
+            )
+    return fingerprints
+
+
+def _child_map(manifest_path):
+    for key, value in iter_artifact(manifest_path, 'child_map', streaming=streaming_enabled()):
+        if key == 'child_map':
+            yield value
+
+
+def modified_nodes(state_dir=STATE_DIR, manifest_path='target/manifest.json'):
+    """Return (selected unique_ids, total buildable node count)
+
+    A node is modified when it is new or its checksum or config differ
+    from the baseline; everything downstream of a modified node is
+    selected as well.
+    """
+    baseline = _node_fingerprints(os.path.join(state_dir, 'manifest.json'))
+    current = _node_fingerprints(manifest_path)
+
+    selected = {
+        unique_id for unique_id, fingerprint in current.items()
+        if baseline.get(unique_id) != fingerprint
+    }
+
+    children = dict(_child_map(manifest_path))
+    queue = list(selected)
+    while queue:
+        for child in children.get(queue.pop(), []):
+            if child in current and child not in selected:
+                selected.add(child)
+                queue.append(child)
+
+    return selected, len(current)
+
+
+def selection_summary(selected, total, state_dir=STATE_DIR):
+    """One-line description of the slim CI selection"""
+    return (f"Slim CI: {len(selected)} of {total} nodes selected, "
+            f"{total - len(selected)} skipped (baseline: {state_dir})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the slim CI node selection")
+    parser.add_argument('--state', default=STATE_DIR, help="Directory with the baseline manifest.json")
+    parser.add_argument('--manifest', default='target/manifest.json', help="Current manifest.json")
+    args = parser.parse_args()
+
+    if not has_baseline(args.state):
+        print(f"No baseline manifest in {args.state}; every node would be built")
+        return
+
+    selected, total = modified_nodes(args.state, args.manifest)
+    for unique_id in sorted(selected):
+        print(unique_id)
+    print(selection_summary(selected, total, args.state))
+
+
+if __name__ == "__main__":
+    main()
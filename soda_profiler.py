@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Single-pass table profiler for the Soda checks in soda_project/checks/checks.yml
+
+Soda runs a separate query for most checks, so a large table is scanned
+once per metric. This profiler compiles every check for a table into one
+aggregate query, plus one grouped pass (GROUPING SETS) for all
+duplicate_count checks, evaluates the thresholds and writes the results
+into soda_scan_results / soda_metric_values like save_soda_results does.
+
+Usage:
+    python soda_profiler.py [--checks FILE] [--sample-percent N] [--dry-run] [--benchmark]
+"""
+import argparse
+import json
+import operator
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import yaml
+
+from save_validation_results import (
+    connect_to_db, create_validation_tables, bulk_insert, refresh_rollups,
+    metric_value_rows, reset_dimension_cache, METRIC_VALUE_COLUMNS
+)
+
+DEFAULT_CHECKS_FILE = 'soda_project/checks/checks.yml'
+
+CHECK_PATTERN = re.compile(
+    r'^(?P<metric>row_count|missing_count|duplicate_count|invalid_count|freshness)'
+    r'(?:\((?P<column>[^)]*)\))?'
+    r'\s*(?P<op><=|>=|!=|=|<|>)\s*(?P<threshold>\S+)$'
+)
+DURATION_PATTERN = re.compile(r'(\d+)\s*([dhms])')
+DURATION_SECONDS = {'d': 86400, 'h': 3600, 'm': 60, 's': 1}
+OPERATORS = {
+    '<': operator.lt, '<=': operator.le, '>': operator.gt,
+    '>=': operator.ge, '=': operator.eq, '!=': operator.ne,
+}
+# Metrics that are plain row counts and can be scaled up from a sample
+SCALABLE_METRICS = ('row_count', 'missing_count', 'invalid_count')
+
+
+class Check:
+    """One parsed check line from checks.yml"""
+
+    def __init__(self, table, text, metric, column, op, threshold, config, line):
+        self.table = table
+        self.text = text
+        self.metric = metric
+        self.column = column
+        self.op = op
+        self.threshold = threshold
+        self.config = config or {}
+        self.line = line
+
+    @property
+    def threshold_value(self):
+        if self.metric == 'freshness':
+            return parse_duration(self.threshold)
+        return float(self.threshold)
+
+
+def parse_duration(text):
+    """'1d', '2h30m' -> seconds"""
+    parts = DURATION_PATTERN.findall(text)
+    if not parts:
+        raise ValueError(f"Unsupported freshness threshold: {text}")
+    return sum(int(amount) * DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+def load_checks(path):
+    """Parse checks.yml into {table: [Check, ...]}
+
+    Each check keeps the line it starts on in checks.yml.
+    """
+    with open(path, 'r') as f:
+        text = f.read()
+    document = yaml.safe_load(text) or {}
+    # The composed node tree keeps the marks that the loaded values lose
+    root = yaml.compose(text, Loader=yaml.SafeLoader)
+    item_lines = {
+        key.value: [node.start_mark.line + 1 for node in value.value]
+        for key, value in (root.value if isinstance(root, yaml.MappingNode) else [])
+        if isinstance(value, yaml.SequenceNode)
+    }
+
+    checks = {}
+    for section, items in document.items():
+        if not section.startswith('checks for '):
+            continue
+        table = section[len('checks for '):].strip()
+        for line, item in zip(item_lines.get(section, []), items or []):
+            if isinstance(item, dict):
+                text, config = next(iter(item.items()))
+            else:
+                text, config = item, {}
+            match = CHECK_PATTERN.match(text.strip())
+            if not match:
+                print(f"⚠️ Unsupported check skipped: {table}: {text}")
+                continue
+            checks.setdefault(table, []).append(Check(
+                table, text.strip(), match.group('metric'),
+                (match.group('column') or '').strip() or None,
+                match.group('op'), match.group('threshold'), config, line
+            ))
+    return checks
+
+
+def _sql_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _table_source(table, sample_percent):
+    if sample_percent:
+        return f"{table} tablesample system ({float(sample_percent)})"
+    return table
+
+
+def compile_aggregate_query(table, checks, sample_percent=None):
+    """One aggregate scan computing every non-duplicate metric of a table
+
+    Returns (sql, [metric key for each select column]).
+    """
+    expressions = {}
+    for check in checks:
+        key = (check.metric, check.column)
+        if key in expressions or check.metric == 'duplicate_count':
+            continue
+        if check.metric == 'row_count':
+            expressions[key] = "count(*)"
+        elif check.metric == 'missing_count':
+            expressions[key] = f"count(*) filter (where {check.column} is null)"
+        elif check.metric == 'invalid_count':
+            valid_values = check.config.get('valid values') or []
+            values = ', '.join(_sql_literal(v) for v in valid_values)
+            expressions[key] = (
+                f"count(*) filter (where {check.column} is not null "
+                f"and {check.column}::text not in ({values}))"
+                if values else "0"
+            )
+        elif check.metric == 'freshness':
+            expressions[key] = (
+                f"extract(epoch from (now() at time zone 'utc') - max({check.column})::timestamp)"
+            )
+
+    if not expressions:
+        return None, []
+    keys = list(expressions)
+    columns = ',\n  '.join(expressions[key] for key in keys)
+    return f"select\n  {columns}\nfrom {_table_source(table, sample_percent)}", keys
+
+
+def compile_duplicate_query(table, checks, sample_percent=None):
+    """One grouped pass counting duplicated values for every duplicate_count column
+
+    Returns (sql, {grouping id: column}).
+    """
+    columns = []
+    for check in checks:
+        if check.metric == 'duplicate_count' and check.column not in columns:
+            columns.append(check.column)
+    if not columns:
+        return None, {}
+
+    # grouping(c1, ..., cn) has a 1 bit for every column not grouped in the set
+    n = len(columns)
+    grouping_ids = {
+        sum(1 << (n - 1 - j) for j in range(n) if j != i): column
+        for i, column in enumerate(columns)
+    }
+    grouping = f"grouping({', '.join(columns)})"
+    non_null = ' '.join(
+        f"when {gid} then {column} is not null" for gid, column in grouping_ids.items()
+    )
+    sets = ', '.join(f"({column})" for column in columns)
+    sql = (
+        f"select grouping_id, count(*) from (\n"
+        f"  select {grouping} as grouping_id\n"
+        f"  from {_table_source(table, sample_percent)}\n"
+        f"  group by grouping sets ({sets})\n"
+        f"  having count(*) > 1 and case {grouping} {non_null} end\n"
+        f") duplicates\n"
+        f"group by grouping_id"
+    )
+    return sql, grouping_ids
+
+
+def profile_table(cursor, table, checks, sample_percent=None):
+    """Run the combined queries for one table; returns {(metric, column): value}"""
+    metrics = {}
+    scale = 100.0 / float(sample_percent) if sample_percent else 1.0
+
+    sql, keys = compile_aggregate_query(table, checks, sample_percent)
+    if sql:
+        cursor.execute(sql)
+        row = cursor.fetchone()
+        for key, value in zip(keys, row):
+            if value is not None and key[0] in SCALABLE_METRICS:
+                value = round(float(value) * scale)
+            metrics[key] = float(value) if value is not None else None
+
+    sql, grouping_ids = compile_duplicate_query(table, checks, sample_percent)
+    if sql:
+        for column in grouping_ids.values():
+            metrics[('duplicate_count', column)] = 0.0
+        cursor.execute(sql)
+        for grouping_id, count in cursor.fetchall():
+            metrics[('duplicate_count', grouping_ids[grouping_id])] = float(count)
+
+    return metrics
+
+
+def evaluate(check, value):
+    """Return PASSED / FAILED / ERROR for a check given its metric value"""
+    if value is None:
+        return 'ERROR'
+    return 'PASSED' if OPERATORS[check.op](value, check.threshold_value) else 'FAILED'
+
+
+def run_profile(checks_file=DEFAULT_CHECKS_FILE, sample_percent=None, dry_run=False):
+    """Profile every table in the checks file and persist the results"""
+    checks = load_checks(checks_file)
+
+    if dry_run:
+        for table, table_checks in checks.items():
+            for sql in (compile_aggregate_query(table, table_checks, sample_percent)[0],
+                        compile_duplicate_query(table, table_checks, sample_percent)[0]):
+                if sql:
+                    print(f"-- {table}\n{sql};\n")
+        return True
+
+    conn = connect_to_db()
+    if not conn:
+        print("Failed to connect to database")
+        return False
+
+    try:
+        create_validation_tables(conn)
+        cursor = conn.cursor()
+        scan_id = f"profile_scan_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        scan_start = datetime.now()
+
+        check_rows, metric_rows = [], []
+        for table, table_checks in checks.items():
+            started = time.perf_counter()
+            metrics = profile_table(cursor, table, table_checks, sample_percent)
+            print(f"Profiled {table}: {len(table_checks)} checks in {time.perf_counter() - started:.2f}s")
+
+            for (metric, column), value in metrics.items():
+                metric_rows.append((table, column, metric, value))
+
+            for check in table_checks:
+                value = metrics.get((check.metric, check.column))
+                status = evaluate(check, value)
+                diagnostics = {'value': value, 'threshold': check.threshold, 'op': check.op}
+                if sample_percent:
+                    diagnostics['sample_percent'] = float(sample_percent)
+                check_rows.append((
+                    scan_id, scan_start, None, table, check.text, check.metric,
+                    status, str(value), json.dumps(diagnostics),
+                    checks_file, check.line, 0
+                ))
+                print(f"   {table}.{check.text} = {status} (value={value})")
+
+        scan_end = datetime.now()
+        check_rows = [row[:2] + (scan_end,) + row[3:] for row in check_rows]
+
+        bulk_insert(
+            cursor, 'soda_metric_values', METRIC_VALUE_COLUMNS,
+            metric_value_rows(cursor, scan_id, metric_rows)
+        )
+        bulk_insert(
+            cursor, 'soda_scan_results',
+            ('scan_id', 'scan_start_timestamp', 'scan_end_timestamp', 'table_name',
+             'check_name', 'check_type', 'check_status', 'check_value', 'check_diagnostics',
+             'check_location_file', 'check_location_line', 'check_location_col'),
+            check_rows
+        )
+        refresh_rollups(cursor, 'soda', [scan_id])
+        conn.commit()
+        print(f"Saved {len(check_rows)} checks and {len(metric_rows)} metrics with scan_id: {scan_id}")
+        return all(row[6] == 'PASSED' for row in check_rows)
+    except Exception as e:
+        conn.rollback()
+        reset_dimension_cache()
+        print(f"Error profiling tables: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def benchmark(checks_file=DEFAULT_CHECKS_FILE, sample_percent=None):
+    """Compare the profiler against `soda scan` on the same checks"""
+    print("⏱️ Benchmark: soda scan vs single-pass profiler")
+
+    started = time.perf_counter()
+    subprocess.run(
+        ['soda', 'scan', '-d', 'postgres', '-c', 'configuration.yml', 'checks/checks.yml'],
+        cwd='soda_project', capture_output=True, check=False
+    )
+    soda_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    run_profile(checks_file, sample_percent)
+    profile_time = time.perf_counter() - started
+
+    print(f"   soda scan: {soda_time:.2f}s")
+    print(f"   profiler:  {profile_time:.2f}s"
+          + (f" ({sample_percent}% sample)" if sample_percent else ""))
+    if profile_time > 0:
+        print(f"   speedup:   x{soda_time / profile_time:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile tables for the Soda checks in one pass")
+    parser.add_argument('--checks', default=DEFAULT_CHECKS_FILE, help="Soda checks file")
+    parser.add_argument('--sample-percent', type=float,
+                        help="Profile a TABLESAMPLE SYSTEM sample; counts are scaled up")
+    parser.add_argument('--dry-run', action='store_true', help="Print the compiled SQL only")
+    parser.add_argument('--benchmark', action='store_true', help="Compare against `soda scan`")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.checks, args.sample_percent)
+        return
+
+    if not run_profile(args.checks, args.sample_percent, args.dry_run):
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
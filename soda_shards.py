@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Run a Soda scan as parallel per-table shards and merge the results
+
+checks.yml is split by `checks for <table>` block; each shard is scanned
+by its own `soda scan` process with its own results file in a private
+temporary directory, so the scan takes as long as the slowest table and
+concurrent pipelines on one host do not overwrite each other's results.
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+SODA_SCAN_PARALLELISM = int(os.getenv('SODA_SCAN_PARALLELISM', '0')) or None
+# Console lines kept per shard for error reporting; the rest is discarded
+SODA_OUTPUT_TAIL_LINES = int(os.getenv('SODA_OUTPUT_TAIL_LINES', '200'))
+
+# Soda console output tokens, e.g.
+#   [01:11:46] dim_customers in postgres
+#   [01:11:46]   row_count > 0 [PASSED]
+TIMESTAMP_PREFIX = re.compile(r'^\[[^\]]*\]\s*')
+SUMMARY_LINE = re.compile(r'Scan summary:|checks PASSED:|checks FAILED:|Oops!')
+TABLE_LINE = re.compile(r'^[-\s]*(?P<table>\S.*?)\s+in postgres\b')
+CHECK_LINE = re.compile(r'^[-\s]*(?P<check>[^\[]*?)\s*\[(?P<status>PASSED|FAILED|ERROR)\]')
+
+
+class ConsoleCheckParser:
+    """Incremental tokenizer for Soda console output, one line at a time"""
+
+    def __init__(self):
+        self.current_table = None
+
+    def feed(self, line):
+        """Return (table, check name, status) if the line reports a check result"""
+        line = TIMESTAMP_PREFIX.sub('', line.strip(), count=1).strip()
+        if not line or SUMMARY_LINE.search(line):
+            return None
+
+        match = TABLE_LINE.match(line)
+        if match:
+            self.current_table = match.group('table')
+            return None
+
+        match = CHECK_LINE.match(line)
+        if match and self.current_table and match.group('check'):
+            return self.current_table, match.group('check'), match.group('status')
+        return None
+
+
+def _shard_name(section):
+    name = section[len('checks for '):] if section.startswith('checks for ') else section
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', name.strip()) or 'shard'
+
+
+def split_checks(checks_path, out_dir):
+    """Write one checks file per `checks for <table>` block
+
+    Top-level sections that are not table blocks are kept together in a
+    separate shard. Returns {shard name: checks file path}.
+    """
+    with open(checks_path, 'r') as f:
+        document = yaml.safe_load(f) or {}
+
+    shards = {}
+    shared = {}
+    for section, body in document.items():
+        if section.startswith('checks for '):
+            shards.setdefault(_shard_name(section), {})[section] = body
+        else:
+            shared[section] = body
+    if shared:
+        shards['_shared'] = shared
+
+    paths = {}
+    for name, content in shards.items():
+        path = os.path.join(out_dir, f"{name}.yml")
+        with open(path, 'w') as f:
+            yaml.safe_dump(content, f, sort_keys=False)
+        paths[name] = path
+    return paths
+
+
+def _scan_shard(name, checks_file, results_file, soda_dir, on_check=None):
+    """Scan one shard; returns (name, returncode, output tail, parsed results or None)
+
+    Console output is consumed line by line while the scan runs; check
+    results are passed to on_check(table, check name, status) as soon as
+    Soda prints them, and only the last lines are kept in memory.
+    """
+    parser = ConsoleCheckParser()
+    tail = deque(maxlen=SODA_OUTPUT_TAIL_LINES)
+    process = subprocess.Popen([
+        'soda', 'scan', '-d', 'postgres', '-c', 'configuration.yml',
+        checks_file, '-srf', results_file
+    ], cwd=soda_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+
+    with process.stdout:
+        for line in process.stdout:
+            tail.append(line)
+            check = parser.feed(line)
+            if check and on_check:
+                on_check(*check)
+    returncode = process.wait()
+
+    try:
+        with open(results_file, 'r') as f:
+            scan_results = json.load(f)
+    except (json.JSONDecodeError, FileNotFoundError):
+        scan_results = None
+    return name, returncode, ''.join(tail), scan_results
+
+
+def merge_scan_results(shard_results):
+    """Merge per-shard Soda JSON results into one scan document"""
+    merged = {'checks': [], 'metrics': [], 'shards': []}
+    starts, ends = [], []
+    for name, scan_results in shard_results:
+        merged['shards'].append(name)
+        merged['checks'].extend(scan_results.get('checks', []))
+        merged['metrics'].extend(scan_results.get('metrics', []))
+        if scan_results.get('scanStartTimestamp'):
+            starts.append(scan_results['scanStartTimestamp'])
+        if scan_results.get('scanEndTimestamp'):
+            ends.append(scan_results['scanEndTimestamp'])
+    # ISO-8601 timestamps from one scanner compare correctly as strings
+    merged['scanStartTimestamp'] = min(starts) if starts else None
+    merged['scanEndTimestamp'] = max(ends) if ends else None
+    return merged
+
+
+def run_sharded_scan(soda_dir, checks_file='checks/checks.yml', max_workers=None, on_check=None,
+                     skip=()):
+    """Scan every shard in parallel
+
+    on_check is called from the worker threads for every check result
+    printed on the console; the shards of the tables in skip are not
+    scanned. Returns (merged JSON results or None, {shard: output tail}
+    for shards that produced no JSON results).
+    """
+    work_dir = tempfile.mkdtemp(prefix='soda_scan_')
+    try:
+        shards = split_checks(os.path.join(soda_dir, checks_file), work_dir)
+        skipped = {_shard_name(f"checks for {table}") for table in skip}
+        shards = {name: path for name, path in shards.items() if name not in skipped}
+        if not shards:
+            return None, {}
+        workers = max_workers or SODA_SCAN_PARALLELISM or len(shards)
+        print(f"Scanning {len(shards)} Soda shards with {workers} workers...")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    _scan_shard, name, path,
+                    os.path.join(work_dir, f"{name}.json"), soda_dir, on_check
+                )
+                for name, path in shards.items()
+            ]
+            outcomes = [future.result() for future in futures]
+
+        parsed, unparsed = [], {}
+        for name, returncode, output, scan_results in outcomes:
+            print(f"   shard {name}: exit code {returncode}")
+            if scan_results is not None:
+                parsed.append((name, scan_results))
+            else:
+                unparsed[name] = output
+
+        return (merge_scan_results(parsed) if parsed else None), unparsed
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
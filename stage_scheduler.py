@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Small dependency-aware stage scheduler for the test pipeline
+
+Stages declare which other stages they require (skipped if a requirement
+did not succeed) and which they only need to run after (ordering only).
+Ready stages are executed on a thread pool, since every stage is either a
+subprocess or a database round trip.
+
+Each stage also records the CPU time of its thread and of the child
+processes it waited for (see record_child_usage) and their peak RSS.
+"""
+import os
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_PARALLELISM = int(os.getenv('PIPELINE_PARALLELISM', '3'))
+
+# Per-thread resource usage is Linux only; elsewhere only child usage is counted
+RUSAGE_THREAD = getattr(resource, 'RUSAGE_THREAD', None)
+
+# Metrics of the stage running in the current worker thread
+_stage_context = threading.local()
+
+
+def record_child_usage(usage):
+    """Add the rusage of a finished child process (e.g. from os.wait4) to the running stage"""
+    metrics = getattr(_stage_context, 'metrics', None)
+    if metrics is None:
+        return
+    metrics['user_cpu'] = metrics.get('user_cpu', 0.0) + usage.ru_utime
+    metrics['system_cpu'] = metrics.get('system_cpu', 0.0) + usage.ru_stime
+    metrics['max_rss_kb'] = max(metrics.get('max_rss_kb', 0), usage.ru_maxrss)
+    metrics['child_processes'] = metrics.get('child_processes', 0) + 1
+
+
+class Stage:
+    """A named pipeline step
+
+    action is called with the results of the stages finished so far and
+    must return a (success, output) tuple, like test_all.run_command.
+    """
+
+    def __init__(self, name, action, requires=(), after=(), report_output=False):
+        self.name = name
+        self.action = action
+        self.requires = tuple(requires)
+        self.after = tuple(after)
+        # Print the stage output under the timing report (for short summaries)
+        self.report_output = report_output
+
+    @property
+    def dependencies(self):
+        return self.requires + self.after
+
+
+class StageResult:
+    """Outcome and timing of one stage"""
+
+    def __init__(self, name, status, output='', started=None, finished=None, reason=None,
+                 report_output=False, metrics=None):
+        self.name = name
+        self.status = status  # 'success', 'failed' or 'skipped'
+        self.output = output
+        self.started = started
+        self.finished = finished
+        self.reason = reason
+        self.report_output = report_output
+        # user_cpu / system_cpu seconds, max_rss_kb, child_processes
+        self.metrics = metrics or {}
+
+    @property
+    def success(self):
+        return self.status == 'success'
+
+    @property
+    def duration(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+
+def _check_graph(stages):
+    """Reject unknown dependencies and cycles before anything runs"""
+    by_name = {stage.name: stage for stage in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("Stage names must be unique")
+    for stage in stages:
+        for dep in stage.dependencies:
+            if dep not in by_name:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+
+    visiting, done = set(), set()
+
+    def visit(name, path):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Stage dependency cycle: {' -> '.join(path + [name])}")
+        visiting.add(name)
+        for dep in by_name[name].dependencies:
+            visit(dep, path + [name])
+        visiting.discard(name)
+        done.add(name)
+
+    for stage in stages:
+        visit(stage.name, [])
+
+
+def _thread_usage():
+    return resource.getrusage(RUSAGE_THREAD) if RUSAGE_THREAD is not None else None
+
+
+def _run_stage(stage, results):
+    _stage_context.metrics = metrics = {}
+    thread_before = _thread_usage()
+    started = time.perf_counter()
+    try:
+        success, output = stage.action(results)
+        status = 'success' if success else 'failed'
+    except Exception as e:
+        status, output = 'failed', str(e)
+    finished = time.perf_counter()
+    _stage_context.metrics = None
+
+    # Work done in this thread itself: in-process dbt, database writes
+    thread_after = _thread_usage()
+    if thread_before is not None:
+        metrics['user_cpu'] = metrics.get('user_cpu', 0.0) + thread_after.ru_utime - thread_before.ru_utime
+        metrics['system_cpu'] = (metrics.get('system_cpu', 0.0)
+                                 + thread_after.ru_stime - thread_before.ru_stime)
+    if not metrics.get('child_processes'):
+        # No child process: the peak RSS of this process is the best bound
+        metrics['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return StageResult(stage.name, status, output, started, finished,
+                       report_output=stage.report_output, metrics=metrics)
+
+
+def run_stages(stages, max_workers=None, fail_fast=False):
+    """Run stages respecting their dependencies, at most max_workers at a time
+
+    A failed stage immediately marks every stage that (transitively)
+    requires it as skipped. With fail_fast, no new stage is started after
+    the first failure. Returns a dict of stage name -> StageResult in
+    completion order.
+    """
+    _check_graph(stages)
+    max_workers = max(1, max_workers or DEFAULT_PARALLELISM)
+
+    results = {}
+    pending = list(stages)
+    running = {}
+    failed = False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            progressed = True
+            while progressed:
+                progressed = False
+                for stage in list(pending):
+                    if fail_fast and failed:
+                        now = time.perf_counter()
+                        results[stage.name] = StageResult(
+                            stage.name, 'skipped', started=now, finished=now,
+                            reason='pipeline failed'
+                        )
+                        pending.remove(stage)
+                        progressed = True
+                        continue
+                    if not all(dep in results for dep in stage.dependencies):
+                        continue
+                    broken = [dep for dep in stage.requires if not results[dep].success]
+                    if broken:
+                        now = time.perf_counter()
+                        results[stage.name] = StageResult(
+                            stage.name, 'skipped', started=now, finished=now,
+                            reason=f"requires {', '.join(broken)}"
+                        )
+                        print(f"⏭️ {stage.name} - SKIPPED ({', '.join(broken)} did not succeed)")
+                        pending.remove(stage)
+                        progressed = True
+                    elif len(running) < max_workers:
+                        running[executor.submit(_run_stage, stage, dict(results))] = stage
+                        pending.remove(stage)
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                running.pop(future)
+                result = future.result()
+                results[result.name] = result
+                if not result.success:
+                    failed = True
+
+    return results
+
+
+def print_stage_report(results, wall_time):
+    """Print per-stage timings and the overall parallel speedup"""
+    print("\n⏱️ STAGE TIMINGS")
+    print("=" * 50)
+
+    started = [r.started for r in results.values() if r.started is not None]
+    origin = min(started) if started else 0.0
+
+    for result in sorted(results.values(), key=lambda r: (r.started or 0.0)):
+        offset = (result.started or origin) - origin
+        label = result.status.upper()
+        if result.reason:
+            label += f" ({result.reason})"
+        print(f"   {result.name:<28} +{offset:7.2f}s  {result.duration:8.2f}s  {label}")
+
+    for result in results.values():
+        if result.report_output and result.output:
+            print(f"   {result.name}: {result.output}")
+
+    serial_time = sum(r.duration for r in results.values())
+    speedup = serial_time / wall_time if wall_time > 0 else 1.0
+    print(f"   Wall clock: {wall_time:.2f}s, sum of stages: {serial_time:.2f}s "
+          f"(x{speedup:.2f} from parallelism)")
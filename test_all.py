@@ -1,232 +1,484 @@
 #!/usr/bin/env python3
 """
 Simple command to test everything - dbt + soda + validation + email
-Usage: python test_all.py
+Usage: python test_all.py [--jobs N] [--fail-fast] [--dbt-mode subprocess|inprocess]
+                          [--slim-ci [--state DIR]] [--force-validation]
+                          [--data-diff-baseline SCHEMA]
 """
+import argparse
 import subprocess
 import sys
 import os
-import json
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import time
+from collections import deque
 from datetime import datetime
-import psycopg2
+
+from stage_scheduler import (
+    Stage, run_stages, print_stage_report, record_child_usage, DEFAULT_PARALLELISM
+)
+import slim_ci
+
+# Soda project (configuration.yml, checks/checks.yml), relative to the working directory
+SODA_PROJECT_DIR = os.getenv('SODA_PROJECT_DIR', 'soda_project')
+# Lines of command output kept for error reporting and the notification
+RUN_COMMAND_TAIL_LINES = int(os.getenv('RUN_COMMAND_TAIL_LINES', '500'))
 
 def setup_environment():
     """Setup environment variables"""
-    os.environ['DB_HOST'] = '172.17.0.3'
-    os.environ['DB_USER'] = 'admin'
-    os.environ['DB_PASSWORD'] = 'admin'
-    os.environ['DB_NAME'] = 'test_db'
-    os.environ['DB_SCHEMA'] = 'public'
-    os.environ['DB_PORT'] = '5432'
+    os.environ.setdefault('DB_HOST', '172.17.0.3')
+    os.environ.setdefault('DB_USER', 'admin')
+    os.environ.setdefault('DB_PASSWORD', 'admin')
+    os.environ.setdefault('DB_NAME', 'test_db')
+    os.environ.setdefault('DB_SCHEMA', 'public')
+    os.environ.setdefault('DB_PORT', '5432')
 
 def run_command(cmd, description):
-    """Run command and return result"""
+    """Run command and return result
+
+    Output (stdout and stderr combined) is read line by line while the
+    command runs and only the last RUN_COMMAND_TAIL_LINES lines are kept,
+    so long-running commands do not buffer their whole log in memory. The
+    child's rusage is added to the metrics of the running stage.
+    """
     print(f"\n🔄 {description}...")
     try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, check=False)
-        if result.returncode == 0:
+        process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, text=True, bufsize=1)
+        tail = deque(maxlen=RUN_COMMAND_TAIL_LINES)
+        with process.stdout:
+            for line in process.stdout:
+                tail.append(line)
+        # Reap the child ourselves to get its CPU time and peak RSS
+        _, wait_status, usage = os.wait4(process.pid, 0)
+        returncode = process.returncode = os.waitstatus_to_exitcode(wait_status)
+        record_child_usage(usage)
+        output = ''.join(tail)
+        
+        if returncode == 0:
             print(f"✅ {description} - SUCCESS")
-            return True, result.stdout
+            return True, output
         else:
             # For soda scan, exit code 2 means some checks failed but scan completed
-            if "soda" in cmd.lower() and result.returncode == 2:
+            if "soda" in cmd.lower() and returncode == 2:
                 print(f"⚠️ {description} - COMPLETED (some checks failed)")
-                return True, result.stdout + result.stderr
+                return True, output
             else:
                 print(f"❌ {description} - FAILED")
-                print(f"Error: {result.stderr}")
-                return False, result.stderr
+                print(f"Error: {output}")
+                return False, output
     except Exception as e:
         print(f"❌ {description} - ERROR: {e}")
         return False, str(e)
 
-def test_dbt():
-    """Test dbt pipeline"""
-    print("\n📊 TESTING DBT PIPELINE")
-    print("=" * 50)
-    
-    results = []
-    
-    # dbt debug
-    success, output = run_command("dbt debug", "dbt Debug")
-    results.append(("dbt Debug", success))
+# dbt commands run by the pipeline: (stage name, dbt arguments, requires)
+DBT_COMMANDS = [
+    ("dbt Debug", ["debug"], []),
+    ("dbt Compile", ["compile"], ["dbt Debug"]),
+    ("dbt Source Tests", ["test", "--select", "source:*", "--target-path", "target/source_tests"],
+     ["dbt Compile"]),
+    ("dbt Run", ["run"], ["dbt Compile"]),
+    ("dbt Model Tests", ["test", "--exclude", "source:*", "--target-path", "target/model_tests"],
+     ["dbt Run"]),
+]
+
+# Stages narrowed to modified nodes (and their descendants) in slim CI mode
+SLIM_CI_STAGES = ("dbt Run", "dbt Model Tests")
+
+# dbt test stages answered from the validation cache: stage name -> tests on sources
+CACHED_TEST_STAGES = {"dbt Source Tests": True, "dbt Model Tests": False}
+
+def _target_path(args):
+    """Directory a dbt command writes its artifacts to"""
+    return args[args.index('--target-path') + 1] if '--target-path' in args else 'target'
+
+def _with_excludes(args, selectors):
+    """Add selectors to the --exclude of a dbt command"""
+    if not selectors:
+        return args
+    if '--exclude' in args:
+        position = args.index('--exclude') + 2
+        return args[:position] + selectors + args[position:]
+    return args + ['--exclude'] + selectors
+
+def cached_dbt_tests(name, args, run):
+    """Run a dbt test stage, skipping the tests of relations unchanged since they last ran
+
+    run(args) runs dbt and returns (success, output). Cached failures still
+    fail the stage. Without a database connection or a readable manifest
+    every test runs.
+    """
+    import save_validation_results
+    import validation_cache
     
-    # dbt compile
-    success, output = run_command("dbt compile", "dbt Compile")
-    results.append(("dbt Compile", success))
+    conn = save_validation_results.connect_to_db()
+    if not conn:
+        return run(args)
+    try:
+        cursor = conn.cursor()
+        try:
+            validation_cache.create_cache_table(cursor)
+            plan = validation_cache.DbtTestPlan(
+                cursor, os.path.join('target', 'manifest.json'),
+                sources=CACHED_TEST_STAGES[name], force=validation_cache.force_enabled()
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ {name}: validation cache unavailable ({e}), running every test")
+            return run(args)
+        
+        summary = plan.summary()
+        print(f"   {name}: {summary}")
+        if plan.all_cached:
+            print(f"✅ {name} - CACHED")
+            success, output = True, ""
+        else:
+            started = time.time()
+            success, output = run(_with_excludes(args, plan.exclude_selectors()))
+            run_results = os.path.join(_target_path(args), 'run_results.json')
+            if os.path.exists(run_results) and os.path.getmtime(run_results) >= started:
+                plan.record(cursor, run_results)
+                conn.commit()
+        
+        failures = plan.cached_failures()
+        for test_id, status in failures:
+            output += f"\ncached {status}: {test_id}"
+        return success and not failures, output + f"\n{summary}"
+    finally:
+        conn.close()
+
+def dbt_stages(dbt=None, state_dir=None):
+    """Declare the dbt stages of the pipeline
+
+    Source tests only need a compiled project, so they run alongside the
+    model build. Stages that run concurrently with `dbt run` write their
+    artifacts to their own target path so target/run_results.json keeps
+    the results of the build. With an in-process runner (dbt_inprocess)
+    the commands share one interpreter and one parsed manifest.
     
-    # dbt test
-    success, output = run_command("dbt test", "dbt Test")
-    results.append(("dbt Test", success))
+    With state_dir (slim CI), the build and model tests only select nodes
+    modified since the production manifest in state_dir. Tests on relations
+    unchanged since their last run are reported from the validation cache.
+    """
+    def action(name, args):
+        if dbt is not None:
+            run = lambda command_args: dbt.run_command(command_args, name)
+        else:
+            run = lambda command_args: run_command("dbt " + " ".join(command_args), name)
+        if name in CACHED_TEST_STAGES:
+            return lambda results: cached_dbt_tests(name, args, run)
+        return lambda results: run(args)
     
-    # dbt run
-    success, output = run_command("dbt run", "dbt Run")
-    results.append(("dbt Run", success))
+    stages = []
+    for name, args, requires in DBT_COMMANDS:
+        after = []
+        if state_dir and name in SLIM_CI_STAGES:
+            args = args + slim_ci.selection_args(state_dir)
+            # Read target/manifest.json before dbt run rewrites it
+            after = ["Slim CI Selection"]
+        stages.append(Stage(name, action(name, args), requires=requires, after=after))
     
-    return results
+    if state_dir:
+        def report_selection(results):
+            selected, total = slim_ci.modified_nodes(state_dir)
+            return True, slim_ci.selection_summary(selected, total, state_dir)
+        stages.append(Stage("Slim CI Selection", report_selection,
+                            requires=["dbt Compile"], report_output=True))
+    return stages
 
-def test_soda():
-    """Test Soda data quality"""
-    print("\n🔍 TESTING SODA DATA QUALITY")
-    print("=" * 50)
+def _cached_soda_outcomes():
+    """{table: (outcomes, validated_at)} of the Soda checks answered from the validation cache"""
+    import save_validation_results
+    import validation_cache
     
-    results = []
+    conn = save_validation_results.connect_to_db()
+    if not conn:
+        return {}
+    try:
+        cursor = conn.cursor()
+        validation_cache.create_cache_table(cursor)
+        _, cached = save_validation_results.soda_cache_plan(cursor, SODA_PROJECT_DIR)
+        conn.commit()
+        return cached
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ Soda Scan: validation cache unavailable ({e}), scanning every table")
+        return {}
+    finally:
+        conn.close()
+
+def test_soda(results=None):
+    """Test Soda data quality
+
+    Tables whose data and checks are unchanged since their last validation
+    are not rescanned (unless --force-validation); the others are scanned
+    as parallel per-table shards. Failed checks, cached or not, are listed
+    in the output; the stage fails when a shard produces no results.
+    """
+    from save_validation_results import SODA_STATUS_MAPPING
+    from soda_shards import run_sharded_scan
     
-    # Soda scan (allow failure for freshness check)
-    success, output = run_command(
-        "cd soda_project && soda scan -d postgres -c configuration.yml checks/checks.yml",
-        "Soda Data Quality Scan"
-    )
+    print("\n🔄 Soda Data Quality Scan...")
+    cached = _cached_soda_outcomes()
+    if cached:
+        print(f"   Validation cache: skipping unchanged tables {', '.join(sorted(cached))}")
+    try:
+        json_data, unparsed = run_sharded_scan(SODA_PROJECT_DIR, skip=cached)
+    except Exception as e:
+        print(f"❌ Soda Data Quality Scan - ERROR: {e}")
+        return False, str(e)
     
-    # Consider it success if it runs (even with failed freshness check)
-    scan_success = success or ("freshness" in output and "FAILED" in output)
-    results.append(("Soda Scan", scan_success))
+    lines = [
+        f"{check.get('table', 'unknown')}: {check.get('name', 'unknown')} "
+        f"[{SODA_STATUS_MAPPING.get(check.get('outcome', ''), 'UNKNOWN')}]"
+        for check in (json_data or {}).get('checks', [])
+    ]
+    lines += [
+        f"{table}: {outcome['name']} [{outcome['status']}] (cached)"
+        for table, (outcomes, _) in sorted(cached.items()) for outcome in outcomes
+    ]
+    for shard, output in unparsed.items():
+        lines.append(f"No results for shard {shard}:\n{output}")
+    output = "\n".join(lines)
     
-    return results, output
+    # Failed checks (freshness among them) do not fail the scan itself
+    if unparsed:
+        print("❌ Soda Data Quality Scan - FAILED")
+        print(f"Error: {output}")
+        return False, output
+    print("✅ Soda Data Quality Scan - SUCCESS")
+    return True, output
 
-def save_results():
-    """Save validation results to database"""
-    print("\n💾 SAVING VALIDATION RESULTS")
-    print("=" * 50)
-    
-    success, output = run_command("python save_validation_results.py", "Save Results to Database")
-    return success
+def save_results(results=None, dbt=None):
+    """Save validation results to database
+
+    The writer runs in this process, on the shared results_store pool.
+    With in-process dbt it gets the in-memory node results; otherwise it
+    reads run_results.json.
+    """
+    import save_validation_results
+    print("\n🔄 Save Results to Database...")
+    success = save_validation_results.save_all(dbt.run_results('run') if dbt else None)
+    print(f"{'✅' if success else '❌'} Save Results to Database - {'SUCCESS' if success else 'FAILED'}")
+    return success, ""
 
 def get_test_summary():
     """Get test summary from database"""
     try:
-        conn = psycopg2.connect(
-            host="172.17.0.3",
-            database="test_db",
-            user="admin",
-            password="admin",
-            port="5432"
-        )
-        cursor = conn.cursor()
-        
-        # Get latest validation summary
-        cursor.execute("""
-            SELECT 
-                validation_type,
-                total_checks,
-                passed_checks,
-                failed_checks,
-                validation_timestamp
-            FROM validation_summary 
-            WHERE validation_timestamp >= CURRENT_DATE
-            ORDER BY validation_timestamp DESC
-            LIMIT 2
-        """)
+        import results_store
+        import save_validation_results
         
-        results = cursor.fetchall()
-        conn.close()
+        # Latest dbt and Soda runs, read from the precomputed rollups
+        conn = results_store.connect()
+        try:
+            results = save_validation_results.latest_run_summaries(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
         
         return results
     except Exception as e:
         print(f"Error getting summary: {e}")
         return []
 
-def send_email_notification(dbt_results, soda_results, soda_output, summary_results):
-    """Send email notification"""
-    print("\n📧 SENDING EMAIL NOTIFICATION")
-    print("=" * 50)
-    
-    # Email configuration (you can set these as environment variables)
-    smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-    smtp_port = int(os.getenv('SMTP_PORT', '587'))
-    sender_email = os.getenv('SENDER_EMAIL', 'your-email@gmail.com')
-    sender_password = os.getenv('SENDER_PASSWORD', 'your-app-password')
-    recipient_email = os.getenv('RECIPIENT_EMAIL', 'recipient@gmail.com')
-    
-    if not sender_email or sender_email == 'your-email@gmail.com':
-        print("⚠️ Email not configured. Set SENDER_EMAIL, SENDER_PASSWORD, RECIPIENT_EMAIL environment variables")
-        return False
-    
-    try:
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = sender_email
-        msg['To'] = recipient_email
-        msg['Subject'] = f"dbt + Soda Test Results - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-        
-        # Create email body
-        body = f"""
+def build_email_body(dbt_results, soda_results, soda_output):
+    """Build the notification body from the stage outcomes"""
+    body = f"""
 🎯 DBT + SODA TEST RESULTS
 ========================
 
 📊 DBT Results:
 """
-        for test_name, success in dbt_results:
-            status = "✅ PASSED" if success else "❌ FAILED"
-            body += f"   {test_name}: {status}\n"
-        
-        body += f"""
+    for test_name, success in dbt_results:
+        status = "✅ PASSED" if success else "❌ FAILED"
+        body += f"   {test_name}: {status}\n"
+    
+    body += f"""
 🔍 Soda Results:
 """
-        for test_name, success in soda_results:
-            status = "✅ PASSED" if success else "❌ FAILED"
-            body += f"   {test_name}: {status}\n"
-        
-        if soda_output:
-            body += f"""
+    for test_name, success in soda_results:
+        status = "✅ PASSED" if success else "❌ FAILED"
+        body += f"   {test_name}: {status}\n"
+    
+    if soda_output:
+        body += f"""
 📋 Soda Details:
 {soda_output[:500]}...
 """
+    return body
+
+def send_email_notification(body, summary_results):
+    """Queue the email notification
+
+    The message goes to the notifications outbox; a background dispatcher
+    delivers it (or folds it into a digest), so the pipeline does not wait
+    on SMTP. See notifications.py.
+    """
+    print("\n📧 SENDING EMAIL NOTIFICATION")
+    print("=" * 50)
+    
+    # Imported here: runs without email never load the notification machinery
+    import notifications
+    
+    if not notifications.email_configured():
+        print("⚠️ Email not configured. Set SENDER_EMAIL, SENDER_PASSWORD, RECIPIENT_EMAIL environment variables")
+        return False
+    
+    try:
+        subject = f"dbt + Soda Test Results - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
         
         if summary_results:
             body += f"""
 📈 Database Summary:
 """
             for row in summary_results:
-                validation_type, total, passed, failed, timestamp = row
-                body += f"   {validation_type}: {passed}/{total} passed, {failed} failed\n"
+                validation_type, run_key, total, passed, failed, error, cached, last_seen = row
+                body += (f"   {validation_type}: {passed}/{total} passed, {failed} failed, "
+                         f"{error} errors, {cached} cached\n")
         
         body += f"""
 ⏰ Test completed at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 """
         
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # Send email
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        text = msg.as_string()
-        server.sendmail(sender_email, recipient_email, text)
-        server.quit()
-        
-        print("✅ Email sent successfully!")
+        notifications.notify(subject, body)
+        print(f"✅ Email queued ({notifications.NOTIFY_MODE} delivery)")
         return True
         
     except Exception as e:
         print(f"❌ Email failed: {e}")
         return False
 
+DBT_STAGE_NAMES = ["dbt Debug", "dbt Compile", "dbt Source Tests", "dbt Run", "dbt Model Tests"]
+SODA_STAGE_NAMES = ["Soda Scan"]
+
+def stage_outcomes(results, names):
+    """(name, success) pairs for the given stages, in declaration order"""
+    return [(name, name in results and results[name].success) for name in names]
+
+def data_diff_stage(baseline_schema):
+    """Compare the rebuilt models with their copies in baseline_schema"""
+    def action(results):
+        import data_diff
+        fail_on_changes = os.getenv('DATA_DIFF_FAIL_ON_CHANGES', '').lower() in ('1', 'true', 'yes')
+        return data_diff.ci_diff(baseline_schema, fail_on_changes=fail_on_changes)
+    return Stage("Data Diff", action, requires=["dbt Run"], report_output=True)
+
+def pipeline_stages(dbt=None, state_dir=None, diff_baseline=None):
+    """Declare every pipeline stage and the dependencies between them"""
+    def prepare_notification(results):
+        soda_output = results["Soda Scan"].output if "Soda Scan" in results else ""
+        body = build_email_body(
+            stage_outcomes(results, DBT_STAGE_NAMES),
+            stage_outcomes(results, SODA_STAGE_NAMES),
+            soda_output
+        )
+        return True, body
+    
+    def send_notification(results):
+        summary_results = get_test_summary()
+        return send_email_notification(results["Prepare Notification"].output, summary_results), ""
+    
+    extra = [data_diff_stage(diff_baseline)] if diff_baseline else []
+    return dbt_stages(dbt, state_dir) + extra + [
+        # Soda checks the marts, so it waits for the build (but still runs
+        # when the build fails, as the serial pipeline did)
+        Stage("Soda Scan", test_soda, after=["dbt Run"]),
+        Stage("Save Results", lambda results: save_results(results, dbt),
+              after=["Soda Scan", "dbt Model Tests", "dbt Source Tests"]),
+        # The message body is built while results are being written
+        Stage("Prepare Notification", prepare_notification,
+              after=DBT_STAGE_NAMES + SODA_STAGE_NAMES),
+        Stage("Send Notification", send_notification,
+              requires=["Prepare Notification"], after=["Save Results"]),
+    ]
+
+def report_metrics(results, since):
+    """Print the hot-spot report and store stage and dbt node metrics
+
+    Node metrics are read from the run_results.json of every dbt run/test
+    stage written after since (a time.time() value).
+    """
+    import pipeline_metrics
+    run_id = f"pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    rows = list(pipeline_metrics.stage_rows(run_id, results))
+    for name, args, _ in DBT_COMMANDS:
+        if args[0] not in ('run', 'test') or name not in results or results[name].status == 'skipped':
+            continue
+        run_results = os.path.join(_target_path(args), 'run_results.json')
+        if os.path.exists(run_results) and os.path.getmtime(run_results) >= since:
+            rows.extend(pipeline_metrics.node_rows(run_id, name, run_results))
+    pipeline_metrics.print_hot_spots(rows)
+    
+    import save_validation_results
+    conn = save_validation_results.connect_to_db()
+    if not conn:
+        print("⚠️ Stage metrics not saved: no database connection")
+        return
+    try:
+        saved = pipeline_metrics.save_metrics(conn, rows)
+        print(f"   Saved {saved} stage/node metrics as {run_id}")
+    except Exception as e:
+        print(f"⚠️ Stage metrics not saved: {e}")
+    finally:
+        conn.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the dbt + Soda pipeline")
+    parser.add_argument('--jobs', type=int, default=DEFAULT_PARALLELISM,
+                        help="Maximum number of stages to run at once (PIPELINE_PARALLELISM)")
+    parser.add_argument('--fail-fast', action='store_true',
+                        help="Do not start new stages after the first failure")
+    parser.add_argument('--dbt-mode', choices=['subprocess', 'inprocess'],
+                        default=os.getenv('DBT_EXECUTION_MODE', 'subprocess'),
+                        help="Run dbt as subprocesses or in this process (DBT_EXECUTION_MODE)")
+    parser.add_argument('--slim-ci', action='store_true',
+                        default=os.getenv('DBT_SLIM_CI', '').lower() in ('1', 'true', 'yes'),
+                        help="Only build and test nodes modified since the production manifest (DBT_SLIM_CI)")
+    parser.add_argument('--state', default=slim_ci.STATE_DIR,
+                        help="Directory holding the production manifest.json (DBT_STATE_DIR)")
+    parser.add_argument('--force-validation', action='store_true',
+                        default=os.getenv('VALIDATION_FORCE', '').lower() in ('1', 'true', 'yes'),
+                        help="Run every dbt test and Soda check, ignoring the validation cache (VALIDATION_FORCE)")
+    parser.add_argument('--data-diff-baseline', default=os.getenv('DATA_DIFF_BASELINE_SCHEMA'),
+                        help="Diff the rebuilt models against this schema (DATA_DIFF_BASELINE_SCHEMA)")
+    return parser.parse_args()
+
 def main():
     """Main function"""
+    args = parse_args()
+    
     print("🚀 STARTING COMPLETE DBT + SODA TEST")
     print("=" * 60)
     
     # Setup environment
     setup_environment()
+    if args.force_validation:
+        # Also seen by dbt and Soda when they run as subprocesses
+        os.environ['VALIDATION_FORCE'] = '1'
     
-    # Test dbt
-    dbt_results = test_dbt()
-    
-    # Test soda
-    soda_results, soda_output = test_soda()
-    
-    # Save results
-    save_success = save_results()
-    
-    # Get summary
-    summary_results = get_test_summary()
+    # Run all stages
+    started = time.perf_counter()
+    started_at = time.time()
+    dbt = None
+    if args.dbt_mode == 'inprocess':
+        from dbt_inprocess import InProcessDbt
+        dbt = InProcessDbt()
+    state_dir = None
+    if args.slim_ci:
+        if slim_ci.has_baseline(args.state):
+            state_dir = args.state
+        else:
+            print(f"⚠️ No production manifest in {args.state} - building every node")
+    results = run_stages(pipeline_stages(dbt, state_dir, args.data_diff_baseline), max_workers=args.jobs,
+                         fail_fast=args.fail_fast)
+    print_stage_report(results, time.perf_counter() - started)
+    report_metrics(results, started_at)
     
-    # Send email
-    email_success = send_email_notification(dbt_results, soda_results, soda_output, summary_results)
+    dbt_results = stage_outcomes(results, DBT_STAGE_NAMES)
+    soda_results = stage_outcomes(results, SODA_STAGE_NAMES)
+    save_success = "Save Results" in results and results["Save Results"].success
+    email_success = "Send Notification" in results and results["Send Notification"].success
+    diff_success = "Data Diff" not in results or results["Data Diff"].success
     
     # Final summary
     print("\n🎯 FINAL SUMMARY")
@@ -240,9 +492,12 @@ def main():
     print(f"dbt Tests: {dbt_passed}/{dbt_total} passed")
     print(f"Soda Tests: {soda_passed}/{soda_total} passed")
     print(f"Results Saved: {'✅' if save_success else '❌'}")
-    print(f"Email Sent: {'✅' if email_success else '❌'}")
+    print(f"Email Queued: {'✅' if email_success else '❌'}")
+    if "Data Diff" in results:
+        print(f"Data Diff: {'✅' if diff_success else '❌'}")
     
-    overall_success = dbt_passed == dbt_total and soda_passed == soda_total and save_success
+    overall_success = (dbt_passed == dbt_total and soda_passed == soda_total and save_success
+                       and diff_success)
     
     if overall_success:
         print("\n🎉 ALL TESTS PASSED!")
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Validation cache: skip checks on relations that did not change since their last validation
+
+Each relation gets a cheap change fingerprint from the catalog and the
+statistics views: oid and relfilenode (a rebuild or TRUNCATE changes
+them), the pg_stat_user_tables insert/update/delete counters (summed over
+partitions for partitioned tables) and, for watermarked incremental
+models, the stored watermark. The cache keeps the fingerprint together
+with the outcomes of the last validation, so checks on unchanged
+relations can be skipped and their results re-reported as cached.
+
+Statistics counters are flushed when a backend commits or exits, so a
+fingerprint taken after the dbt stage has finished sees its writes.
+
+Usage:
+    python validation_cache.py [--clear]
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import yaml
+
+import results_store
+from dbt_artifacts import iter_artifact, iter_run_results, streaming_enabled
+
+# Cached outcomes older than this are re-validated even if nothing changed
+VALIDATION_CACHE_MAX_AGE_HOURS = float(os.getenv('VALIDATION_CACHE_MAX_AGE_HOURS', '24'))
+# Soda metrics whose outcome depends on the clock, not only on the data
+TIME_DEPENDENT_METRICS = ('freshness',)
+FAILED_OUTCOMES = ('fail', 'failed', 'error', 'runtime error')
+
+
+def force_enabled():
+    """Whether every check must run regardless of the cache (VALIDATION_FORCE)"""
+    return os.getenv('VALIDATION_FORCE', '0').lower() in ('1', 'true', 'yes')
+
+
+def create_cache_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS validation_cache (
+            validator VARCHAR(50) NOT NULL,
+            relation VARCHAR(255) NOT NULL,
+            fingerprint TEXT NOT NULL,
+            outcomes JSONB NOT NULL,
+            validated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (validator, relation)
+        )
+    """)
+
+
+def relation_fingerprints(cursor, relations):
+    """Return {relation: fingerprint} for the given table names
+
+    Relations that do not exist get no entry, so they are never cached.
+    """
+    relations = sorted(set(relations))
+    if not relations:
+        return {}
+    cursor.execute("SELECT to_regclass('dbt_model_watermarks') IS NOT NULL")
+    watermark = (
+        "(SELECT watermark::text FROM dbt_model_watermarks w WHERE w.model_name = t.name)"
+        if cursor.fetchone()[0] else "NULL"
+    )
+    cursor.execute(f"""
+        WITH targets AS (
+            SELECT r.name, c.oid
+            FROM unnest(%s::text[]) AS r(name)
+            JOIN pg_class c ON c.relname = r.name AND pg_table_is_visible(c.oid)
+        ),
+        members AS (
+            SELECT t.name, coalesce(i.inhrelid, t.oid) AS relid
+            FROM targets t
+            LEFT JOIN pg_inherits i ON i.inhparent = t.oid
+        )
+        SELECT t.name,
+               md5(concat_ws('|', {watermark}, (
+                   SELECT string_agg(concat_ws(':', c.oid, c.relfilenode,
+                                               s.n_tup_ins, s.n_tup_upd, s.n_tup_del),
+                                     ',' ORDER BY c.oid)
+                   FROM members m
+                   JOIN pg_class c ON c.oid = m.relid
+                   LEFT JOIN pg_stat_user_tables s ON s.relid = m.relid
+                   WHERE m.name = t.name
+               )))
+        FROM targets t
+    """, (relations,))
+    return dict(cursor.fetchall())
+
+
+def cached_outcomes(cursor, validator, fingerprints, max_age_hours=None):
+    """Return {relation: (outcomes, validated_at)} for relations whose fingerprint is unchanged"""
+    if not fingerprints:
+        return {}
+    max_age_hours = VALIDATION_CACHE_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+    relations = sorted(fingerprints)
+    results_store.execute_prepared(cursor, 'cached_outcomes', ['text', 'text[]', 'double precision'], """
+        SELECT relation, fingerprint, outcomes, validated_at
+        FROM validation_cache
+        WHERE validator = $1 AND relation = ANY($2)
+          AND validated_at >= CURRENT_TIMESTAMP - make_interval(secs => $3)
+    """, (validator, relations, max_age_hours * 3600))
+    return {
+        relation: (outcomes, validated_at)
+        for relation, fingerprint, outcomes, validated_at in cursor.fetchall()
+        if fingerprints.get(relation) == fingerprint
+    }
+
+
+def store_outcomes(cursor, validator, entries):
+    """Record validation outcomes against the fingerprints taken before the run
+
+    entries maps relation -> (fingerprint, outcomes); all of them are sent
+    in batched round trips of one prepared upsert.
+    """
+    results_store.execute_prepared_batch(cursor, 'store_outcomes', ['text', 'text', 'text', 'jsonb'], """
+        INSERT INTO validation_cache (validator, relation, fingerprint, outcomes, validated_at)
+        VALUES ($1, $2, $3, $4, CURRENT_TIMESTAMP)
+        ON CONFLICT (validator, relation) DO UPDATE SET
+            fingerprint = EXCLUDED.fingerprint,
+            outcomes = EXCLUDED.outcomes,
+            validated_at = EXCLUDED.validated_at
+    """, [
+        (validator, relation, fingerprint, json.dumps(outcomes))
+        for relation, (fingerprint, outcomes) in sorted(entries.items())
+    ])
+
+
+def soda_check_tables(checks_path):
+    """Return {table: checks digest} for the `checks for <table>` blocks of a Soda checks file
+
+    The digest is added to the relation fingerprint, so editing a block
+    invalidates its cached outcomes. Blocks with time-dependent checks
+    (freshness) are not cacheable and get None.
+    """
+    with open(checks_path, 'r') as f:
+        document = yaml.safe_load(f) or {}
+    tables = {}
+    for section, items in document.items():
+        if not section.startswith('checks for '):
+            continue
+        texts = [next(iter(item)) if isinstance(item, dict) else str(item) for item in items or []]
+        time_dependent = any(
+            text.strip().startswith(metric) for text in texts for metric in TIME_DEPENDENT_METRICS
+        )
+        digest = hashlib.md5(json.dumps(items, sort_keys=True, default=str).encode()).hexdigest()
+        tables[section[len('checks for '):].strip()] = None if time_dependent else digest
+    return tables
+
+
+def _manifest_relations(manifest_path):
+    """Read manifest.json into ({unique_id: (relation name, dbt selector)}, {test id: parent ids})
+
+    Relations are the models, seeds, snapshots and sources tests can depend on.
+    """
+    relations = {}
+    tests = {}
+    for key, value in iter_artifact(manifest_path, 'nodes', streaming=streaming_enabled()):
+        if key != 'nodes':
+            continue
+        unique_id, node = value
+        resource_type = node.get('resource_type')
+        if resource_type in ('model', 'seed', 'snapshot'):
+            relations[unique_id] = (node.get('alias') or node['name'], node['name'])
+        elif resource_type == 'test':
+            tests[unique_id] = (node.get('depends_on') or {}).get('nodes', [])
+    for key, value in iter_artifact(manifest_path, 'sources', streaming=streaming_enabled()):
+        if key != 'sources':
+            continue
+        unique_id, source = value
+        relations[unique_id] = (
+            source.get('identifier') or source['name'],
+            f"source:{source['source_name']}.{source['name']}"
+        )
+    return relations, tests
+
+
+class DbtTestPlan:
+    """Which dbt tests of one stage can be answered from the cache
+
+    sources selects the tests on sources (`--select source:*`) instead of
+    the tests on models (`--exclude source:*`).
+    """
+
+    def __init__(self, cursor, manifest_path, sources=False, force=False):
+        relations, tests = _manifest_relations(manifest_path)
+        self.tests = {}
+        for test_id, parents in tests.items():
+            parent_relations = [relations[p] for p in parents if p in relations]
+            on_source = any(selector.startswith('source:') for _, selector in parent_relations)
+            if parent_relations and on_source == sources:
+                self.tests[test_id] = parent_relations
+
+        self.relation_tests = {}
+        self.selectors = {}
+        for test_id, parent_relations in self.tests.items():
+            for relation, selector in parent_relations:
+                self.relation_tests.setdefault(relation, set()).add(test_id)
+                self.selectors[relation] = selector
+
+        self.fingerprints = relation_fingerprints(cursor, self.relation_tests)
+        cached = {} if force else cached_outcomes(cursor, 'dbt_test', self.fingerprints)
+        fresh = {
+            relation for relation, (outcomes, _) in cached.items()
+            if self.relation_tests[relation] <= set(outcomes)
+        }
+        # A test is skipped with its relation, so every parent of it must be fresh
+        self.cached = {
+            relation: cached[relation] for relation in fresh
+            if all(
+                parent in fresh
+                for test_id in self.relation_tests[relation]
+                for parent, _ in self.tests[test_id]
+            )
+        }
+
+    @property
+    def all_cached(self):
+        return bool(self.relation_tests) and set(self.cached) == set(self.relation_tests)
+
+    def exclude_selectors(self):
+        return sorted(self.selectors[relation] for relation in self.cached)
+
+    def cached_failures(self):
+        """[(test unique_id, status)] of cached tests that did not pass"""
+        return sorted(
+            (test_id, status)
+            for outcomes, _ in self.cached.values()
+            for test_id, status in outcomes.items()
+            if str(status).lower() in FAILED_OUTCOMES
+        )
+
+    def record(self, cursor, run_results_path):
+        """Cache the outcomes of relations whose tests all ran; returns the relation count"""
+        statuses = {
+            result.get('unique_id'): result.get('status')
+            for _, result in iter_run_results(run_results_path, streaming=streaming_enabled())
+        }
+        entries = {}
+        for relation, test_ids in self.relation_tests.items():
+            if relation in self.cached or relation not in self.fingerprints:
+                continue
+            # Only complete runs are cached; errors may be transient
+            if not test_ids <= set(statuses) or any(
+                    str(statuses[test_id]).lower() == 'error' for test_id in test_ids):
+                continue
+            entries[relation] = (self.fingerprints[relation],
+                                 {test_id: statuses[test_id] for test_id in test_ids})
+        store_outcomes(cursor, 'dbt_test', entries)
+        return len(entries)
+
+    def summary(self):
+        skipped = sum(len(self.relation_tests[relation]) for relation in self.cached)
+        return (f"Validation cache: {len(self.cached)} of {len(self.relation_tests)} relations "
+                f"unchanged, {skipped} of {len(self.tests)} tests reported from cache")
+
+
+def main():
+    from save_validation_results import connect_to_db
+
+    parser = argparse.ArgumentParser(description="Show or clear the validation cache")
+    parser.add_argument('--clear', action='store_true', help="Forget every cached outcome")
+    args = parser.parse_args()
+
+    conn = connect_to_db()
+    if not conn:
+        print("Failed to connect to database")
+        return
+    try:
+        cursor = conn.cursor()
+        create_cache_table(cursor)
+        if args.clear:
+            cursor.execute("DELETE FROM validation_cache")
+            print(f"Cleared {cursor.rowcount} cached validations")
+        else:
+            cursor.execute("""
+                SELECT validator, relation, validated_at, outcomes
+                FROM validation_cache
+                ORDER BY validator, relation
+            """)
+            for validator, relation, validated_at, outcomes in cursor.fetchall():
+                print(f"{validator:<10} {relation:<30} {validated_at}  {len(outcomes)} checks")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()